@@ -0,0 +1,63 @@
+# Compares the exact (heap) watershed with the bucket-queue watershed at a
+# few quantization levels: time, & the fraction of pixels labeled the same.
+#
+# Usage:
+#   python watershed_bucket_queue_benchmark.py [raw_predictions.npz ...]
+#
+# Each file is a Mesmer raw predictions intermediate (arr_0 .. arr_3). With
+# no files, a synthetic image is used instead.
+
+import sys
+from timeit import default_timer
+
+import numpy as np
+import scipy.ndimage as nd
+
+from deepcell_imaging.image_processing.watershed import watershed_unpadded
+from deepcell_imaging.utils.intermediates import read_arrays
+
+PRIORITY_LEVELS = [None, 65536, 4096, 256]
+
+
+def watershed_inputs(maxima, interior):
+    # Roughly deep_watershed's defaults, without the maxima search.
+    interior = nd.gaussian_filter(interior.astype(np.float32), 1)
+    markers, _ = nd.label(maxima > 0.1, output=np.int32)
+    return -interior, markers, interior > 0.01
+
+
+def synthetic_inputs(size=4000, seed=0):
+    rng = np.random.default_rng(seed)
+    noise = nd.gaussian_filter(rng.random((size, size), dtype=np.float32), 6)
+    noise = (noise - noise.min()) / (noise.max() - noise.min())
+    maxima = (noise == nd.maximum_filter(noise, size=15)) * 1.0
+    return watershed_inputs(maxima, noise)
+
+
+def load_inputs(uri):
+    arrays = read_arrays(uri, ["arr_0", "arr_1"])
+    # Batch 0: the whole-cell inner distance, & the pixelwise interior.
+    return watershed_inputs(arrays["arr_0"][0, ..., 0], arrays["arr_1"][0, ..., 1])
+
+
+def benchmark(name, image, markers, mask):
+    print(f"{name}: {image.shape}, {markers.max()} markers")
+    exact = None
+    for priority_levels in PRIORITY_LEVELS:
+        t = default_timer()
+        labels = watershed_unpadded(
+            image, markers, mask=mask, priority_levels=priority_levels
+        )
+        elapsed = default_timer() - t
+        if exact is None:
+            exact = labels
+        agreement = np.mean(labels == exact)
+        print(f"  priority_levels={priority_levels}: {elapsed:.2f}s, {agreement:.5f}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        for uri in sys.argv[1:]:
+            benchmark(uri, *load_inputs(uri))
+    else:
+        benchmark("synthetic", *synthetic_inputs())
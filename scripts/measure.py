@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+"""
+Script to measure segmented cells in every channel of an OME-TIFF.
+
+Reads post-processed predictions, and the OME-TIFF image, from URIs
+(typically on cloud storage). The image is read tile by tile, without
+downloading it.
+
+Writes a TSV of per-cell measurements to a URI (typically on cloud storage).
+"""
+
+import logging
+import timeit
+
+import numpy as np
+import smart_open
+import tifffile
+
+import deepcell_imaging
+from deepcell_imaging import gcp_logging
+from deepcell_imaging.gcp_batch_jobs.types import MeasureArgs
+from deepcell_imaging.image_processing import measure
+from deepcell_imaging.utils import intermediates
+from deepcell_imaging.utils.cmdline import get_task_arguments
+
+
+def main():
+    deepcell_imaging.gcp_logging.initialize_gcp_logging()
+    logger = logging.getLogger(__name__)
+
+    args, env_config = get_task_arguments("measure", MeasureArgs)
+
+    logger.info("Loading predictions")
+
+    t = timeit.default_timer()
+    predictions = intermediates.read_labels(
+        args.predictions_uri, local_scratch_dir=args.local_scratch_dir
+    )
+    whole_cell_labels = np.squeeze(predictions[..., 0])
+    predictions = None
+
+    logger.info("Loaded predictions in %s s" % round(timeit.default_timer() - t, 2))
+
+    logger.info("Measuring cell shapes")
+
+    t = timeit.default_timer()
+    shapes = measure.measure_shapes(whole_cell_labels)
+
+    logger.info(
+        "Measured %s cell shapes in %s s",
+        len(shapes["label"]),
+        round(timeit.default_timer() - t, 2),
+    )
+
+    logger.info("Measuring channel intensities from %s" % args.image_uri)
+
+    t = timeit.default_timer()
+    with smart_open.open(args.image_uri, "rb") as image_file:
+        with tifffile.TiffFile(image_file) as tif:
+            channels = measure.measure_channels(whole_cell_labels, tif)
+
+    logger.info(
+        "Measured %s channels in %s s",
+        len(channels),
+        round(timeit.default_timer() - t, 2),
+    )
+
+    logger.info("Writing measurements to %s" % args.output_uri)
+
+    t = timeit.default_timer()
+    with smart_open.open(args.output_uri, "w") as output_file:
+        measure.write_measurements_tsv(output_file, args.image_name, shapes, channels)
+
+    logger.info("Wrote measurements in %s s" % round(timeit.default_timer() - t, 2))
+
+
+if __name__ == "__main__":
+    main()
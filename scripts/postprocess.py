@@ -12,14 +12,16 @@ import logging
 import timeit
 
 import gs_fastcopy
-import numpy as np
 import smart_open
-import tifffile
 
 import deepcell_imaging
 from deepcell_imaging import gcp_logging, benchmark_utils, mesmer_app
 from deepcell_imaging.gcp_batch_jobs.types import PostprocessArgs
+from deepcell_imaging.image_processing import adjacency
+from deepcell_imaging.utils import intermediates
 from deepcell_imaging.utils.cmdline import get_task_arguments
+from deepcell_imaging.utils.mask_tiff import write_mask_tiff
+from deepcell_imaging.utils.output_stage import OutputStage
 
 
 def main():
@@ -39,14 +41,28 @@ def main():
 
     t = timeit.default_timer()
 
-    with gs_fastcopy.read(raw_predictions_uri) as raw_predictions_file:
-        with np.load(raw_predictions_file) as loader:
-            # An array of shape [height, width, channel] containing intensity of nuclear & membrane channels
-            raw_predictions = {}
-            if compartment == "whole-cell" or compartment == "both":
-                raw_predictions["whole-cell"] = [loader["arr_0"], loader["arr_1"]]
-            if compartment == "nuclear" or compartment == "both":
-                raw_predictions["nuclear"] = [loader["arr_2"], loader["arr_3"]]
+    # Only load the arrays for the compartment(s) we're segmenting.
+    array_names = []
+    if compartment == "whole-cell" or compartment == "both":
+        array_names += ["arr_0", "arr_1"]
+    if compartment == "nuclear" or compartment == "both":
+        array_names += ["arr_2", "arr_3"]
+
+    input_stats = {}
+    loaded_arrays = intermediates.read_arrays(
+        raw_predictions_uri,
+        array_names,
+        local_scratch_dir=args.local_scratch_dir,
+        stats=input_stats,
+    )
+
+    # Arrays of shape [height, width, channel] containing intensity of nuclear & membrane channels
+    raw_predictions = {}
+    if compartment == "whole-cell" or compartment == "both":
+        raw_predictions["whole-cell"] = [loaded_arrays["arr_0"], loaded_arrays["arr_1"]]
+    if compartment == "nuclear" or compartment == "both":
+        raw_predictions["nuclear"] = [loaded_arrays["arr_2"], loaded_arrays["arr_3"]]
+    loaded_arrays = None
 
     raw_predictions_load_time_s = timeit.default_timer() - t
 
@@ -54,12 +70,81 @@ def main():
         "Loaded raw predictions in %s s" % round(raw_predictions_load_time_s, 2)
     )
 
+    # Outputs are written in the background, as soon as they're ready.
+    outputs = OutputStage()
+    tiff_output_uris = {
+        "whole-cell": args.wholecell_tiff_output_uri,
+        "nuclear": args.nuclear_tiff_output_uri,
+    }
+
+    def write_tiff(tiff_output_uri, label_image):
+        with gs_fastcopy.write(tiff_output_uri) as output_writer:
+            write_mask_tiff(output_writer, label_image)
+
+    def write_edges(edges_output_uri, make_edges, *args):
+        edges = make_edges(*args)
+        with smart_open.open(edges_output_uri, "w") as output_file:
+            adjacency.write_edges_tsv(output_file, edges)
+
+    def on_compartment_done(compartment_name, label_image):
+        # Start writing this compartment's TIFF while the next is computed.
+        tiff_output_uri = tiff_output_uris[compartment_name]
+        if tiff_output_uri:
+            logger.info(
+                "Saving %s segmentation TIFF output to %s"
+                % (compartment_name, tiff_output_uri)
+            )
+            outputs.submit(
+                f"{compartment_name} TIFF",
+                write_tiff,
+                tiff_output_uri,
+                label_image[..., 0],
+            )
+
+        # The cell graphs are built in the background too.
+        if compartment_name != "whole-cell":
+            return
+        if args.wholecell_adjacency_output_uri:
+            outputs.submit(
+                "whole-cell adjacency",
+                write_edges,
+                args.wholecell_adjacency_output_uri,
+                adjacency.contact_edges,
+                label_image[..., 0],
+            )
+        if args.wholecell_knn_output_uri:
+            outputs.submit(
+                "whole-cell kNN",
+                write_edges,
+                args.wholecell_knn_output_uri,
+                adjacency.knn_edges,
+                label_image[..., 0],
+                args.knn_neighbors,
+            )
+
     logger.info("Postprocessing raw predictions")
 
+    memory_tracker = benchmark_utils.StepPeakMemory() if args.trace_memory else None
+    deep_watershed_kwargs = {
+        "memory_lean": args.memory_lean,
+        # The loaded predictions aren't needed after postprocessing.
+        "overwrite_outputs": True,
+        "memory_tracker": memory_tracker,
+        "num_workers": args.num_workers,
+    }
+
     t = timeit.default_timer()
     try:
         segmentation = mesmer_app.postprocess(
-            raw_predictions, (1, input_rows, input_cols, 2), compartment=compartment
+            raw_predictions,
+            (1, input_rows, input_cols, 2),
+            compartment=compartment,
+            whole_cell_kwargs=deep_watershed_kwargs,
+            nuclear_kwargs=deep_watershed_kwargs,
+            whole_cell_from_nuclei=args.whole_cell_from_nuclei,
+            # Segmenting both compartments at once holds both in memory.
+            concurrent_compartments=not args.memory_lean,
+            compartment_callback=on_compartment_done,
         )
         success = True
     except Exception as e:
@@ -68,56 +153,45 @@ def main():
 
     postprocessing_time_s = timeit.default_timer() - t
 
+    step_peak_memory_gb = None
+    if memory_tracker:
+        memory_tracker.stop()
+        step_peak_memory_gb = memory_tracker.peaks_gb
+        logger.info("Peak memory (GB) by postprocessing step: %s" % step_peak_memory_gb)
+
     logger.info(
         "Postprocessed raw predictions in %s s; success: %s"
         % (round(postprocessing_time_s, 2), success)
     )
 
+    def write_npz():
+        upload_future = intermediates.write_labels(
+            output_uri,
+            segmentation,
+            local_scratch_dir=args.local_scratch_dir,
+            compression_level=args.compression_level,
+            stats=output_stats,
+        )
+        if upload_future:
+            upload_future.result()
+
+    output_stats = {}
     if success:
         logger.info("Saving postprocessed npz output to %s" % output_uri)
-        t = timeit.default_timer()
-        with gs_fastcopy.write(output_uri) as output_writer:
-            np.savez(output_writer, image=segmentation)
-
-        output_time_s = timeit.default_timer() - t
-        logger.info("Saved output in %s s" % round(output_time_s, 2))
-
-        if args.wholecell_tiff_output_uri:
-            logger.info(
-                "Saving whole-cell segmentation TIFF output to %s"
-                % args.wholecell_tiff_output_uri
-            )
-            t = timeit.default_timer()
-            wholecell_segmentation = segmentation[..., 0][..., np.newaxis].astype(
-                np.int32
-            )
-            with gs_fastcopy.write(args.wholecell_tiff_output_uri) as output_writer:
-                tifffile.imwrite(output_writer, wholecell_segmentation)
-
-            wholecell_output_time_s = timeit.default_timer() - t
-            logger.info(
-                "Saved whole-cell output in %s s" % round(wholecell_output_time_s, 2)
-            )
-
-        if args.nuclear_tiff_output_uri:
-            logger.info(
-                "Saving nuclear segmentation TIFF output to %s"
-                % args.nuclear_tiff_output_uri
-            )
-            t = timeit.default_timer()
-            nuclear_segmentation = segmentation[..., 1][..., np.newaxis].astype(
-                np.int32
-            )
-            with gs_fastcopy.write(args.nuclear_tiff_output_uri) as output_writer:
-                tifffile.imwrite(output_writer, nuclear_segmentation)
-
-            nuclear_output_time_s = timeit.default_timer() - t
-            logger.info(
-                "Saved nuclear output in %s s" % round(nuclear_output_time_s, 2)
-            )
+        outputs.submit("npz", write_npz)
     else:
+        # Any compartment TIFFs already started are still written.
         logger.warning("Not saving failed postprocessing output.")
-        output_time_s = 0.0
+
+    logger.info("Waiting for outputs to finish")
+    outputs.wait()
+
+    output_times_s = outputs.write_times_s
+    output_time_s = output_times_s.get("npz", 0.0)
+    logger.info(
+        "Saved all outputs; writing concurrently saved %s s"
+        % round(outputs.overlap_time_s, 2)
+    )
 
     # Gather & output timing information
 
@@ -135,6 +209,30 @@ def main():
             "postprocessing_input_load_time_s": raw_predictions_load_time_s,
             "postprocessing_time_s": postprocessing_time_s,
             "postprocessing_output_write_time_s": output_time_s,
+            "postprocessing_input_decompress_time_s": input_stats.get(
+                "decompress_time_s"
+            ),
+            "postprocessing_output_compress_time_s": output_stats.get(
+                "compress_time_s"
+            ),
+            "postprocessing_output_size_mb": output_stats.get("size_mb"),
+            "postprocessing_wholecell_tiff_write_time_s": output_times_s.get(
+                "whole-cell TIFF"
+            ),
+            "postprocessing_nuclear_tiff_write_time_s": output_times_s.get(
+                "nuclear TIFF"
+            ),
+            "postprocessing_output_overlap_time_s": outputs.overlap_time_s,
+            "postprocessing_wholecell_adjacency_time_s": output_times_s.get(
+                "whole-cell adjacency"
+            ),
+            "postprocessing_wholecell_knn_time_s": output_times_s.get("whole-cell kNN"),
+            "postprocessing_memory_lean": args.memory_lean,
+            "postprocessing_whole_cell_from_nuclei": args.whole_cell_from_nuclei,
+            "postprocessing_num_workers": args.num_workers,
+            "postprocessing_step_peak_memory_gb": (
+                json.dumps(step_peak_memory_gb) if step_peak_memory_gb else None
+            ),
         }
 
         with smart_open.open(benchmark_output_uri, "w") as benchmark_output_file:
@@ -18,8 +18,6 @@ import logging
 import os
 import timeit
 
-import gs_fastcopy
-import numpy as np
 import smart_open
 import tensorflow as tf
 
@@ -33,6 +31,7 @@ from deepcell_imaging import (
     mesmer_app,
 )
 from deepcell_imaging.gcp_batch_jobs.types import PredictArgs
+from deepcell_imaging.utils import intermediates
 from deepcell_imaging.utils.cmdline import get_task_arguments
 
 
@@ -93,9 +92,13 @@ def main():
 
     t = timeit.default_timer()
 
-    with gs_fastcopy.read(image_uri) as image_file:
-        with np.load(image_file) as loader:
-            preprocessed_image = loader["image"]
+    input_stats = {}
+    preprocessed_image = intermediates.read_arrays(
+        image_uri,
+        ["image"],
+        local_scratch_dir=args.local_scratch_dir,
+        stats=input_stats,
+    )["image"]
     input_load_time_s = timeit.default_timer() - t
 
     logger.info("Loaded preprocessed image in %s s" % round(input_load_time_s, 2))
@@ -120,24 +123,35 @@ def main():
         "Ran prediction in %s s; success: %s" % (round(predict_time_s, 2), success)
     )
 
+    output_stats = {}
     if success:
         logger.info("Saving raw predictions output to %s" % output_uri)
 
         t = timeit.default_timer()
-        with gs_fastcopy.write(output_uri) as output_writer:
-            np.savez(
-                output_writer,
-                arr_0=model_output["whole-cell"][0],
-                arr_1=model_output["whole-cell"][1],
-                arr_2=model_output["nuclear"][0],
-                arr_3=model_output["nuclear"][1],
-            )
+        upload_future = intermediates.write_arrays(
+            output_uri,
+            {
+                "arr_0": model_output["whole-cell"][0],
+                "arr_1": model_output["whole-cell"][1],
+                "arr_2": model_output["nuclear"][0],
+                "arr_3": model_output["nuclear"][1],
+            },
+            local_scratch_dir=args.local_scratch_dir,
+            compression_level=args.compression_level,
+            stats=output_stats,
+        )
         output_time_s = timeit.default_timer() - t
 
         logger.info("Saved output in %s s" % round(output_time_s, 2))
     else:
         logger.warning("Not saving failed prediction output.")
         output_time_s = 0.0
+        upload_future = None
+
+    if upload_future:
+        # Wait for the background upload, so it doesn't outlive the task.
+        logger.info("Waiting for output upload to finish")
+        upload_future.result()
 
     # Gather & output timing information
 
@@ -156,6 +170,9 @@ def main():
             "prediction_batch_size": batch_size,
             "prediction_time_s": predict_time_s,
             "prediction_output_write_time_s": output_time_s,
+            "prediction_input_decompress_time_s": input_stats.get("decompress_time_s"),
+            "prediction_output_compress_time_s": output_stats.get("compress_time_s"),
+            "prediction_output_size_mb": output_stats.get("size_mb"),
         }
 
         with smart_open.open(benchmark_output_uri, "w") as benchmark_output_file:
@@ -5,19 +5,20 @@ Script to generate GeoJSON shapes from a segmentation mask.
 Reads post-processed predictions from a URI (typically on cloud storage).
 
 Writes a JSON file containing GeoJSON shapes to a URI (typically on cloud storage).
+Optionally also writes the shapes as GeoParquet.
 """
 
-import json
 import logging
 import timeit
 
 import gs_fastcopy
 import numpy as np
-from rasterio import features
 
 import deepcell_imaging
 from deepcell_imaging import gcp_logging
 from deepcell_imaging.gcp_batch_jobs.types import PredictionsToGeoJsonArgs
+from deepcell_imaging.image_processing import shapes
+from deepcell_imaging.utils import intermediates
 from deepcell_imaging.utils.cmdline import get_task_arguments
 
 
@@ -35,10 +36,10 @@ def main():
 
     t = timeit.default_timer()
 
-    with gs_fastcopy.read(predictions_uri) as predictions_file:
-        with np.load(predictions_file) as loader:
-            # An array of shape [height, width, 1-2] containing intensity of nuclear & membrane channels
-            predictions = loader["image"]
+    # An array of shape [height, width, 1-2] containing intensity of nuclear & membrane channels
+    predictions = intermediates.read_labels(
+        predictions_uri, local_scratch_dir=args.local_scratch_dir
+    )
 
     logger.info("Loaded predictions in %s s" % round(timeit.default_timer() - t, 2))
 
@@ -49,46 +50,57 @@ def main():
             % (max_int32, predictions.max())
         )
 
-    predictions = predictions.astype(np.int32, copy=True)
+    simplify_options = {
+        "simplify_tolerance": args.simplify_tolerance,
+        "integer_coordinates": args.integer_coordinates,
+    }
 
     logger.info("Writing whole cell predictions")
-    write_shapes(np.squeeze(predictions[..., 0]), args.whole_cell_output_uri)
+    whole_cell_predictions = np.squeeze(predictions[..., 0])
+    write_shapes(whole_cell_predictions, args.whole_cell_output_uri, **simplify_options)
+    if args.whole_cell_parquet_output_uri:
+        write_shapes(
+            whole_cell_predictions,
+            args.whole_cell_parquet_output_uri,
+            shapes.write_geoparquet,
+            **simplify_options,
+        )
 
     logger.info("Writing nucleus predictions")
-    write_shapes(np.squeeze(predictions[..., 1]), args.nucleus_output_uri)
+    nucleus_predictions = np.squeeze(predictions[..., 1])
+    write_shapes(nucleus_predictions, args.nucleus_output_uri, **simplify_options)
+    if args.nucleus_parquet_output_uri:
+        write_shapes(
+            nucleus_predictions,
+            args.nucleus_parquet_output_uri,
+            shapes.write_geoparquet,
+            **simplify_options,
+        )
 
 
-def write_shapes(predictions, output_uri):
+def write_shapes(predictions, output_uri, writer=shapes.write_shapes, **kwargs):
     logger = logging.getLogger(__name__)
 
-    logger.info("Detecting predicted shapes")
+    logger.info("Writing shapes to %s" % output_uri)
     t = timeit.default_timer()
 
-    # Don't put a shape around the background.
-    mask = predictions != 0
-
-    # Extract the polygon from the result pair.
-    shapes = list(x[0] for x in features.shapes(predictions, mask, connectivity=8))
-
-    # Release references to free memory if needed
-    predictions = mask = None
+    # Shapes are detected in parallel bands, and streamed to the output.
+    stats = {}
+    with gs_fastcopy.write(output_uri) as output_writer:
+        num_shapes = writer(predictions, output_writer, stats=stats, **kwargs)
 
     logger.info(
-        "Detected %s shapes in %s s",
-        len(shapes),
+        "Detected & wrote %s shapes in %s s",
+        num_shapes,
         round(timeit.default_timer() - t, 2),
     )
-
-    logger.info("Writing shapes to %s" % output_uri)
-    t = timeit.default_timer()
-
-    with gs_fastcopy.write(output_uri) as output_writer:
-        for shape in shapes:
-            output_writer.write(json.dumps(shape).encode())
-            output_writer.write(b"\n")
-
-    output_json_time_s = timeit.default_timer() - t
-    logger.info("Wrote %s shapes in %s s", len(shapes), round(output_json_time_s, 2))
+    logger.info(
+        "Wrote %s of %s traced vertices, %s of %s bytes",
+        stats["vertices"],
+        stats["traced_vertices"],
+        stats["bytes"],
+        stats["traced_bytes"],
+    )
 
 
 if __name__ == "__main__":
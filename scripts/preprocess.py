@@ -20,6 +20,7 @@ import smart_open
 import deepcell_imaging
 from deepcell_imaging import gcp_logging, benchmark_utils, mesmer_app
 from deepcell_imaging.gcp_batch_jobs.types import PreprocessArgs
+from deepcell_imaging.utils import intermediates
 from deepcell_imaging.utils.cmdline import get_task_arguments
 
 
@@ -67,12 +68,18 @@ def main():
         % (round(preprocessing_time_s, 2), success)
     )
 
+    output_stats = {}
     if success:
         logger.info("Saving preprocessing output to %s" % output_uri)
         t = timeit.default_timer()
 
-        with gs_fastcopy.write(output_uri) as output_writer:
-            np.savez(output_writer, image=preprocessed_image)
+        upload_future = intermediates.write_arrays(
+            output_uri,
+            {"image": preprocessed_image},
+            local_scratch_dir=args.local_scratch_dir,
+            compression_level=args.compression_level,
+            stats=output_stats,
+        )
 
         output_time_s = timeit.default_timer() - t
 
@@ -80,6 +87,12 @@ def main():
     else:
         logger.warning("Not saving failed preprocessing output.")
         output_time_s = 0.0
+        upload_future = None
+
+    if upload_future:
+        # Wait for the background upload, so it doesn't outlive the task.
+        logger.info("Waiting for output upload to finish")
+        upload_future.result()
 
     # Gather & output timing information
 
@@ -102,7 +115,11 @@ def main():
             "preprocessing_is_preemptible": benchmark_utils.get_gce_is_preemptible(),
             "preprocessing_input_load_time_s": input_load_time_s,
             "preprocessing_time_s": preprocessing_time_s,
+            "intermediate_format": intermediates.get_intermediate_format(output_uri),
+            "intermediate_compression_level": args.compression_level,
             "preprocessing_output_write_time_s": output_time_s,
+            "preprocessing_output_compress_time_s": output_stats.get("compress_time_s"),
+            "preprocessing_output_size_mb": output_stats.get("size_mb"),
         }
 
         with smart_open.open(benchmark_output_uri, "w") as benchmark_output_file:
@@ -5,6 +5,9 @@ Segment a collection of images using DeepCell, then measure cells using QuPath.
 This script submits a Batch job to run DeepCell. Upon completion, the job submits
 the subsequent QuPath job.
 
+With --native_measurement, the cells are measured in the DeepCell job instead
+(see scripts/measure.py), and no QuPath job is submitted.
+
 ℹ NOTE: This script assumes the input images have already been converted to
 intermediate numpy files.
 """
@@ -31,7 +34,11 @@ from deepcell_imaging.utils.cmdline import (
     get_dataset_paths,
     parse_compute_config,
 )
-from deepcell_imaging.utils.storage import get_blob_filenames
+from deepcell_imaging.utils.intermediates import (
+    DEFAULT_INTERMEDIATE_FORMAT,
+    INTERMEDIATE_FORMATS,
+)
+from deepcell_imaging.utils.storage import get_blob_filenames, get_blob_uris
 
 
 def main():
@@ -71,6 +78,82 @@ def main():
         action="store_true",
     )
 
+    parser.add_argument(
+        "--intermediate_format",
+        help="File format for intermediate arrays passed between phases",
+        type=str,
+        choices=INTERMEDIATE_FORMATS,
+        default=DEFAULT_INTERMEDIATE_FORMAT,
+    )
+    parser.add_argument(
+        "--intermediate_compression_level",
+        help="Compression level for compressed intermediate formats. Default: the codec's default level",
+        type=int,
+        default=None,
+    )
+    parser.add_argument(
+        "--rle_predictions",
+        help="Run-length encode the predicted label masks passed to later phases",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--parquet_shapes",
+        help="Also write the cell & nucleus polygons as GeoParquet, next to the GeoJSON",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--shape_simplify_tolerance",
+        help="Simplify cell polygons with Douglas-Peucker, with this tolerance in pixels (eg 0.5-1 to smooth out pixel steps). Touching cells share each simplified border. Default: keep every traced vertex",
+        type=float,
+        default=None,
+    )
+    parser.add_argument(
+        "--integer_shape_coordinates",
+        help="Write GeoJSON polygon coordinates as integers (lossless for pixel edges)",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--native_measurement",
+        help="Measure cell area, centroid, bounding box & channel intensities in the segmentation job, instead of submitting a QuPath job",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--cell_adjacency",
+        help="Also write an edge list of touching cells, next to the masks",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--cell_knn",
+        help="Also write an edge list linking each cell to its nearest cells by centroid, next to the masks",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--memory_lean_postprocess",
+        help="Postprocess without full-size temporary arrays: smooth the predictions in place as float32, & label with uint32",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--trace_postprocess_memory",
+        help="Benchmark the peak memory of each postprocessing step (slows down postprocessing a bit)",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--whole_cell_from_nuclei",
+        help="Seed the whole-cell watershed with the nuclear labels (compartment both), so each cell has the same id as its nucleus",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--postprocess_workers",
+        help="How many frames of a batch to postprocess at the same time, in threads. Default: 1",
+        type=int,
+        default=1,
+    )
+    parser.add_argument(
+        "--local_scratch",
+        help="Pass intermediates between phases via the VM's workspace disk, memory-mapping them instead of downloading from GCS",
+        action="store_true",
+    )
+
     add_dataset_parameters(parser, require_measurement_parameters=True)
 
     args = parser.parse_args()
@@ -88,7 +171,13 @@ def main():
 
     logger.info("Fetching images")
 
-    image_paths = get_blob_filenames(dataset_paths["image_root"], client=client)
+    if args.native_measurement:
+        # The measure phase needs each image's full OME-TIFF URI.
+        image_uris = get_blob_uris(dataset_paths["image_root"], client=client)
+        image_paths = set(image_uris.keys())
+    else:
+        image_uris = None
+        image_paths = get_blob_filenames(dataset_paths["image_root"], client=client)
     image_paths = [
         x for x in image_paths if (not args.image_filter or x == args.image_filter)
     ]
@@ -102,6 +191,11 @@ def main():
             dataset_paths["npz_root"],
             npz_paths,
             dataset_paths["masks_output_root"],
+            parquet_shapes=args.parquet_shapes,
+            cell_adjacency=args.cell_adjacency,
+            cell_knn=args.cell_knn,
+            image_uris=image_uris,
+            reports_root=dataset_paths["reports_root"],
         )
     )
 
@@ -131,23 +225,35 @@ def main():
         compute_config=segment_compute_config,
         service_account=env_config.service_account,
         visualize=args.visualize,
+        intermediate_format=args.intermediate_format,
+        local_scratch=args.local_scratch,
+        intermediate_compression_level=args.intermediate_compression_level,
+        rle_predictions=args.rle_predictions,
+        shape_simplify_tolerance=args.shape_simplify_tolerance,
+        integer_shape_coordinates=args.integer_shape_coordinates,
+        memory_lean_postprocess=args.memory_lean_postprocess,
+        trace_postprocess_memory=args.trace_postprocess_memory,
+        whole_cell_from_nuclei=args.whole_cell_from_nuclei,
+        postprocess_workers=args.postprocess_workers,
+        measure=args.native_measurement,
     )
 
-    # Note that we use the SEGMENT container here, not quantify,
-    # because we launch the quantify job FROM the segment job.
-    append_quantify_enqueuer(
-        job,
-        env_config.segment_container_image,
-        EnqueueQuantifyArgs(
-            images_path=dataset_paths["image_root"],
-            segmasks_path=dataset_paths["masks_output_root"],
-            project_path=dataset_paths["project_root"],
-            reports_path=dataset_paths["reports_root"],
-            image_filter=args.image_filter,
-            compute_config=args.measurement_compute_config,
-        ),
-        env_config_uri=args.env_config_uri,
-    )
+    if not args.native_measurement:
+        # Note that we use the SEGMENT container here, not quantify,
+        # because we launch the quantify job FROM the segment job.
+        append_quantify_enqueuer(
+            job,
+            env_config.segment_container_image,
+            EnqueueQuantifyArgs(
+                images_path=dataset_paths["image_root"],
+                segmasks_path=dataset_paths["masks_output_root"],
+                project_path=dataset_paths["project_root"],
+                reports_path=dataset_paths["reports_root"],
+                image_filter=args.image_filter,
+                compute_config=args.measurement_compute_config,
+            ),
+            env_config_uri=args.env_config_uri,
+        )
 
     logger.info("Uploading task files")
     upload_tasks(job["tasks"])
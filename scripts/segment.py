@@ -30,6 +30,10 @@ from deepcell_imaging.utils.cmdline import (
     get_dataset_paths,
     parse_compute_config,
 )
+from deepcell_imaging.utils.intermediates import (
+    DEFAULT_INTERMEDIATE_FORMAT,
+    INTERMEDIATE_FORMATS,
+)
 from deepcell_imaging.utils.storage import get_blob_filenames
 
 
@@ -64,6 +68,77 @@ def main():
         action="store_true",
     )
 
+    parser.add_argument(
+        "--intermediate_format",
+        help="File format for intermediate arrays passed between phases",
+        type=str,
+        choices=INTERMEDIATE_FORMATS,
+        default=DEFAULT_INTERMEDIATE_FORMAT,
+    )
+    parser.add_argument(
+        "--intermediate_compression_level",
+        help="Compression level for compressed intermediate formats. Default: the codec's default level",
+        type=int,
+        default=None,
+    )
+    parser.add_argument(
+        "--rle_predictions",
+        help="Run-length encode the predicted label masks passed to later phases",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--parquet_shapes",
+        help="Also write the cell & nucleus polygons as GeoParquet, next to the GeoJSON",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--shape_simplify_tolerance",
+        help="Simplify cell polygons with Douglas-Peucker, with this tolerance in pixels (eg 0.5-1 to smooth out pixel steps). Touching cells share each simplified border. Default: keep every traced vertex",
+        type=float,
+        default=None,
+    )
+    parser.add_argument(
+        "--integer_shape_coordinates",
+        help="Write GeoJSON polygon coordinates as integers (lossless for pixel edges)",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--cell_adjacency",
+        help="Also write an edge list of touching cells, next to the masks",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--cell_knn",
+        help="Also write an edge list linking each cell to its nearest cells by centroid, next to the masks",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--memory_lean_postprocess",
+        help="Postprocess without full-size temporary arrays: smooth the predictions in place as float32, & label with uint32",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--trace_postprocess_memory",
+        help="Benchmark the peak memory of each postprocessing step (slows down postprocessing a bit)",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--whole_cell_from_nuclei",
+        help="Seed the whole-cell watershed with the nuclear labels (compartment both), so each cell has the same id as its nucleus",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--postprocess_workers",
+        help="How many frames of a batch to postprocess at the same time, in threads. Default: 1",
+        type=int,
+        default=1,
+    )
+    parser.add_argument(
+        "--local_scratch",
+        help="Pass intermediates between phases via the VM's workspace disk, memory-mapping them instead of downloading from GCS",
+        action="store_true",
+    )
+
     add_dataset_parameters(parser, require_measurement_parameters=False)
 
     args = parser.parse_args()
@@ -93,6 +168,9 @@ def main():
             dataset_paths["npz_root"],
             npz_paths,
             dataset_paths["masks_output_root"],
+            parquet_shapes=args.parquet_shapes,
+            cell_adjacency=args.cell_adjacency,
+            cell_knn=args.cell_knn,
         )
     )
 
@@ -122,6 +200,16 @@ def main():
         service_account=env_config.service_account,
         networking_interface=env_config.networking_interface,
         visualize=args.visualize,
+        intermediate_format=args.intermediate_format,
+        local_scratch=args.local_scratch,
+        intermediate_compression_level=args.intermediate_compression_level,
+        rle_predictions=args.rle_predictions,
+        shape_simplify_tolerance=args.shape_simplify_tolerance,
+        integer_shape_coordinates=args.integer_shape_coordinates,
+        memory_lean_postprocess=args.memory_lean_postprocess,
+        trace_postprocess_memory=args.trace_postprocess_memory,
+        whole_cell_from_nuclei=args.whole_cell_from_nuclei,
+        postprocess_workers=args.postprocess_workers,
     )
 
     logger.info("Uploading task files")
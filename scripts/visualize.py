@@ -19,6 +19,7 @@ import deepcell_imaging
 from deepcell_imaging import gcp_logging
 from deepcell_imaging.gcp_batch_jobs.types import VisualizeArgs
 from deepcell_imaging.patched_plot_utils import create_rgb_image, make_outline_overlay
+from deepcell_imaging.utils import intermediates
 from deepcell_imaging.utils.cmdline import get_task_arguments
 
 
@@ -48,10 +49,10 @@ def main():
     logger.info("Loading predictions")
 
     t = timeit.default_timer()
-    with gs_fastcopy.read(predictions_uri) as file:
-        with np.load(file) as loader:
-            # An array of shape [height, width, channel] containing intensity of nuclear & membrane channels
-            predictions = loader["image"]
+    # An array of shape [height, width, channel] containing intensity of nuclear & membrane channels
+    predictions = intermediates.read_labels(
+        predictions_uri, local_scratch_dir=args.local_scratch_dir
+    )
     predictions_load_time_s = timeit.default_timer() - t
 
     logger.info("Loaded predictions in %s s" % predictions_load_time_s)
@@ -55,6 +55,24 @@ def extensions():
             extra_compile_args=["-DNPY_NO_DEPRECATED_API=NPY_1_9_API_VERSION"],
             include_dirs=[numpy.get_include()],
         ),
+        relabel_cy=setuptools.extension.Extension(
+            f"{PACKAGE_NAME}.image_processing.relabel_cy",
+            sources=[f"{PACKAGE_SRC}/image_processing/relabel_cy{cy_ext}"],
+            extra_compile_args=["-DNPY_NO_DEPRECATED_API=NPY_1_9_API_VERSION"],
+            include_dirs=[numpy.get_include()],
+        ),
+        dynamics_cy=setuptools.extension.Extension(
+            f"{PACKAGE_NAME}.image_processing.dynamics_cy",
+            sources=[f"{PACKAGE_SRC}/image_processing/dynamics_cy{cy_ext}"],
+            extra_compile_args=["-DNPY_NO_DEPRECATED_API=NPY_1_9_API_VERSION"],
+            include_dirs=[numpy.get_include()],
+        ),
+        peaks_cy=setuptools.extension.Extension(
+            f"{PACKAGE_NAME}.image_processing.peaks_cy",
+            sources=[f"{PACKAGE_SRC}/image_processing/peaks_cy{cy_ext}"],
+            extra_compile_args=["-DNPY_NO_DEPRECATED_API=NPY_1_9_API_VERSION"],
+            include_dirs=[numpy.get_include()],
+        ),
     )
     if cy_ext == f"{os.extsep}pyx":
         ext_modules = list()
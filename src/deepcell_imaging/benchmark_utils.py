@@ -4,6 +4,7 @@ import platform
 import re
 import requests
 import resource
+import tracemalloc
 import traceback
 
 from urllib3.exceptions import NameResolutionError
@@ -129,3 +130,33 @@ def get_peak_memory_gb():
         memory_unit_factor = 1000000
 
     return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / memory_unit_factor
+
+
+class StepPeakMemory:
+    """Tracks the peak memory in use during each step of some processing.
+
+    Call step_done(name) as each step finishes: it records the peak since the
+    previous step (or since tracking started). The peak includes memory still
+    held from earlier steps, so it's what the machine needs for that step. A
+    repeated step (eg per compartment) keeps its highest peak.
+
+    This uses tracemalloc, which sees numpy arrays & Python objects, but not
+    native buffers (eg the watershed's priority queue).
+    """
+
+    def __init__(self):
+        self.peaks_gb = {}
+        self._started_tracing = not tracemalloc.is_tracing()
+        if self._started_tracing:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+
+    def step_done(self, name):
+        _, peak = tracemalloc.get_traced_memory()
+        self.peaks_gb[name] = max(self.peaks_gb.get(name, 0.0), peak / 1000000000)
+        tracemalloc.reset_peak()
+
+    def stop(self):
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
@@ -24,6 +24,11 @@ from deepcell_imaging.gcp_batch_jobs.types import (
     ComputeConfig,
     ServiceAccountConfig,
     PredictionsToGeoJsonArgs,
+    MeasureArgs,
+)
+from deepcell_imaging.utils.intermediates import (
+    DEFAULT_INTERMEDIATE_FORMAT,
+    INTERMEDIATE_FORMATS,
 )
 from deepcell_imaging.utils.numpy import npz_headers
 from deepcell_imaging.utils.storage import find_matching_npz
@@ -70,6 +75,7 @@ def create_segmenting_runnable(
         "predict",
         "postprocess",
         "predictions-to-geojson",
+        "measure",
         "gather-benchmark",
         "visualize",
     ]:
@@ -87,10 +93,19 @@ def create_segmenting_runnable(
     }
 
 
+def _predictions_uri(task_directory, intermediate_format, rle_predictions):
+    if rle_predictions:
+        return f"{task_directory}/predictions.rle.{intermediate_format}"
+    return f"{task_directory}/predictions.{intermediate_format}"
+
+
 def make_segment_preprocess_tasks(
     tasks: list[SegmentationTask],
     working_directory: str,
     bigquery_benchmarking_table: str,
+    intermediate_format: str = DEFAULT_INTERMEDIATE_FORMAT,
+    local_scratch_dir: str = "",
+    compression_level: Optional[int] = None,
 ):
     preprocess_tasks = []
     for index, task in enumerate(tasks):
@@ -99,12 +114,14 @@ def make_segment_preprocess_tasks(
             PreprocessArgs(
                 image_uri=task.input_channels_path,
                 image_name=task.image_name,
-                output_uri=f"{task_directory}/preprocessed.npz.gz",
+                output_uri=f"{task_directory}/preprocessed.{intermediate_format}",
                 benchmark_output_uri=(
                     f"{task_directory}/preprocess_benchmark.json"
                     if bigquery_benchmarking_table
                     else ""
                 ),
+                local_scratch_dir=local_scratch_dir,
+                compression_level=compression_level,
             )
         )
 
@@ -117,6 +134,9 @@ def make_segment_predict_tasks(
     tasks: list[SegmentationTask],
     working_directory: str,
     bigquery_benchmarking_table: str,
+    intermediate_format: str = DEFAULT_INTERMEDIATE_FORMAT,
+    local_scratch_dir: str = "",
+    compression_level: Optional[int] = None,
 ):
     predict_tasks = []
     for index, task in enumerate(tasks):
@@ -125,13 +145,15 @@ def make_segment_predict_tasks(
             PredictArgs(
                 model_path=model_path,
                 model_hash=model_hash,
-                image_uri=f"{task_directory}/preprocessed.npz.gz",
-                output_uri=f"{task_directory}/raw_predictions.npz.gz",
+                image_uri=f"{task_directory}/preprocessed.{intermediate_format}",
+                output_uri=f"{task_directory}/raw_predictions.{intermediate_format}",
                 benchmark_output_uri=(
                     f"{task_directory}/predict_benchmark.json"
                     if bigquery_benchmarking_table
                     else ""
                 ),
+                local_scratch_dir=local_scratch_dir,
+                compression_level=compression_level,
             )
         )
 
@@ -143,16 +165,34 @@ def make_segment_postprocess_tasks(
     working_directory: str,
     compartment: str,
     bigquery_benchmarking_table: Optional[str] = None,
+    intermediate_format: str = DEFAULT_INTERMEDIATE_FORMAT,
+    local_scratch_dir: str = "",
+    compression_level: Optional[int] = None,
+    rle_predictions: bool = False,
+    memory_lean_postprocess: bool = False,
+    trace_postprocess_memory: bool = False,
+    whole_cell_from_nuclei: bool = False,
+    postprocess_workers: int = 1,
 ):
+    if whole_cell_from_nuclei and compartment != "both":
+        raise ValueError(
+            "Whole cells can only be grown from nuclei with compartment 'both', "
+            f"not: {compartment}"
+        )
+
     postprocess_tasks = []
     for index, task in enumerate(tasks):
         task_directory = f"{working_directory}/task_{index}"
         postprocess_tasks.append(
             PostprocessArgs(
-                raw_predictions_uri=f"{task_directory}/raw_predictions.npz.gz",
-                output_uri=f"{task_directory}/predictions.npz.gz",
+                raw_predictions_uri=f"{task_directory}/raw_predictions.{intermediate_format}",
+                output_uri=_predictions_uri(
+                    task_directory, intermediate_format, rle_predictions
+                ),
                 wholecell_tiff_output_uri=f"{task.wholecell_tiff_output_uri}",
                 nuclear_tiff_output_uri=f"{task.nuclear_tiff_output_uri}",
+                wholecell_adjacency_output_uri=task.wholecell_adjacency_output_uri,
+                wholecell_knn_output_uri=task.wholecell_knn_output_uri,
                 input_rows=task.input_image_rows,
                 input_cols=task.input_image_cols,
                 compartment=compartment,
@@ -161,6 +201,12 @@ def make_segment_postprocess_tasks(
                     if bigquery_benchmarking_table
                     else ""
                 ),
+                local_scratch_dir=local_scratch_dir,
+                compression_level=compression_level,
+                memory_lean=memory_lean_postprocess,
+                trace_memory=trace_postprocess_memory,
+                whole_cell_from_nuclei=whole_cell_from_nuclei,
+                num_workers=postprocess_workers,
             )
         )
 
@@ -170,21 +216,63 @@ def make_segment_postprocess_tasks(
 def make_segment_geojson_tasks(
     tasks: list[SegmentationTask],
     working_directory: str,
+    intermediate_format: str = DEFAULT_INTERMEDIATE_FORMAT,
+    local_scratch_dir: str = "",
+    rle_predictions: bool = False,
+    shape_simplify_tolerance: Optional[float] = None,
+    integer_shape_coordinates: bool = False,
 ):
     geojson_tasks = []
     for index, task in enumerate(tasks):
         task_directory = f"{working_directory}/task_{index}"
         geojson_tasks.append(
             PredictionsToGeoJsonArgs(
-                predictions_uri=f"{task_directory}/predictions.npz.gz",
+                predictions_uri=_predictions_uri(
+                    task_directory, intermediate_format, rle_predictions
+                ),
                 whole_cell_output_uri=f"{task.wholecell_geojson_output_uri}",
                 nucleus_output_uri=f"{task.nuclear_geojson_output_uri}",
+                whole_cell_parquet_output_uri=task.wholecell_parquet_output_uri,
+                nucleus_parquet_output_uri=task.nuclear_parquet_output_uri,
+                local_scratch_dir=local_scratch_dir,
+                simplify_tolerance=shape_simplify_tolerance,
+                integer_coordinates=integer_shape_coordinates,
             )
         )
 
     return geojson_tasks
 
 
+def make_segment_measure_tasks(
+    tasks: list[SegmentationTask],
+    working_directory: str,
+    intermediate_format: str = DEFAULT_INTERMEDIATE_FORMAT,
+    local_scratch_dir: str = "",
+    rle_predictions: bool = False,
+):
+    measure_tasks = []
+    for index, task in enumerate(tasks):
+        if not task.image_uri or not task.measurement_output_uri:
+            raise ValueError(
+                f"Can't measure {task.image_name}: no image or measurement output URI"
+            )
+
+        task_directory = f"{working_directory}/task_{index}"
+        measure_tasks.append(
+            MeasureArgs(
+                image_uri=task.image_uri,
+                image_name=task.image_name,
+                predictions_uri=_predictions_uri(
+                    task_directory, intermediate_format, rle_predictions
+                ),
+                output_uri=task.measurement_output_uri,
+                local_scratch_dir=local_scratch_dir,
+            )
+        )
+
+    return measure_tasks
+
+
 def make_segment_benchmark_tasks(
     tasks: list[SegmentationTask],
     working_directory: str,
@@ -217,6 +305,9 @@ def make_segment_visualize_tasks(
     tasks: list[SegmentationTask],
     working_directory: str,
     image_array_name: str,
+    intermediate_format: str = DEFAULT_INTERMEDIATE_FORMAT,
+    local_scratch_dir: str = "",
+    rle_predictions: bool = False,
 ):
     visualize_tasks = []
     for index, task in enumerate(tasks):
@@ -225,9 +316,12 @@ def make_segment_visualize_tasks(
             VisualizeArgs(
                 image_uri=task.input_channels_path,
                 image_array_name=image_array_name,
-                predictions_uri=f"{task_directory}/predictions.npz.gz",
+                predictions_uri=_predictions_uri(
+                    task_directory, intermediate_format, rle_predictions
+                ),
                 visualized_input_uri=f"{task_directory}/visualized_input.png",
                 visualized_predictions_uri=f"{task_directory}/visualized_predictions.png",
+                local_scratch_dir=local_scratch_dir,
             )
         )
 
@@ -256,18 +350,72 @@ def build_segment_job_tasks(
     compute_config: ComputeConfig = None,
     service_account: ServiceAccountConfig = None,
     config: dict = None,
+    intermediate_format: str = DEFAULT_INTERMEDIATE_FORMAT,
+    local_scratch: bool = False,
+    intermediate_compression_level: Optional[int] = None,
+    rle_predictions: bool = False,
+    shape_simplify_tolerance: Optional[float] = None,
+    integer_shape_coordinates: bool = False,
+    measure: bool = False,
+    memory_lean_postprocess: bool = False,
+    trace_postprocess_memory: bool = False,
+    whole_cell_from_nuclei: bool = False,
+    postprocess_workers: int = 1,
 ) -> dict:
+    if intermediate_format not in INTERMEDIATE_FORMATS:
+        raise ValueError(
+            f"Invalid intermediate format: {intermediate_format}. "
+            f"Must be one of {INTERMEDIATE_FORMATS}"
+        )
+
+    volume_name = "deepcell-workspace"
+    tmp_dir = "/mnt/disks/deepcell-workspace"
+
+    # The phases all run on the same VM, so they can pass intermediates
+    # through the workspace disk instead of round-tripping them via GCS.
+    local_scratch_dir = f"{tmp_dir}/scratch" if local_scratch else ""
 
     preprocess_tasks = make_segment_preprocess_tasks(
-        tasks, working_directory, bigquery_benchmarking_table
+        tasks,
+        working_directory,
+        bigquery_benchmarking_table,
+        intermediate_format,
+        local_scratch_dir,
+        intermediate_compression_level,
     )
     predict_tasks = make_segment_predict_tasks(
-        model_path, model_hash, tasks, working_directory, bigquery_benchmarking_table
+        model_path,
+        model_hash,
+        tasks,
+        working_directory,
+        bigquery_benchmarking_table,
+        intermediate_format,
+        local_scratch_dir,
+        intermediate_compression_level,
     )
     postprocess_tasks = make_segment_postprocess_tasks(
-        tasks, working_directory, compartment, bigquery_benchmarking_table
+        tasks,
+        working_directory,
+        compartment,
+        bigquery_benchmarking_table,
+        intermediate_format,
+        local_scratch_dir,
+        intermediate_compression_level,
+        rle_predictions,
+        memory_lean_postprocess,
+        trace_postprocess_memory,
+        whole_cell_from_nuclei,
+        postprocess_workers,
+    )
+    geojson_tasks = make_segment_geojson_tasks(
+        tasks,
+        working_directory,
+        intermediate_format,
+        local_scratch_dir,
+        rle_predictions,
+        shape_simplify_tolerance,
+        integer_shape_coordinates,
     )
-    geojson_tasks = make_segment_geojson_tasks(tasks, working_directory)
     gather_benchmark_tasks = make_segment_benchmark_tasks(
         tasks, working_directory, bigquery_benchmarking_table
     )
@@ -286,9 +434,25 @@ def build_segment_job_tasks(
         "gather-benchmark": (gather_benchmark_tasks, gather_benchmark_tasks_spec_uri),
     }
 
+    if measure:
+        measure_tasks = make_segment_measure_tasks(
+            tasks,
+            working_directory,
+            intermediate_format,
+            local_scratch_dir,
+            rle_predictions,
+        )
+        measure_tasks_spec_uri = f"{working_directory}/measure_tasks.json"
+        phase_task_defs["measure"] = (measure_tasks, measure_tasks_spec_uri)
+
     if visualize:
         visualize_tasks = make_segment_visualize_tasks(
-            tasks, working_directory, "input_channels"
+            tasks,
+            working_directory,
+            "input_channels",
+            intermediate_format,
+            local_scratch_dir,
+            rle_predictions,
         )
         visualize_tasks_spec_uri = f"{working_directory}/visualize_tasks.json"
         phase_task_defs["visualize"] = (visualize_tasks, visualize_tasks_spec_uri)
@@ -304,11 +468,17 @@ def build_segment_job_tasks(
         create_segmenting_runnable(
             container_image, "predictions-to-geojson", phase_task_defs
         ),
-        create_segmenting_runnable(
-            container_image, "gather-benchmark", phase_task_defs
-        ),
     ]
 
+    if measure:
+        job["taskGroups"][0]["taskSpec"]["runnables"].append(
+            create_segmenting_runnable(container_image, "measure", phase_task_defs)
+        )
+
+    job["taskGroups"][0]["taskSpec"]["runnables"].append(
+        create_segmenting_runnable(container_image, "gather-benchmark", phase_task_defs)
+    )
+
     if visualize:
         job["taskGroups"][0]["taskSpec"]["runnables"].append(
             create_segmenting_runnable(container_image, "visualize", phase_task_defs)
@@ -335,9 +505,11 @@ def build_segment_job_tasks(
         [task.input_image_rows * task.input_image_cols for task in tasks]
     )
     size_in_bytes = biggest_pixels * 8 * 4
+    if local_scratch:
+        # The scratch copies of every intermediate stay on the disk, next to
+        # the temporary files used while uploading them.
+        size_in_bytes *= 2
 
-    volume_name = "deepcell-workspace"
-    tmp_dir = "/mnt/disks/deepcell-workspace"
     add_attached_disk(job, volume_name, size_in_bytes // 1024 // 1024 // 1024)
     add_task_volume(job, tmp_dir, volume_name)
     set_task_environment_variable(job, "TMPDIR", tmp_dir)
@@ -354,7 +526,23 @@ def build_segment_job_tasks(
     return {"job_definition": job, "tasks": phase_task_defs}
 
 
-def make_segmentation_tasks(image_names, npz_root, npz_names, masks_output_root):
+def make_segmentation_tasks(
+    image_names,
+    npz_root,
+    npz_names,
+    masks_output_root,
+    parquet_shapes=False,
+    image_uris=None,
+    reports_root="",
+    cell_adjacency=False,
+    cell_knn=False,
+):
+    """Make a task for each image with a matching npz.
+
+    To measure the cells (see make_segment_measure_tasks), pass image_uris
+    (a dict of image name to OME-TIFF URI) & the reports_root to write the
+    measurements to.
+    """
     matched_images = find_matching_npz(image_names, npz_root, npz_names)
 
     for image_name, npz_path in matched_images:
@@ -368,6 +556,32 @@ def make_segmentation_tasks(image_names, npz_root, npz_names, masks_output_root)
         nuclear_geojson_output_uri = (
             f"{masks_output_root}/{image_name}_NucleusShapes.jsonl"
         )
+        if parquet_shapes:
+            wholecell_parquet_output_uri = (
+                f"{masks_output_root}/{image_name}_WholeCellShapes.parquet"
+            )
+            nuclear_parquet_output_uri = (
+                f"{masks_output_root}/{image_name}_NucleusShapes.parquet"
+            )
+        else:
+            wholecell_parquet_output_uri = ""
+            nuclear_parquet_output_uri = ""
+
+        wholecell_adjacency_output_uri = (
+            f"{masks_output_root}/{image_name}_WholeCellAdjacency.tsv"
+            if cell_adjacency
+            else ""
+        )
+        wholecell_knn_output_uri = (
+            f"{masks_output_root}/{image_name}_WholeCellNeighbors.tsv"
+            if cell_knn
+            else ""
+        )
+
+        image_uri = image_uris.get(image_name, "") if image_uris else ""
+        measurement_output_uri = (
+            f"{reports_root}/{image_name}_QUANT.tsv" if reports_root else ""
+        )
 
         input_file_contents = list(npz_headers(npz_path))
         if len(input_file_contents) != 1:
@@ -381,6 +595,12 @@ def make_segmentation_tasks(image_names, npz_root, npz_names, masks_output_root)
             nuclear_tiff_output_uri=nuclear_tiff_output_uri,
             wholecell_geojson_output_uri=wholecell_geojson_output_uri,
             nuclear_geojson_output_uri=nuclear_geojson_output_uri,
+            wholecell_parquet_output_uri=wholecell_parquet_output_uri,
+            nuclear_parquet_output_uri=nuclear_parquet_output_uri,
+            image_uri=image_uri,
+            measurement_output_uri=measurement_output_uri,
+            wholecell_adjacency_output_uri=wholecell_adjacency_output_uri,
+            wholecell_knn_output_uri=wholecell_knn_output_uri,
             input_image_rows=input_image_shape[0],
             input_image_cols=input_image_shape[1],
         )
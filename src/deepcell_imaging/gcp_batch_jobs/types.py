@@ -110,6 +110,12 @@ class SegmentationTask(BaseModel):
     nuclear_tiff_output_uri: str = ""
     wholecell_geojson_output_uri: str = ""
     nuclear_geojson_output_uri: str = ""
+    wholecell_parquet_output_uri: str = ""
+    nuclear_parquet_output_uri: str = ""
+    image_uri: str = ""
+    measurement_output_uri: str = ""
+    wholecell_adjacency_output_uri: str = ""
+    wholecell_knn_output_uri: str = ""
     input_image_rows: int
     input_image_cols: int
 
@@ -137,6 +143,16 @@ class PreprocessArgs(BaseModel):
         title="Output URI",
         description="Where to write preprocessed input npz file containing an array named 'image'",
     )
+    local_scratch_dir: str = Field(
+        default="",
+        title="Local Scratch Directory",
+        description="Local directory (eg on the attached workspace disk) to also save uncompressed intermediates in, for later phases on the same VM to memory-map. The copy at the output URI is uploaded in the background. Default/blank: don't use a local copy.",
+    )
+    compression_level: Optional[int] = Field(
+        default=None,
+        title="Compression Level",
+        description="Compression level for the output intermediate, if its format is compressed (eg npz.zst). Default/blank: the codec's default level.",
+    )
     benchmark_output_uri: str = Field(
         default="",
         title="Benchmark Output URI",
@@ -160,6 +176,16 @@ class PredictArgs(BaseModel):
         title="Output URI",
         description="Where to write model output npz file containing arr_0, arr_1, arr_2, arr_3",
     )
+    local_scratch_dir: str = Field(
+        default="",
+        title="Local Scratch Directory",
+        description="Local directory (eg on the attached workspace disk) to check for memory-mappable copies of the input intermediates, and to save uncompressed output intermediates in. Output URIs are uploaded in the background. Default/blank: don't use a local copy.",
+    )
+    compression_level: Optional[int] = Field(
+        default=None,
+        title="Compression Level",
+        description="Compression level for the output intermediate, if its format is compressed (eg npz.zst). Default/blank: the codec's default level.",
+    )
     benchmark_output_uri: str = Field(
         default="",
         title="Benchmark Output URI",
@@ -195,7 +221,17 @@ class PostprocessArgs(BaseModel):
     )
     output_uri: str = Field(
         title="Output URI",
-        description="URI to write postprocessed segment predictions npz file containing an array named 'image'.",
+        description="URI to write postprocessed segment predictions npz file containing an array named 'image'. Run-length encoded if the URI contains .rle. (eg predictions.rle.npz.gz)",
+    )
+    local_scratch_dir: str = Field(
+        default="",
+        title="Local Scratch Directory",
+        description="Local directory (eg on the attached workspace disk) to check for memory-mappable copies of the input intermediates, and to save uncompressed output intermediates in. Output URIs are uploaded in the background. Default/blank: don't use a local copy.",
+    )
+    compression_level: Optional[int] = Field(
+        default=None,
+        title="Compression Level",
+        description="Compression level for the output intermediate, if its format is compressed (eg npz.zst). Default/blank: the codec's default level.",
     )
     wholecell_tiff_output_uri: str = Field(
         default="",
@@ -207,6 +243,41 @@ class PostprocessArgs(BaseModel):
         title="Nuclear segmentation Output URI",
         description="Where to write nuclear segmentation TIFF file. Default/blank: don't write TIFF file.",
     )
+    wholecell_adjacency_output_uri: str = Field(
+        default="",
+        title="Whole-Cell Adjacency Output URI",
+        description="Where to write the edge list (TSV) of touching whole cells. Default/blank: don't write the adjacency graph.",
+    )
+    wholecell_knn_output_uri: str = Field(
+        default="",
+        title="Whole-Cell kNN Output URI",
+        description="Where to write the edge list (TSV) linking each whole cell to its nearest cells by centroid. Default/blank: don't write the kNN graph.",
+    )
+    knn_neighbors: int = Field(
+        default=6,
+        title="kNN Neighbors",
+        description="Number of nearest cells to link each cell to, in the kNN graph.",
+    )
+    memory_lean: bool = Field(
+        default=False,
+        title="Memory Lean",
+        description="Whether to postprocess without full-size temporary arrays: smooth the predictions in place as float32, & label with uint32.",
+    )
+    trace_memory: bool = Field(
+        default=False,
+        title="Trace Memory",
+        description="Whether to trace the peak memory of each postprocessing step, for the benchmark. Slows down postprocessing a bit.",
+    )
+    num_workers: int = Field(
+        default=1,
+        title="Number of Workers",
+        description="How many frames of the batch to segment at the same time, in threads.",
+    )
+    whole_cell_from_nuclei: bool = Field(
+        default=False,
+        title="Whole Cell From Nuclei",
+        description="Whether to seed the whole-cell watershed with the nuclear labels, when segmenting both compartments: each cell then has the same id as its nucleus.",
+    )
     benchmark_output_uri: str = Field(
         default="",
         title="Benchmark Output URI",
@@ -227,6 +298,31 @@ class PredictionsToGeoJsonArgs(BaseModel):
         title="Nucleus Output URI",
         description="URI to write predicted nucleus polygons in GeoJSON.",
     )
+    whole_cell_parquet_output_uri: str = Field(
+        default="",
+        title="Whole Cell GeoParquet Output URI",
+        description="URI to write predicted cell polygons in GeoParquet, with each cell's label & bounding box. Default/blank: don't write GeoParquet.",
+    )
+    nucleus_parquet_output_uri: str = Field(
+        default="",
+        title="Nucleus GeoParquet Output URI",
+        description="URI to write predicted nucleus polygons in GeoParquet, with each nucleus's label & bounding box. Default/blank: don't write GeoParquet.",
+    )
+    simplify_tolerance: Optional[float] = Field(
+        default=None,
+        title="Simplify Tolerance",
+        description="Simplify polygons with Douglas-Peucker, with this tolerance in pixels. Touching cells share each simplified border. Default/None: keep every traced vertex.",
+    )
+    integer_coordinates: bool = Field(
+        default=False,
+        title="Integer Coordinates",
+        description="Write GeoJSON coordinates as integers (eg 12 instead of 12.0). Pixel-edge coordinates are always whole numbers, so this is lossless.",
+    )
+    local_scratch_dir: str = Field(
+        default="",
+        title="Local Scratch Directory",
+        description="Local directory (eg on the attached workspace disk) to check for memory-mappable copies of the intermediates before reading from the URI. Default/blank: don't use a local copy.",
+    )
 
 
 class VisualizeArgs(BaseModel):
@@ -251,6 +347,35 @@ class VisualizeArgs(BaseModel):
         title="Visualized Predictions URI",
         description="Where to write visualized predictions png file.",
     )
+    local_scratch_dir: str = Field(
+        default="",
+        title="Local Scratch Directory",
+        description="Local directory (eg on the attached workspace disk) to check for memory-mappable copies of the intermediates before reading from the URI. Default/blank: don't use a local copy.",
+    )
+
+
+class MeasureArgs(BaseModel):
+    image_uri: str = Field(
+        title="Image URI",
+        description="URI to the OME-TIFF image, with every channel to measure.",
+    )
+    image_name: str = Field(
+        title="Image Name",
+        description="Name of the image, for the report's Image column.",
+    )
+    predictions_uri: str = Field(
+        title="Predictions URI",
+        description="URI to post-processed predictions of shape (height, width, 2)",
+    )
+    output_uri: str = Field(
+        title="Output URI",
+        description="URI to write the per-cell measurements TSV.",
+    )
+    local_scratch_dir: str = Field(
+        default="",
+        title="Local Scratch Directory",
+        description="Local directory (eg on the attached workspace disk) to check for memory-mappable copies of the intermediates before reading from the URI. Default/blank: don't use a local copy.",
+    )
 
 
 class GatherBenchmarkArgs(BaseModel):
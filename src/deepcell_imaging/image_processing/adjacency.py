@@ -0,0 +1,142 @@
+"""
+Cell-neighbor graphs from a label mask, for spatial analysis.
+
+Two cells are in contact if any of their pixels touch (including
+diagonally, like the 8-connected shapes in shapes.py). We find every
+contact in one vectorized pass: compare the mask with itself shifted by
+one pixel in each direction, keep the pairs of different, non-background
+labels, and deduplicate them with np.unique. The mask is processed in
+bands of rows, so the temporary pair arrays stay small.
+
+Cells can also be linked to their k nearest neighbors by centroid
+distance, eg to connect cells separated by a thin gap of background.
+
+Graphs are sparse, undirected edge lists: each edge is listed once, with
+source < target.
+"""
+
+import csv
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+from deepcell_imaging.image_processing.measure import measure_shapes
+
+# Rows per band when comparing shifted labels.
+BAND_HEIGHT = 1024
+
+# (row, column) offsets to compare each pixel with. The opposite offsets
+# would find the same pairs, reversed.
+CONTACT_OFFSETS = [(0, 1), (1, -1), (1, 0), (1, 1)]
+
+
+def _band_contacts(labels, top, bottom):
+    """The pairs of touching labels, & their contact counts, in some rows."""
+    height, width = labels.shape
+    sources, targets = [], []
+    for row_offset, col_offset in CONTACT_OFFSETS:
+        # Compare rows [top, bottom) with the shifted rows, within the image.
+        shifted_bottom = min(bottom, height - row_offset)
+        left = max(0, -col_offset)
+        right = width - max(0, col_offset)
+        a = labels[top:shifted_bottom, left:right]
+        b = labels[
+            top + row_offset : shifted_bottom + row_offset,
+            left + col_offset : right + col_offset,
+        ]
+        touching = (a != b) & (a != 0) & (b != 0)
+        sources.append(a[touching])
+        targets.append(b[touching])
+
+    sources = np.concatenate(sources).astype(np.int64)
+    targets = np.concatenate(targets).astype(np.int64)
+    return np.minimum(sources, targets), np.maximum(sources, targets)
+
+
+def contact_edges(labels: np.ndarray) -> dict:
+    """The pairs of touching cells in a label mask.
+
+    Returns a dict of arrays, one entry per edge (sorted by source, then
+    target): source & target labels, and contact, the number of touching
+    pixel pairs (a rough measure of the length of the shared border).
+    """
+    if labels.ndim != 2:
+        raise ValueError("Expected a 2D label mask, got shape %s" % (labels.shape,))
+
+    num_labels = int(labels.max(initial=0)) + 1
+    keys, counts = [], []
+    for top in range(0, labels.shape[0], BAND_HEIGHT):
+        sources, targets = _band_contacts(labels, top, top + BAND_HEIGHT)
+        # Encode each pair as one integer, to deduplicate in one np.unique.
+        band_keys, band_counts = np.unique(
+            sources * num_labels + targets, return_counts=True
+        )
+        keys.append(band_keys)
+        counts.append(band_counts)
+
+    keys = np.concatenate(keys) if keys else np.empty(0, dtype=np.int64)
+    counts = np.concatenate(counts) if counts else np.empty(0, dtype=np.int64)
+    # Pairs touching in several bands are merged here.
+    keys, inverse = np.unique(keys, return_inverse=True)
+    contact = np.bincount(inverse, weights=counts, minlength=len(keys))
+
+    return {
+        "source": keys // num_labels,
+        "target": keys % num_labels,
+        "contact": contact.astype(np.int64),
+    }
+
+
+def knn_edges(labels: np.ndarray, k: int, shapes: dict = None) -> dict:
+    """Link each cell to its k nearest cells, by centroid distance.
+
+    shapes are the labels' shape measurements (see measure.measure_shapes),
+    computed if not given.
+
+    Returns a dict of arrays, one entry per edge (sorted by source, then
+    target): source & target labels, and the distance between their
+    centroids, in pixels.
+    """
+    if shapes is None:
+        shapes = measure_shapes(labels)
+
+    cells = shapes["label"]
+    k = min(k, len(cells) - 1)
+    if k < 1:
+        return {
+            "source": np.empty(0, dtype=np.int64),
+            "target": np.empty(0, dtype=np.int64),
+            "distance": np.empty(0, dtype=np.float64),
+        }
+
+    centroids = np.stack([shapes["centroid_x"], shapes["centroid_y"]], axis=1)
+    # Each centroid is among its own nearest points, but not necessarily
+    # first: cells can share a centroid (eg a ring around another cell).
+    distances, neighbors = cKDTree(centroids).query(centroids, k=k + 1)
+    # Drop the self match, keeping k neighbors per cell.
+    keep = neighbors != np.arange(len(cells))[:, np.newaxis]
+    keep &= np.cumsum(keep, axis=1) <= k
+    sources = np.repeat(np.arange(len(cells)), k)
+    targets = neighbors[keep]
+    distances = distances[keep]
+
+    # Neighbors are often mutual: keep each edge once.
+    low, high = np.minimum(sources, targets), np.maximum(sources, targets)
+    keys, index = np.unique(low * len(cells) + high, return_index=True)
+
+    return {
+        "source": cells[keys // len(cells)],
+        "target": cells[keys % len(cells)],
+        "distance": distances[index],
+    }
+
+
+def write_edges_tsv(f, edges: dict) -> int:
+    """Write an edge list as tab-separated values, one column per array.
+
+    Returns the number of edges written.
+    """
+    writer = csv.writer(f, delimiter="\t", lineterminator="\n")
+    writer.writerow(edges.keys())
+    writer.writerows(zip(*(column.tolist() for column in edges.values())))
+    return len(edges["source"])
@@ -0,0 +1,95 @@
+"""bucket_queue.pxi - a monotone bucket queue for flooding quantized
+priorities.
+
+The watershed floods in order of priority, then of age (the order pixels
+were pushed). With priorities quantized to a fixed number of levels, each
+level gets its own first-in-first-out bucket: pushing & popping are O(1),
+and popping in bucket order then FIFO order is exactly (priority, age)
+order.
+
+The flooding pushes a pixel below the level being popped at that level
+instead (its cost can't be lower than its flooded neighbor's), so the queue
+only moves forward: each bucket is freed once it's empty & passed.
+
+Allocation failures raise MemoryError.
+"""
+
+from libc.stdlib cimport calloc, free, realloc
+
+
+cdef struct BucketItem:
+    Py_ssize_t index
+    Py_ssize_t source
+
+cdef struct Bucket:
+    Py_ssize_t head
+    Py_ssize_t size
+    Py_ssize_t space
+    BucketItem *items
+
+cdef struct BucketQueue:
+    Py_ssize_t items
+    Py_ssize_t levels
+    Py_ssize_t level
+    Bucket *buckets
+
+
+cdef inline BucketQueue* bucket_queue_new(Py_ssize_t levels) except NULL nogil:
+    cdef BucketQueue *queue = <BucketQueue *> calloc(1, sizeof(BucketQueue))
+    if queue == NULL:
+        with gil:
+            raise MemoryError()
+    queue.levels = levels
+    queue.buckets = <Bucket *> calloc(levels, sizeof(Bucket))
+    if queue.buckets == NULL:
+        free(queue)
+        with gil:
+            raise MemoryError()
+    return queue
+
+
+@cython.exceptval(check=False)
+cdef inline void bucket_queue_done(BucketQueue *queue) nogil:
+    cdef Py_ssize_t level
+    for level in range(queue.level, queue.levels):
+        free(queue.buckets[level].items)
+    free(queue.buckets)
+    free(queue)
+
+
+@cython.boundscheck(False)
+cdef inline int bucket_push(BucketQueue *queue, Py_ssize_t level,
+                            Py_ssize_t index, Py_ssize_t source) except -1 nogil:
+    """Push onto the back of a level's bucket (at or after the current one)."""
+    cdef Bucket *bucket = &queue.buckets[level]
+    cdef Py_ssize_t space
+    cdef BucketItem *items
+    if bucket.size == bucket.space:
+        space = 2 * bucket.space if bucket.space else 64
+        items = <BucketItem *> realloc(bucket.items, space * sizeof(BucketItem))
+        if items == NULL:
+            # The bucket keeps its items, to be freed with the queue.
+            with gil:
+                raise MemoryError()
+        bucket.items = items
+        bucket.space = space
+    bucket.items[bucket.size].index = index
+    bucket.items[bucket.size].source = source
+    bucket.size += 1
+    queue.items += 1
+    return 0
+
+
+@cython.boundscheck(False)
+@cython.exceptval(check=False)
+cdef inline void bucket_pop(BucketQueue *queue, BucketItem *dest) nogil:
+    """Pop the oldest item of the lowest level. The queue mustn't be empty."""
+    cdef Bucket *bucket = &queue.buckets[queue.level]
+    while bucket.head == bucket.size:
+        free(bucket.items)
+        bucket.items = NULL
+        queue.level += 1
+        bucket = &queue.buckets[queue.level]
+    dest[0] = bucket.items[bucket.head]
+    bucket.head += 1
+    queue.items -= 1
@@ -0,0 +1,113 @@
+"""
+The dynamics of regional maxima, for h-maxima at many heights at once.
+
+A regional maximum's dynamic is how far a path from it must descend to
+reach a strictly higher pixel: its peak, minus the highest pass to any
+higher pixel. h_maxima(image, h) marks exactly the regional maxima with dynamic
+>= h. So, once every maximum's dynamic is computed, the h-maxima for any
+h are a threshold: tuning maxima_threshold needs one computation instead
+of one reconstruction per value.
+
+The dynamics are computed by union-find over the pixels in decreasing
+order: the order in which the image's max-tree (component tree) merges
+its components. When two components merge, the one with the lower peak
+dies: its maximum's dynamic is its peak minus the merge level. Equal
+peaks merge into one maximum, with one dynamic. The maxima that never
+die (the global maxima) get the image's range: they're h-maxima for any
+h that is at most the range, like in h_maxima.
+
+The actual implementation is written in Cython (see the .pyx file).
+"""
+
+import numpy as np
+
+from .dynamics_cy import maxima_dynamics_impl
+
+
+def maxima_dynamics(image, footprint=None):
+    """The dynamic of each pixel's regional maximum.
+
+    Args:
+        image (numpy.array): the image to find the maxima of
+        footprint (numpy.array): the neighborhood, as in ``h_maxima``, with
+            odd dimensions. It's made symmetric (as disks & balls are).
+            Default is the ball of radius 1 according to the maximum norm
+            (i.e. a 3x3 square for 2D images, a 3x3x3 cube for 3D images).
+
+    Returns:
+        numpy.array: for each pixel, the (float64) dynamic of the regional
+            maximum it's in, or 0 for pixels not in a regional maximum.
+    """
+    if footprint is None:
+        footprint = np.ones([3] * image.ndim, dtype=bool)
+    elif footprint.ndim != image.ndim:
+        raise ValueError("Footprint must have same ndim as image")
+    elif not all(d % 2 == 1 for d in footprint.shape):
+        raise ValueError("Footprint dimensions must all be odd")
+
+    if image.size == 0:
+        return np.zeros(image.shape, dtype=np.float64)
+
+    footprint = footprint.astype(bool) | np.flip(footprint.astype(bool))
+    radius = [d // 2 for d in footprint.shape]
+
+    # Padding lets every inside pixel reach all of its neighbors without
+    # bounds checks. The padding pixels are never visited.
+    padded = np.pad(image, [(r, r) for r in radius], mode="edge")
+    state = np.pad(np.ones(image.shape, dtype=np.uint8), [(r, r) for r in radius])
+
+    strides = np.array(padded.strides) // padded.itemsize
+    neighbors = np.argwhere(footprint) - radius
+    neighbors = neighbors[np.any(neighbors != 0, axis=1)]
+    offsets = (neighbors @ strides).astype(np.intp)
+
+    dynamics = np.zeros(padded.shape, dtype=np.float64)
+    maxima_dynamics_impl(
+        padded.reshape(-1),
+        state.reshape(-1),
+        np.argsort(padded, axis=None, kind="stable"),
+        offsets,
+        dynamics.reshape(-1),
+        float(np.ptp(image)),
+    )
+
+    return dynamics[tuple(slice(r, r + d) for r, d in zip(radius, image.shape))]
+
+
+def h_maxima_from_dynamics(dynamics, h, out=None):
+    """The h-maxima, from the maxima dynamics.
+
+    Gives the same result as ``h_maxima(image, h, footprint)`` for
+    ``dynamics = maxima_dynamics(image, footprint)``, up to h_maxima's
+    floating point resolution margin.
+
+    Args:
+        dynamics (numpy.array): the dynamics, from ``maxima_dynamics``
+        h (float): the minimal height of the maxima
+        out (numpy.array): optional uint8 array to write the maxima to
+
+    Returns:
+        numpy.array: a uint8 image, 1 for the h-maxima & 0 elsewhere.
+    """
+    if h <= 0:
+        raise ValueError("h = 0 is ambiguous, use local_maxima() instead?")
+    if out is None:
+        out = np.empty(dynamics.shape, dtype=np.uint8)
+    return np.greater_equal(dynamics, h, out=out)
+
+
+def h_maxima_sweep(image, heights, footprint=None):
+    """The h-maxima of an image at each of several heights.
+
+    The dynamics are computed once, then thresholded at each height.
+
+    Args:
+        image (numpy.array): the image to find the maxima of
+        heights (list): the heights (h) to find the maxima at
+        footprint (numpy.array): the neighborhood, see ``maxima_dynamics``
+
+    Returns:
+        list: a uint8 image of the h-maxima for each height.
+    """
+    dynamics = maxima_dynamics(image, footprint=footprint)
+    return [h_maxima_from_dynamics(dynamics, h) for h in heights]
@@ -0,0 +1,102 @@
+# cython:language_level=3
+
+"""dynamics_cy.pyx - cython implementation of the dynamics of regional
+maxima, by union-find over the pixels in decreasing order.
+"""
+from deepcell_imaging.image_processing.fused_numerics cimport np_real_numeric
+import numpy as np
+
+cimport numpy as cnp
+cimport cython
+cnp.import_array()
+
+# The pixel states.
+cdef enum:
+    OUTSIDE = 0
+    PENDING = 1
+    DONE = 2
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.exceptval(check=False)
+cdef inline Py_ssize_t _find(cnp.intp_t[::1] parent, Py_ssize_t index) nogil:
+    """The root of index's set, halving the path to it along the way."""
+    while parent[index] != index:
+        parent[index] = parent[parent[index]]
+        index = parent[index]
+    return index
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def maxima_dynamics_impl(
+    np_real_numeric[::1] image,
+    cnp.uint8_t[::1] state,
+    cnp.intp_t[::1] order,
+    cnp.intp_t[::1] offsets,
+    cnp.float64_t[::1] dynamics,
+    double top_dynamic,
+):
+    """Compute each pixel's regional maximum's dynamic, into dynamics.
+
+    All arrays are raveled & padded, so that each inside pixel plus any of
+    the offsets is in the array. state is PENDING for the inside pixels, &
+    OUTSIDE for the padding (which is never visited). order sorts the
+    pixels by increasing value: they're visited in reverse.
+
+    Each component's root is a pixel of its peak, & the root of its
+    maximum (in a second union-find, merging equal peaks). The maximum
+    stores its dynamic once the component merges into a higher one, or -1
+    until then.
+    """
+    cdef Py_ssize_t n = image.shape[0]
+    cdef Py_ssize_t i, j, p, q, r, s, gr, gs
+    cdef np_real_numeric level
+    cdef cnp.intp_t[::1] parent = np.empty(n, dtype=np.intp)
+    cdef cnp.intp_t[::1] maximum = np.empty(n, dtype=np.intp)
+
+    with nogil:
+        for i in range(order.shape[0] - 1, -1, -1):
+            p = order[i]
+            if state[p] == OUTSIDE:
+                continue
+            state[p] = DONE
+            parent[p] = p
+            maximum[p] = p
+            dynamics[p] = -1
+            level = image[p]
+
+            for j in range(offsets.shape[0]):
+                q = p + offsets[j]
+                if state[q] != DONE:
+                    continue
+                r = _find(parent, q)
+                s = _find(parent, p)
+                if r == s:
+                    continue
+
+                if image[r] == image[s]:
+                    gr = _find(maximum, r)
+                    gs = _find(maximum, s)
+                    if gr != gs:
+                        maximum[gs] = gr
+                    parent[s] = r
+                elif image[r] > image[s]:
+                    dynamics[_find(maximum, s)] = <double>image[s] - <double>level
+                    parent[s] = r
+                else:
+                    dynamics[_find(maximum, r)] = <double>image[r] - <double>level
+                    parent[r] = s
+
+        # The maxima that never merged into a higher one.
+        for i in range(order.shape[0]):
+            p = order[i]
+            if state[p] == DONE and maximum[p] == p and dynamics[p] < 0:
+                dynamics[p] = top_dynamic
+
+        # (The maxima's roots keep their own dynamic.)
+        for i in range(order.shape[0]):
+            p = order[i]
+            if state[p] == DONE:
+                dynamics[p] = dynamics[_find(maximum, p)]
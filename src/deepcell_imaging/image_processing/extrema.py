@@ -20,8 +20,111 @@ from deepcell_imaging.image_processing.fast_hybrid import fast_hybrid_reconstruc
 # functool is used so as not to increase the call stack accidentally
 warn = functools.partial(warnings.warn, stacklevel=2)
 
+# The integer types a [0, 1] image can be quantized to.
+QUANTIZE_DTYPES = (np.uint8, np.uint16)
 
-def h_maxima(image, h, footprint=None):
+# Slices (along the first axis) per band when quantizing or shifting the
+# image, to bound the temporaries.
+BAND_SIZE = 256
+
+
+def quantize_unit_interval(image, dtype):
+    """Map an image's [0, 1] values onto the full range of an integer type.
+
+    Values are clipped to [0, 1] then rounded to the nearest of the type's
+    levels (0 to its max value).
+
+    Parameters
+    ----------
+    image : ndarray
+        The floating point image to quantize.
+    dtype : dtype
+        The integer type: ``np.uint8`` or ``np.uint16``.
+
+    Returns
+    -------
+    quantized : ndarray
+        The quantized image, of type ``dtype``.
+    """
+    dtype = np.dtype(dtype)
+    if dtype not in QUANTIZE_DTYPES:
+        raise ValueError("Can only quantize to uint8 or uint16, not %s" % dtype)
+
+    top = np.iinfo(dtype).max
+    quantized = np.empty(image.shape, dtype=dtype)
+    for start in range(0, image.shape[0], BAND_SIZE):
+        band = slice(start, start + BAND_SIZE)
+        scaled = np.clip(image[band], 0, 1) * top
+        quantized[band] = np.rint(scaled, out=scaled)
+    return quantized
+
+
+def _shift_down(image, h, out):
+    """Write image - h into out, clipping integers at their minimum value."""
+    for start in range(0, image.shape[0], BAND_SIZE):
+        band = slice(start, start + BAND_SIZE)
+        if np.issubdtype(image.dtype, np.floating):
+            # The purpose of the resolution variable is to allow for the
+            # small rounding errors that inevitably occur when doing
+            # floating point arithmetic. We want shifted_img to be
+            # guaranteed to be h less than image. If we only subtract h
+            # there may be pixels were shifted_img ends up being
+            # slightly greater than image - h.
+            #
+            # The resolution is scaled based on the pixel values in the
+            # image because floating point precision is relative. A
+            # very large value of 1.0e10 will have a large precision,
+            # say +-1.0e4, and a very small value of 1.0e-10 will have
+            # a very small precision, say +-1.0e-16.
+            #
+            resolution = 2 * np.finfo(image.dtype).resolution * np.abs(image[band])
+            np.subtract(image[band] - h, resolution, out=out[band])
+        else:
+            out[band] = _subtract_constant_clip(image[band], h)
+
+
+def _reconstruct_h_maxima(image, h, footprint, out):
+    """The h-maxima, using one scratch buffer for the whole reconstruction.
+
+    The seed is the image shifted down by h, so it's below the image by
+    construction: the reconstruction skips its validation scan. Then the
+    reconstruction runs in place in the image's own type, and the residue
+    overwrites it.
+    """
+    if image.dtype == np.float16:
+        image = image.astype(np.float32)
+    image = np.ascontiguousarray(image)
+
+    scratch = np.empty(image.shape, dtype=image.dtype)
+    _shift_down(image, h, out=scratch)
+    rec_img = fast_hybrid_reconstruct(
+        scratch,
+        image,
+        method="dilation",
+        footprint=footprint,
+        inplace=True,
+        validate=False,
+    )
+    # The reconstruction is at most the image, so the residue can't wrap.
+    residue_img = np.subtract(image, rec_img, out=rec_img)
+    return np.greater_equal(residue_img, h, out=out)
+
+
+def _quantized_h_maxima(image, h, footprint, dtype, out):
+    if h <= 0:
+        raise ValueError("h = 0 is ambiguous, use local_maxima() instead?")
+    quantized = quantize_unit_interval(image, dtype)
+    # h is scaled like the image, to at least one level.
+    h = quantized.dtype.type(max(1, round(h * np.iinfo(quantized.dtype).max)))
+
+    if h > np.ptp(quantized):
+        out[...] = 0
+        return out
+
+    return _reconstruct_h_maxima(quantized, h, footprint, out)
+
+
+def h_maxima(image, h, footprint=None, quantize=None, out=None):
     """Determine all maxima of the image with height >= h.
 
     The local maxima are defined as connected sets of pixels with equal
@@ -47,6 +150,14 @@ def h_maxima(image, h, footprint=None):
         The neighborhood expressed as an n-D array of 1's and 0's.
         Default is the ball of radius 1 according to the maximum norm
         (i.e. a 3x3 square for 2D images, a 3x3x3 cube for 3D images, etc.)
+    quantize : dtype, optional
+        ``np.uint8`` or ``np.uint16`` to quantize a [0, 1] image (such as a
+        maxima prediction) to that type, with h scaled to match, and find
+        the maxima in that integer type. This takes 4-8x less memory than
+        floating point, at the cost of merging maxima closer than one level.
+        Default is ``None``: find the maxima in the image's own type.
+    out : ndarray, optional
+        A uint8 array, of the image's shape, to write the maxima to.
 
     Returns
     -------
@@ -87,11 +198,19 @@ def h_maxima(image, h, footprint=None):
 
     The resulting image will contain 3 local maxima.
     """
+    if out is None:
+        out = np.empty(image.shape, dtype=np.uint8)
+    elif out.shape != image.shape or out.dtype != np.uint8:
+        raise ValueError("out must be a uint8 array of shape %s" % (image.shape,))
+
+    if quantize is not None:
+        return _quantized_h_maxima(image, h, footprint, quantize, out)
 
     # Check for h value that is larger then range of the image. If this
     # is True then there are no h-maxima in the image.
     if h > np.ptp(image):
-        return np.zeros(image.shape, dtype=np.uint8)
+        out[...] = 0
+        return out
 
     # Check for floating point h value. For this to work properly
     # we need to explicitly convert image to float64.
@@ -124,27 +243,4 @@ def h_maxima(image, h, footprint=None):
     if h == 0:
         raise ValueError("h = 0 is ambiguous, use local_maxima() " "instead?")
 
-    if np.issubdtype(image.dtype, np.floating):
-        # The purpose of the resolution variable is to allow for the
-        # small rounding errors that inevitably occur when doing
-        # floating point arithmetic. We want shifted_img to be
-        # guaranteed to be h less than image. If we only subtract h
-        # there may be pixels were shifted_img ends up being
-        # slightly greater than image - h.
-        #
-        # The resolution is scaled based on the pixel values in the
-        # image because floating point precision is relative. A
-        # very large value of 1.0e10 will have a large precision,
-        # say +-1.0e4, and a very small value of 1.0e-10 will have
-        # a very small precision, say +-1.0e-16.
-        #
-        resolution = 2 * np.finfo(image.dtype).resolution * np.abs(image)
-        shifted_img = image - h - resolution
-    else:
-        shifted_img = _subtract_constant_clip(image, h)
-
-    rec_img = fast_hybrid_reconstruct(
-        shifted_img, image, method="dilation", footprint=footprint
-    )
-    residue_img = image - rec_img
-    return (residue_img >= h).astype(np.uint8)
+    return _reconstruct_h_maxima(image, h, footprint, out)
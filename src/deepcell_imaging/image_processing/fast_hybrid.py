@@ -14,7 +14,13 @@ from skimage._shared.utils import _supported_float_type
 
 
 def fast_hybrid_reconstruct(
-    image, mask, method="dilation", footprint=None, offset=None, inplace=False
+    image,
+    mask,
+    method="dilation",
+    footprint=None,
+    offset=None,
+    inplace=False,
+    validate=True,
 ):
     if method == "dilation":
         method = METHOD_DILATION
@@ -25,12 +31,13 @@ def fast_hybrid_reconstruct(
             "Reconstruction method can be 'dilation' or 'erosion', not '%s'." % method
         )
 
-    if method == METHOD_DILATION and np.any(image > mask):
+    # (Callers that built the seed from the mask can skip this full scan.)
+    if validate and method == METHOD_DILATION and np.any(image > mask):
         raise ValueError(
             "Intensity of seed image must be less than that "
             "of the mask image for reconstruction by dilation."
         )
-    elif method == METHOD_EROSION and np.any(image < mask):
+    elif validate and method == METHOD_EROSION and np.any(image < mask):
         raise ValueError(
             "Intensity of seed image must be greater than that "
             "of the mask image for reconstruction by erosion."
@@ -1,12 +1,13 @@
 # cython:language_level=3
 
-from collections import deque
 import logging
 import numpy as np
 import timeit
 
 cimport cython
 from libc.stdint cimport uint8_t, int8_t, uint16_t, int16_t, uint32_t, int32_t, uint64_t, int64_t
+from libc.stdlib cimport free, malloc
+from libc.string cimport memcpy
 
 # This fast-hybrid reconstruction algorithm supports the following data types.
 # To add more, add to this list, and to the type cast in the main function.
@@ -28,6 +29,56 @@ cpdef enum:
     METHOD_DILATION = 0
     METHOD_EROSION = 1
 
+
+# The propagation queue: a first-in-first-out ring buffer of indices,
+# growing as needed. Unlike a Python deque, it doesn't need the GIL.
+cdef struct IndexQueue:
+    Py_ssize_t head
+    Py_ssize_t size
+    Py_ssize_t space
+    Py_ssize_t *items
+
+
+@cython.exceptval(check=False)
+cdef inline void queue_init(IndexQueue *queue) nogil:
+    queue.head = 0
+    queue.size = 0
+    queue.space = 0
+    queue.items = NULL
+
+
+@cython.exceptval(check=False)
+cdef inline int queue_push(IndexQueue *queue, Py_ssize_t index) nogil:
+    """Push onto the back of the queue. Returns -1 if out of memory."""
+    cdef Py_ssize_t space, first_part
+    cdef Py_ssize_t *items
+    if queue.size == queue.space:
+        # Grow, unwrapping the items to the start of the new buffer.
+        space = 2 * queue.space if queue.space else 1024
+        items = <Py_ssize_t *> malloc(space * sizeof(Py_ssize_t))
+        if items == NULL:
+            return -1
+        first_part = queue.space - queue.head
+        if queue.size:
+            memcpy(items, queue.items + queue.head, first_part * sizeof(Py_ssize_t))
+            memcpy(items + first_part, queue.items, queue.head * sizeof(Py_ssize_t))
+        free(queue.items)
+        queue.items = items
+        queue.space = space
+        queue.head = 0
+    queue.items[(queue.head + queue.size) % queue.space] = index
+    queue.size += 1
+    return 0
+
+
+@cython.exceptval(check=False)
+cdef inline Py_ssize_t queue_pop(IndexQueue *queue) nogil:
+    """Pop the front of the queue. The queue mustn't be empty."""
+    cdef Py_ssize_t index = queue.items[queue.head]
+    queue.head = (queue.head + 1) % queue.space
+    queue.size -= 1
+    return index
+
 @cython.boundscheck(False)
 @cython.wraparound(False)
 cdef inline uint8_t increment_index(
@@ -414,14 +465,14 @@ def fast_hybrid_impl(
 # This function takes typed buffers.
 @cython.boundscheck(False)
 @cython.wraparound(False)
-cdef void fast_hybrid_impl_inner(
+cdef int fast_hybrid_impl_inner(
     image_dtype _dummy_value,
     image_numpy,
     mask_numpy,
     footprint_numpy,
     uint8_t method,
     footprint_center_numpy
-):
+) except -1:
     """Perform grayscale reconstruction using the 'Fast-Hybrid' algorithm.
 
     Functionally equivalent to scikit-image's grayreconstruct. That
@@ -453,8 +504,11 @@ cdef void fast_hybrid_impl_inner(
         method (uint8_t): METHOD_DILATION or METHOD_EROSION
         footprint_center_numpy (numpy array of type: Py_ssize_t): the offset of the footprint center.
 
+    The scans & propagation don't hold the GIL, so other threads can run
+    meanwhile (eg reconstructing another image).
+
     Returns:
-        numpy array of type image_dtype: the reconstructed image, modified in place
+        int: 0, the image having been reconstructed in place
     """
     cdef image_dtype border_value
 
@@ -467,7 +521,9 @@ cdef void fast_hybrid_impl_inner(
         raise ValueError("Unknown method: %s" % method)
 
     # The propagation queue for after the raster scans.
-    queue = deque()
+    cdef IndexQueue queue
+    cdef bint out_of_memory = False
+    queue_init(&queue)
 
     # Get the C buffers from the numpy parameters.
     cdef Py_ssize_t* footprint_center_coord = <Py_ssize_t*> <Py_ssize_t> footprint_center_numpy.ctypes.data
@@ -510,35 +566,36 @@ cdef void fast_hybrid_impl_inner(
     ###############
 
     t = timeit.default_timer()
-    while True:
-        scan_mask = <image_dtype> mask[scan_index]
-
-        # Skip if the image is already at the limiting mask value.
-        if image[scan_index] != scan_mask:
-            neighborhood_peak = get_neighborhood_peak(
-                image,
-                image_dimensions,
-                num_dimensions,
-                scan_coord,
-                footprint,
-                0,
-                footprint_center_index,
-                footprint_dimensions,
-                footprint_center_coord,
-                border_value,
-                method,
-                footprint_coord,
-                neighbor_coord,
-            )
-
-            if method == METHOD_DILATION:
-                image[scan_index] = min(neighborhood_peak, scan_mask)
-            elif method == METHOD_EROSION:
-                image[scan_index] = max(neighborhood_peak, scan_mask)
-
-        scan_index += <Py_ssize_t> 1
-        if increment_index(scan_coord, image_dimensions, num_dimensions):
-            break
+    with nogil:
+        while True:
+            scan_mask = <image_dtype> mask[scan_index]
+
+            # Skip if the image is already at the limiting mask value.
+            if image[scan_index] != scan_mask:
+                neighborhood_peak = get_neighborhood_peak(
+                    image,
+                    image_dimensions,
+                    num_dimensions,
+                    scan_coord,
+                    footprint,
+                    0,
+                    footprint_center_index,
+                    footprint_dimensions,
+                    footprint_center_coord,
+                    border_value,
+                    method,
+                    footprint_coord,
+                    neighbor_coord,
+                )
+
+                if method == METHOD_DILATION:
+                    image[scan_index] = min(neighborhood_peak, scan_mask)
+                elif method == METHOD_EROSION:
+                    image[scan_index] = max(neighborhood_peak, scan_mask)
+
+            scan_index += <Py_ssize_t> 1
+            if increment_index(scan_coord, image_dimensions, num_dimensions):
+                break
 
     logging.debug("Raster scan time: %s", timeit.default_timer() - t)
 
@@ -549,6 +606,7 @@ cdef void fast_hybrid_impl_inner(
     # Initialize the scan coordinate to the end of the image.
     # Also initialize the footprint end linear index.
     cdef Py_ssize_t dimension
+    cdef Py_ssize_t footprint_end_index
     for dimension in range(num_dimensions - 1, -1, -1):
         scan_coord[dimension] = image_dimensions[dimension] - <Py_ssize_t> 1
         footprint_coord[dimension] = footprint_dimensions[dimension] - <Py_ssize_t> 1
@@ -557,51 +615,54 @@ cdef void fast_hybrid_impl_inner(
     footprint_end_index = coord_to_index(footprint_coord, footprint_dimensions, num_dimensions)
 
     t = timeit.default_timer()
-    while True:
-        scan_mask = mask[scan_index]
-
-        # If we're already at the mask, skip the neighbor test.
-        # But note: we still need to test for propagation (below).
-        if image[scan_index] != scan_mask:
-            neighborhood_peak = get_neighborhood_peak(
-                image,
-                image_dimensions,
-                num_dimensions,
-                scan_coord,
-                footprint,
-                footprint_center_index,
-                footprint_end_index,
-                footprint_dimensions,
-                footprint_center_coord,
-                border_value,
-                method,
-                footprint_coord,
-                neighbor_coord,
-            )
-            if method == METHOD_DILATION:
-                image[scan_index] = min(neighborhood_peak, scan_mask)
-            elif method == METHOD_EROSION:
-                image[scan_index] = max(neighborhood_peak, scan_mask)
-
-        if should_propagate(
-                image,
-                image_dimensions,
-                num_dimensions,
-                mask,
-                scan_coord,
-                image[scan_index],
-                footprint,
-                footprint_dimensions,
-                footprint_center_coord,
-                method,
-                footprint_coord,
-                neighbor_coord,
-        ):
-            queue.append(scan_index)
-
-        scan_index -= <Py_ssize_t> 1
-        if decrement_index(scan_coord, image_dimensions, num_dimensions):
-            break
+    with nogil:
+        while True:
+            scan_mask = mask[scan_index]
+
+            # If we're already at the mask, skip the neighbor test.
+            # But note: we still need to test for propagation (below).
+            if image[scan_index] != scan_mask:
+                neighborhood_peak = get_neighborhood_peak(
+                    image,
+                    image_dimensions,
+                    num_dimensions,
+                    scan_coord,
+                    footprint,
+                    footprint_center_index,
+                    footprint_end_index,
+                    footprint_dimensions,
+                    footprint_center_coord,
+                    border_value,
+                    method,
+                    footprint_coord,
+                    neighbor_coord,
+                )
+                if method == METHOD_DILATION:
+                    image[scan_index] = min(neighborhood_peak, scan_mask)
+                elif method == METHOD_EROSION:
+                    image[scan_index] = max(neighborhood_peak, scan_mask)
+
+            if should_propagate(
+                    image,
+                    image_dimensions,
+                    num_dimensions,
+                    mask,
+                    scan_coord,
+                    image[scan_index],
+                    footprint,
+                    footprint_dimensions,
+                    footprint_center_coord,
+                    method,
+                    footprint_coord,
+                    neighbor_coord,
+            ):
+                if queue_push(&queue, scan_index):
+                    out_of_memory = True
+                    break
+
+            scan_index -= <Py_ssize_t> 1
+            if decrement_index(scan_coord, image_dimensions, num_dimensions):
+                break
 
     logging.debug("Reverse raster scan time: %s", timeit.default_timer() - t)
 
@@ -612,52 +673,62 @@ cdef void fast_hybrid_impl_inner(
     cdef Py_ssize_t neighbor_index
     cdef uint8_t oob, at_center
 
-    logging.debug("Queue size: %s" % len(queue))
+    logging.debug("Queue size: %s" % queue.size)
     t = timeit.default_timer()
 
-    while len(queue) > 0:
-        scan_index = queue.popleft()
-        index_to_coord(scan_index, scan_coord, image_dimensions, num_dimensions)
-        footprint_scan_index = 0
-        index_to_coord(footprint_scan_index, footprint_coord, footprint_dimensions, num_dimensions)
-
-        # For each point the queue point could propagate to, in
-        # other words for each point this point is a neighbor of,
-        # propagate if necessary & add that point to the queue
-        # for further propagation.
-        while True:
-            oob = not offset_coord(
-                scan_coord,
-                footprint_center_coord,
-                footprint_coord,
-                neighbor_coord,
-                -1, # we are testing for points of which *this point* is a neighbor
-                image_dimensions,
-                num_dimensions,
-                &neighbor_index,
-                &at_center,
-            )
-
-            # Skip:
-            # - out-of-bounds points
-            # - the center point
-            # - points not in the footprint
-            if not oob and not at_center and footprint[footprint_scan_index]:
-                scan_value = image[scan_index]
-                neighbor_value = image[neighbor_index]
-                neighbor_mask = mask[neighbor_index]
-
-                if method == METHOD_DILATION and (scan_value > neighbor_value != neighbor_mask):
-                    image[neighbor_index] = min(scan_value, neighbor_mask)
-                    queue.append(neighbor_index)
-                elif method == METHOD_EROSION and (scan_value < neighbor_value != neighbor_mask):
-                    image[neighbor_index] = max(scan_value, neighbor_mask)
-                    queue.append(neighbor_index)
-
-            footprint_scan_index += <Py_ssize_t> 1
-            if increment_index(footprint_coord, footprint_dimensions, num_dimensions):
-                break
+    with nogil:
+        while queue.size > 0 and not out_of_memory:
+            scan_index = queue_pop(&queue)
+            index_to_coord(scan_index, scan_coord, image_dimensions, num_dimensions)
+            footprint_scan_index = 0
+            index_to_coord(footprint_scan_index, footprint_coord, footprint_dimensions, num_dimensions)
+
+            # For each point the queue point could propagate to, in
+            # other words for each point this point is a neighbor of,
+            # propagate if necessary & add that point to the queue
+            # for further propagation.
+            while True:
+                oob = not offset_coord(
+                    scan_coord,
+                    footprint_center_coord,
+                    footprint_coord,
+                    neighbor_coord,
+                    -1, # we are testing for points of which *this point* is a neighbor
+                    image_dimensions,
+                    num_dimensions,
+                    &neighbor_index,
+                    &at_center,
+                )
+
+                # Skip:
+                # - out-of-bounds points
+                # - the center point
+                # - points not in the footprint
+                if not oob and not at_center and footprint[footprint_scan_index]:
+                    scan_value = image[scan_index]
+                    neighbor_value = image[neighbor_index]
+                    neighbor_mask = mask[neighbor_index]
+
+                    if method == METHOD_DILATION and (scan_value > neighbor_value != neighbor_mask):
+                        image[neighbor_index] = min(scan_value, neighbor_mask)
+                        if queue_push(&queue, neighbor_index):
+                            out_of_memory = True
+                            break
+                    elif method == METHOD_EROSION and (scan_value < neighbor_value != neighbor_mask):
+                        image[neighbor_index] = max(scan_value, neighbor_mask)
+                        if queue_push(&queue, neighbor_index):
+                            out_of_memory = True
+                            break
+
+                footprint_scan_index += <Py_ssize_t> 1
+                if increment_index(footprint_coord, footprint_dimensions, num_dimensions):
+                    break
 
     logging.debug("Queue processing time: %s", timeit.default_timer() - t)
 
+    free(queue.items)
+    if out_of_memory:
+        raise MemoryError("Couldn't grow the propagation queue")
+
     # All done. Image was modified in place.
+    return 0
@@ -0,0 +1,142 @@
+"""
+Filling small holes in segmented cells, without checking every cell.
+
+The deepcell-toolbox fill_holes loops over every labeled object, computing
+its Euler number (number of components minus number of holes) on its
+bounding box, and only fills the objects with holes (Euler number < 1).
+Most cells don't have holes, so the loop mostly computes Euler numbers.
+
+Instead, we compute every object's Euler number in one vectorized pass
+over the whole image, then only visit the objects with holes. Those are
+filled exactly like deepcell-toolbox, in label order, so the output is
+identical.
+
+The Euler numbers are counted from the 2x2 neighborhoods of the image
+(the "bit-quads" of Gray, 1971). For an object with 8-connectivity, each
+quad covering exactly one of its pixels counts +1, exactly three -1, and
+two diagonal pixels -2: the total is 4 times the Euler number.
+"""
+
+import numpy as np
+import scipy.ndimage as nd
+from skimage.morphology import remove_small_holes
+
+# Each quad's contribution, for its pixel pattern. The pattern has bits 1, 2,
+# 4, 8 set for the top-left, top-right, bottom-left & bottom-right pixels.
+_QUAD_EULER_CONTRIBUTIONS = np.zeros(16, dtype=np.int64)
+for _pattern in range(16):
+    _count = bin(_pattern).count("1")
+    if _count == 1:
+        _QUAD_EULER_CONTRIBUTIONS[_pattern] = 1
+    elif _count == 3:
+        _QUAD_EULER_CONTRIBUTIONS[_pattern] = -1
+    elif _pattern in (0b1001, 0b0110):
+        _QUAD_EULER_CONTRIBUTIONS[_pattern] = -2
+
+# Rows per band when counting quads, to bound the temporary arrays.
+BAND_HEIGHT = 256
+
+
+def euler_numbers(label_img: np.ndarray) -> np.ndarray:
+    """The 8-connected Euler number of every label in a 2D label image.
+
+    Returns an array indexed by label: the same as
+    skimage.measure.euler_number(label_img == label, connectivity=2), for
+    each label (0 for labels not in the image, including the background).
+    """
+    if label_img.ndim != 2:
+        raise ValueError("Expected a 2D label image, got shape %s" % (label_img.shape,))
+
+    num_labels = int(label_img.max(initial=0)) + 1
+    padded = np.pad(label_img, 1)
+    totals = np.zeros(num_labels, dtype=np.int64)
+
+    for top in range(0, padded.shape[0] - 1, BAND_HEIGHT):
+        rows = padded[top : top + BAND_HEIGHT + 1]
+        a, b = rows[:-1, :-1], rows[:-1, 1:]
+        c, d = rows[1:, :-1], rows[1:, 1:]
+
+        def same(x, y):
+            # As uint8, so the patterns are uint8 rather than int64.
+            return (x == y).view(np.uint8)
+
+        # Each label in a quad is counted once, at its first position, with
+        # the pattern of the quad's pixels having that label.
+        quads = [
+            (a, a != 0, 1 + 2 * same(b, a) + 4 * same(c, a) + 8 * same(d, a)),
+            (b, (b != 0) & (b != a), 2 + 4 * same(c, b) + 8 * same(d, b)),
+            (c, (c != 0) & (c != a) & (c != b), 4 + 8 * same(d, c)),
+            (
+                d,
+                (d != 0) & (d != a) & (d != b) & (d != c),
+                np.full(d.shape, 8, np.uint8),
+            ),
+        ]
+        for quad_labels, counted, pattern in quads:
+            totals += np.bincount(
+                quad_labels[counted].astype(np.intp),
+                weights=_QUAD_EULER_CONTRIBUTIONS[pattern[counted]],
+                minlength=num_labels,
+            ).astype(np.int64)
+
+    return totals // 4
+
+
+# Adapted from deepcell-toolbox:
+# https://github.com/vanvalenlab/deepcell-toolbox/blob/e8c1277ee4243bc6a34916d554d0c2eab0cf7505/deepcell_toolbox/utils.py#L660
+def fill_holes(label_img, size=10, connectivity=1, return_erased=False):
+    """Fills holes located completely within a given label with pixels of the same value
+
+    Gives the same result as deepcell_toolbox.utils.fill_holes, but only
+    visits the labels with holes (see euler_numbers).
+
+    Args:
+        label_img (numpy.array): a 2D labeled image
+        size (int): maximum size for a hole to be filled in
+        connectivity (int): the connectivity used to define the hole
+        return_erased (bool): whether to also return if any label was
+            entirely erased, by filling a hole it was in.
+
+    Returns:
+        numpy.array: a labeled image with no holes smaller than ``size``
+            contained within any label.
+        bool: if return_erased, whether any label was entirely erased.
+    """
+    output_image = np.copy(label_img)
+    # (Integer labels are used as is, rather than copied to int64.)
+    labeled_image = label_img
+    if not np.issubdtype(label_img.dtype, np.integer):
+        labeled_image = label_img.astype("int")
+    overwritten = set()
+
+    with_holes = np.flatnonzero(euler_numbers(labeled_image) < 1)
+    with_holes = with_holes[with_holes != 0]
+    if len(with_holes) == 0:
+        return (output_image, False) if return_erased else output_image
+
+    # (Labels not in the image have Euler number 0 too, but no object.)
+    objects = nd.find_objects(
+        labeled_image, max_label=0 if return_erased else int(with_holes[-1])
+    )
+    # Labels are filled in order, as each fill can change the later patches.
+    for label in with_holes:
+        slice = objects[label - 1]
+        if slice is None:
+            continue
+
+        patch = output_image[slice]
+        filled = remove_small_holes(
+            ar=(patch == label), area_threshold=size, connectivity=connectivity
+        )
+        if return_erased:
+            overwritten.update(np.unique(patch[filled & (patch != label)]))
+        output_image[slice] = np.where(filled, label, patch)
+
+    if not return_erased:
+        return output_image
+
+    overwritten.discard(0)
+    erased = any(
+        not np.any(output_image[objects[other - 1]] == other) for other in overwritten
+    )
+    return output_image, erased
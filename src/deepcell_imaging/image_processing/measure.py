@@ -0,0 +1,197 @@
+"""
+Measuring cells: their shape, and their intensity in each image channel.
+
+This covers the common QuPath cell measurements, without a separate JVM
+job: area, centroid & bounding box from the label mask, and the mean,
+sum, min & max intensity of each channel over each cell.
+
+Shape measurements are vectorized np.bincount reductions over bands of
+rows. Intensities are accumulated tile by tile (or strip by strip), as
+tifffile decodes each channel of the OME-TIFF: so only the label mask &
+one tile are in memory, never a whole channel, let alone the whole image.
+
+Coordinates are in pixels. Centroids are the mean pixel center, ie the
+centroid of the cell's polygon traced along pixel edges (see shapes.py).
+"""
+
+import csv
+
+import numpy as np
+import scipy.ndimage as nd
+import tifffile
+
+# Rows per band when reducing the label mask, to bound the size of the
+# temporary coordinate arrays.
+BAND_HEIGHT = 1024
+
+INTENSITY_STATISTICS = ["Mean", "Sum", "Min", "Max"]
+
+
+def measure_shapes(labels: np.ndarray) -> dict:
+    """Measure the area, centroid & bounding box of each labeled cell.
+
+    Returns a dict of arrays, with one entry per cell (in label order):
+    label, area, centroid_x, centroid_y, min_x, min_y, max_x, max_y. The
+    bounding box is in pixel edges, ie max is exclusive.
+    """
+    if labels.ndim != 2:
+        raise ValueError("Expected a 2D label mask, got shape %s" % (labels.shape,))
+
+    num_labels = int(labels.max(initial=0)) + 1
+    height, width = labels.shape
+    area = np.zeros(num_labels, dtype=np.int64)
+    sum_x = np.zeros(num_labels, dtype=np.float64)
+    sum_y = np.zeros(num_labels, dtype=np.float64)
+
+    columns = np.arange(width, dtype=np.float64)
+    for top in range(0, height, BAND_HEIGHT):
+        band = labels[top : top + BAND_HEIGHT].ravel()
+        band_rows = len(band) // width
+        rows = np.arange(top, top + band_rows, dtype=np.float64)
+        area += np.bincount(band, minlength=num_labels)
+        sum_x += np.bincount(band, np.tile(columns, band_rows), minlength=num_labels)
+        sum_y += np.bincount(band, np.repeat(rows, width), minlength=num_labels)
+
+    objects = nd.find_objects(labels, max_label=num_labels - 1)
+    cells = np.flatnonzero(area[1:]) + 1
+    bounds = np.array(
+        [
+            (s[1].start, s[0].start, s[1].stop, s[0].stop)
+            for s in (objects[label - 1] for label in cells)
+        ],
+        dtype=np.int64,
+    ).reshape(-1, 4)
+
+    return {
+        "label": cells,
+        "area": area[cells],
+        # Pixel (i, j) covers [i, i+1): its center is at i + 0.5.
+        "centroid_x": sum_x[cells] / area[cells] + 0.5,
+        "centroid_y": sum_y[cells] / area[cells] + 0.5,
+        "min_x": bounds[:, 0],
+        "min_y": bounds[:, 1],
+        "max_x": bounds[:, 2],
+        "max_y": bounds[:, 3],
+    }
+
+
+class IntensityAccumulator:
+    """Accumulates a channel's per-cell sum, min & max, a tile at a time.
+
+    Each tile's pixels are sorted by label once, then reduced per label
+    with ufunc.reduceat. So the cost is per tile pixel, not per cell: most
+    cells only appear in one or two tiles.
+    """
+
+    def __init__(self, num_labels: int):
+        self.sum = np.zeros(num_labels, dtype=np.float64)
+        self.min = np.full(num_labels, np.inf, dtype=np.float64)
+        self.max = np.full(num_labels, -np.inf, dtype=np.float64)
+
+    def add_tile(self, tile_labels: np.ndarray, tile_values: np.ndarray):
+        tile_labels = tile_labels.ravel()
+        order = np.argsort(tile_labels, kind="stable")
+        sorted_labels = tile_labels[order]
+        sorted_values = tile_values.ravel()[order].astype(np.float64)
+
+        starts = np.flatnonzero(sorted_labels[1:] != sorted_labels[:-1]) + 1
+        starts = np.concatenate([[0], starts])
+        ids = sorted_labels[starts]
+
+        # ids are unique, so each cell is updated once.
+        self.sum[ids] += np.add.reduceat(sorted_values, starts)
+        self.min[ids] = np.minimum(
+            self.min[ids], np.minimum.reduceat(sorted_values, starts)
+        )
+        self.max[ids] = np.maximum(
+            self.max[ids], np.maximum.reduceat(sorted_values, starts)
+        )
+
+
+def get_channel_names(tif: tifffile.TiffFile, num_channels: int) -> list[str]:
+    """The OME channel names, or QuPath's default names if there are none."""
+    names = []
+    if tif.ome_metadata:
+        image = tifffile.xml2dict(tif.ome_metadata)["OME"]["Image"]
+        if isinstance(image, list):
+            image = image[0]
+        channels = image["Pixels"].get("Channel", [])
+        if isinstance(channels, dict):
+            channels = [channels]
+        names = [channel.get("Name", "") for channel in channels]
+
+    if len(names) != num_channels or not all(names):
+        names = ["Channel %d" % (index + 1) for index in range(num_channels)]
+    return names
+
+
+def measure_channels(labels: np.ndarray, tif: tifffile.TiffFile) -> dict:
+    """Measure each cell's intensity in each channel of a (OME-)TIFF.
+
+    The image's first series must be (channel, height, width) or (height,
+    width), with the same height & width as the label mask. Only the
+    full-resolution pages are read.
+
+    Returns a dict of channel name to IntensityAccumulator.
+    """
+    series = tif.series[0]
+    if series.shape[-2:] != labels.shape or series.keyframe.samplesperpixel != 1:
+        raise ValueError(
+            "Expected an image with %s pixels, one sample per pixel, got shape %s"
+            % (labels.shape, series.shape)
+        )
+
+    num_labels = int(labels.max(initial=0)) + 1
+    pages = series.pages
+    names = get_channel_names(tif, len(pages))
+
+    channels = {}
+    for name, page in zip(names, pages):
+        accumulator = IntensityAccumulator(num_labels)
+        for data, (_, _, y, x, _), _ in page.segments():
+            # Edge tiles are padded past the image.
+            tile_labels = labels[y : y + data.shape[1], x : x + data.shape[2]]
+            height, width = tile_labels.shape
+            accumulator.add_tile(tile_labels, data[0, :height, :width, 0])
+        channels[name] = accumulator
+    return channels
+
+
+def write_measurements_tsv(
+    f, image_name: str, shapes: dict, channels: dict, compartment: str = "Cell"
+) -> int:
+    """Write one row of measurements per cell, as tab-separated values.
+
+    Columns follow QuPath's measurement export (for an image without pixel
+    size calibration), eg "Cell: Area px^2" & "Cell: DAPI: Mean".
+
+    Returns the number of cells written.
+    """
+    columns = {
+        "Image": np.full(len(shapes["label"]), image_name),
+        "Object type": np.full(len(shapes["label"]), compartment),
+        "Label": shapes["label"],
+        "Centroid X px": shapes["centroid_x"],
+        "Centroid Y px": shapes["centroid_y"],
+        f"{compartment}: Area px^2": shapes["area"],
+        f"{compartment}: Min X px": shapes["min_x"],
+        f"{compartment}: Min Y px": shapes["min_y"],
+        f"{compartment}: Max X px": shapes["max_x"],
+        f"{compartment}: Max Y px": shapes["max_y"],
+    }
+
+    cells = shapes["label"]
+    for name, accumulator in channels.items():
+        statistics = {
+            "Mean": accumulator.sum[cells] / shapes["area"],
+            "Sum": accumulator.sum[cells],
+            "Min": accumulator.min[cells],
+            "Max": accumulator.max[cells],
+        }
+        for statistic in INTENSITY_STATISTICS:
+            columns[f"{compartment}: {name}: {statistic}"] = statistics[statistic]
+
+    writer = csv.writer(f, delimiter="\t", lineterminator="\n")
+    writer.writerow(columns.keys())
+    writer.writerows(zip(*(column.tolist() for column in columns.values())))
+    return len(cells)
@@ -0,0 +1,78 @@
+# cython:language_level=3
+
+"""peaks_cy.pyx - cython implementation of the minimum distance between
+peaks, by greedy suppression on a grid.
+"""
+import numpy as np
+
+cimport numpy as cnp
+cimport cython
+cnp.import_array()
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def suppress_close_peaks_impl(
+    cnp.intp_t[:, ::1] coords,
+    Py_ssize_t min_distance,
+    cnp.intp_t[::1] grid_shape,
+    cnp.intp_t[:, ::1] cell_offsets,
+):
+    """Keep each peak unless it's too close to a kept peak before it.
+
+    The peaks are visited in order (highest first). A peak is too close if
+    its Chebyshev distance to a kept peak is less than min_distance.
+
+    The kept peaks are indexed on a grid of min_distance-sized cells: kept
+    peaks are at least min_distance apart, so each cell has at most one.
+    A peak then only checks its own & neighboring cells (cell_offsets,
+    from -1 to 1 in each dimension).
+
+    Returns a uint8 array: 1 for the kept peaks.
+    """
+    cdef Py_ssize_t n = coords.shape[0]
+    cdef Py_ssize_t ndim = coords.shape[1]
+    cdef Py_ssize_t i, j, k, d, cell, neighbor_cell, cell_coord, delta, distance
+    cdef bint keep, in_grid
+    cdef Py_ssize_t num_cells = np.prod(grid_shape) if ndim else 0
+    cdef cnp.intp_t[::1] grid = np.full(num_cells, -1, dtype=np.intp)
+    cdef cnp.uint8_t[::1] kept = np.zeros(n, dtype=np.uint8)
+
+    with nogil:
+        for i in range(n):
+            keep = True
+            for k in range(cell_offsets.shape[0]):
+                # The raveled neighbor cell, if it's in the grid.
+                neighbor_cell = 0
+                in_grid = True
+                for d in range(ndim):
+                    cell_coord = coords[i, d] // min_distance + cell_offsets[k, d]
+                    if cell_coord < 0 or cell_coord >= grid_shape[d]:
+                        in_grid = False
+                        break
+                    neighbor_cell = neighbor_cell * grid_shape[d] + cell_coord
+                if not in_grid:
+                    continue
+
+                j = grid[neighbor_cell]
+                if j < 0:
+                    continue
+                distance = 0
+                for d in range(ndim):
+                    delta = coords[i, d] - coords[j, d]
+                    if delta < 0:
+                        delta = -delta
+                    if delta > distance:
+                        distance = delta
+                if distance < min_distance:
+                    keep = False
+                    break
+
+            if keep:
+                kept[i] = 1
+                cell = 0
+                for d in range(ndim):
+                    cell = cell * grid_shape[d] + coords[i, d] // min_distance
+                grid[cell] = i
+
+    return np.asarray(kept)
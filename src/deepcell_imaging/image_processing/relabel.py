@@ -0,0 +1,63 @@
+"""
+Removing small objects & relabeling sequentially, in one fused kernel.
+
+skimage's remove_small_objects then relabel_sequential each make their own
+full passes & temporary arrays over the label image. This does both with
+two passes in place: counting the label sizes, then rewriting each label
+through a lookup table that drops the small labels & renumbers the rest.
+
+The actual implementation is written in Cython (see the .pyx file).
+"""
+
+import numpy as np
+
+from .relabel_cy import remove_small_and_relabel_impl
+
+
+def remove_small_objects_and_relabel(
+    label_image, min_size=0, in_place=False, relabel=True
+):
+    """Remove labeled objects smaller than min_size, then relabel from 1.
+
+    Gives the same result as (with scikit-image < 0.26):
+
+        label_image = remove_small_objects(label_image, min_size=min_size)
+        label_image, _, _ = relabel_sequential(label_image)
+
+    That is, objects of exactly min_size pixels are kept, as
+    remove_small_objects(min_size=...) did before 0.26. (0.26 removes them
+    too.) The kernel doesn't call scikit-image, so this doesn't depend on
+    the installed version.
+
+    Labels are renumbered in their original order.
+
+    Args:
+        label_image (numpy.array): an integer label image
+        min_size (int): objects with fewer pixels are removed (set to 0).
+            Use ``0`` to only relabel.
+        in_place (bool): overwrite label_image, which must be C-contiguous.
+            Otherwise, the relabeled image is a copy.
+        relabel (bool): whether to relabel. If not, the kept objects keep
+            their labels, like skimage's remove_small_objects.
+
+    Returns:
+        numpy.array: the relabeled image, with the same dtype.
+    """
+    if not np.issubdtype(label_image.dtype, np.integer):
+        raise TypeError("Expected an integer label image, got %s" % label_image.dtype)
+
+    if in_place:
+        if not label_image.flags.c_contiguous:
+            raise ValueError("in-place relabeling requires a C-contiguous array")
+    else:
+        label_image = np.array(label_image, order="C", copy=True)
+
+    if label_image.size == 0:
+        return label_image
+    if label_image.min() < 0:
+        raise ValueError("Cannot relabel array that contains negative values.")
+
+    remove_small_and_relabel_impl(
+        label_image.reshape(-1), int(label_image.max()), int(min_size), relabel
+    )
+    return label_image
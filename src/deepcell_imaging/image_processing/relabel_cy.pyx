@@ -0,0 +1,50 @@
+# cython:language_level=3
+
+"""relabel_cy.pyx - cython implementation of fused small object removal &
+sequential relabeling.
+"""
+from deepcell_imaging.image_processing.fused_numerics cimport np_anyint
+import numpy as np
+
+cimport numpy as cnp
+cimport cython
+cnp.import_array()
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def remove_small_and_relabel_impl(
+    np_anyint[::1] labels,
+    Py_ssize_t max_label,
+    Py_ssize_t min_size,
+    bint relabel=True,
+):
+    """Remove labels smaller than min_size, & renumber the rest from 1.
+
+    Works in place on the raveled labels, in two passes: one counting each
+    label's pixels, then (after building the lookup table) one rewriting
+    each label. Labels must be in [0, max_label]. If not relabel, the kept
+    labels keep their numbers.
+
+    Returns the number of labels kept.
+    """
+    cdef Py_ssize_t i, label
+    cdef Py_ssize_t n = labels.shape[0]
+    cdef Py_ssize_t next_label = 1
+    cdef cnp.intp_t[::1] counts = np.zeros(max_label + 1, dtype=np.intp)
+    cdef np_anyint[::1] lookup = np.zeros(max_label + 1, dtype=np.asarray(labels).dtype)
+
+    with nogil:
+        for i in range(n):
+            counts[<Py_ssize_t>labels[i]] += 1
+
+        # The background stays 0. Kept labels are renumbered in order.
+        for label in range(1, max_label + 1):
+            if counts[label] >= min_size and counts[label] > 0:
+                lookup[label] = <np_anyint>(next_label if relabel else label)
+                next_label += 1
+
+        for i in range(n):
+            labels[i] = lookup[<Py_ssize_t>labels[i]]
+
+    return next_label - 1
@@ -0,0 +1,592 @@
+"""
+Extracting cell polygons from a label mask, in parallel bands.
+
+rasterio's features.shapes traces every labeled region in one pass over
+the whole image, and returns every polygon at once. Instead, we split the
+mask into bands of rows, trace each band in a process pool, and stream
+the serialized polygons out as each band finishes.
+
+Each cell is "owned" by the band containing the top of its bounding box.
+A band only traces the cells it owns, and extends down past its nominal
+end to cover the bottom of its tallest cell: so cells crossing a band
+seam are traced whole, exactly once.
+
+Polygons can be written as newline-delimited GeoJSON, or as GeoParquet:
+WKB geometries with the cell label & bounding box as columns, which
+downstream tools can load & filter much faster. GeoParquet output needs
+the optional pyarrow dependency.
+
+Traced polygons follow the pixel edges, so diagonal & curved cell borders
+are staircases with a vertex at every step. (Straight runs are already
+merged into one edge.) Polygons can be simplified with Douglas-Peucker to
+smooth out the steps. GeoJSON coordinates can also be written as integers,
+since pixel edges always are.
+
+Simplifying keeps touching cells touching. Rings are split into arcs at
+junctions: pixel corners where 3 or more regions (cells or background)
+meet. Each arc is the border between the same two regions all along, and
+is simplified the same way whichever cell (& band) traces it: so both
+cells get the same simplified border, without gaps or overlaps. Junctions
+never move. A polygon whose simplified rings would be invalid (crossing
+themselves or each other) keeps its traced rings instead.
+"""
+
+import json
+import struct
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import scipy.ndimage as nd
+from rasterio import features
+from rasterio.transform import Affine
+
+from deepcell_imaging.utils.compression import get_available_cpus
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+DEFAULT_BAND_HEIGHT = 1024
+
+# Shape encodings produced by the band workers.
+GEOJSON = "geojson"
+WKB = "wkb"
+
+
+def _dumps(shape) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(shape)
+    return json.dumps(shape).encode()
+
+
+def _polygon_wkb(rings) -> bytes:
+    # Little-endian (1) Polygon (3), then each ring's points as doubles.
+    parts = [struct.pack("<BII", 1, 3, len(rings))]
+    for ring in rings:
+        parts.append(struct.pack("<I", len(ring)))
+        parts.append(ring.tobytes())
+    return b"".join(parts)
+
+
+def _chord_distances(points: np.ndarray) -> np.ndarray:
+    """The distances of a line's inner points from its first-to-last chord."""
+    start, end = points[0], points[-1]
+    segment = end - start
+    offsets = points[1:-1] - start
+    length = np.hypot(*segment)
+    if length == 0:
+        return np.hypot(offsets[:, 0], offsets[:, 1])
+    cross = segment[0] * offsets[:, 1] - segment[1] * offsets[:, 0]
+    return np.abs(cross) / length
+
+
+def _douglas_peucker(points: np.ndarray, tolerance: float) -> np.ndarray:
+    """Simplify an open line, keeping its end points."""
+    keep = np.zeros(len(points), dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        distances = _chord_distances(points[first : last + 1])
+        index = int(np.argmax(distances))
+        if distances[index] > tolerance:
+            index += first + 1
+            keep[index] = True
+            stack.append((first, index))
+            stack.append((index, last))
+    return points[keep]
+
+
+def simplify_ring(ring: np.ndarray, tolerance: float) -> np.ndarray:
+    """Simplify a closed ring with Douglas-Peucker.
+
+    Every removed vertex is within tolerance pixels of the simplified ring.
+    Rings are never simplified below a triangle. The first point is kept.
+
+    This simplifies the ring on its own: the border shared by touching
+    cells can move differently in each cell. (Traced polygons are simplified
+    arc by arc instead, see simplify_polygon.)
+    """
+    if tolerance <= 0 or len(ring) <= 4:
+        return ring
+
+    # Split the closed ring at its farthest point from the start, so that
+    # both halves are open lines with distinct end points.
+    points = ring[:-1]
+    farthest = int(np.argmax(np.hypot(*(points - points[0]).T)))
+    first_half = _douglas_peucker(points[: farthest + 1], tolerance)
+    second_half = _douglas_peucker(ring[farthest:], tolerance)
+    simplified = np.concatenate([first_half, second_half[1:]])
+
+    if len(simplified) < 4:
+        return ring
+    return simplified
+
+
+def _junctions(labels: np.ndarray) -> np.ndarray:
+    """Find the pixel corners where 3 or more regions meet.
+
+    Corners where 2 regions meet diagonally (a pinch) are junctions too.
+    Outside the labels is a region of its own, & its corners are junctions:
+    so borders along the edges of the labels stay put.
+
+    Returns a (height + 1, width + 1) mask of the corners, by (row, column).
+    """
+    padded = np.pad(labels, 1, constant_values=-1)
+    # The pixels around each corner.
+    a, b = padded[:-1, :-1], padded[:-1, 1:]
+    c, d = padded[1:, :-1], padded[1:, 1:]
+    regions = (
+        1
+        + (b != a).astype(np.uint8)
+        + ((c != a) & (c != b))
+        + ((d != a) & (d != b) & (d != c))
+    )
+    junctions = (regions >= 3) | ((a == d) & (b == c) & (a != b))
+    junctions[[0, 0, -1, -1], [0, -1, 0, -1]] = True
+    return junctions
+
+
+def _reverse_to_simplify(points: np.ndarray) -> bool:
+    """Whether to simplify a line backwards.
+
+    Touching cells trace their shared border in opposite directions. We
+    simplify it in whichever direction orders its points first, so that
+    both cells simplify it the same way.
+    """
+    differs = np.flatnonzero((points != points[::-1]).any(axis=1))
+    if not len(differs):
+        return False
+    first = differs[0]
+    return tuple(points[-1 - first]) < tuple(points[first])
+
+
+def _simplify_arc(points: np.ndarray, tolerance: float) -> np.ndarray:
+    """Simplify an arc between junctions, keeping its end points.
+
+    An arc starting & ending at the same junction is simplified as a ring.
+    Short arcs (up to twice the tolerance between their ends) keep their
+    farthest vertex: otherwise both sides of a thin spur would straighten
+    onto the same line.
+    """
+    reverse = _reverse_to_simplify(points)
+    if reverse:
+        points = points[::-1]
+    if np.array_equal(points[0], points[-1]):
+        simplified = simplify_ring(points, tolerance)
+    else:
+        simplified = _douglas_peucker(points, tolerance)
+        short = np.hypot(*(points[-1] - points[0])) <= 2 * tolerance
+        if len(simplified) == 2 and len(points) > 2 and short:
+            distances = _chord_distances(points)
+            if distances.max() > 0:
+                farthest = int(np.argmax(distances)) + 1
+                simplified = points[[0, farthest, -1]]
+    return simplified[::-1] if reverse else simplified
+
+
+def _simplify_traced_ring(ring, junctions, row_offset, tolerance):
+    """Simplify a traced ring arc by arc, between its junctions."""
+    # Walk the ring a pixel edge at a time: junctions can be in the middle
+    # of a straight run, where the traced ring has no vertex.
+    steps = np.diff(ring, axis=0)
+    lengths = np.abs(steps).sum(axis=1).astype(np.int64)
+    directions = np.sign(steps)
+    segment = np.repeat(np.arange(len(steps)), lengths)
+    step = np.arange(len(segment)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    points = ring[segment] + step[:, np.newaxis] * directions[segment]
+
+    columns = points[:, 0].astype(np.int64)
+    rows = points[:, 1].astype(np.int64) - row_offset
+    is_junction = junctions[rows, columns]
+    # Only keep the corners (& junctions), whichever vertex the ring
+    # started from.
+    turns = (directions[segment] != directions[np.roll(segment, 1)]).any(axis=1)
+    keep = turns | is_junction
+    points, is_junction = points[keep], is_junction[keep]
+
+    starts = np.flatnonzero(is_junction)
+    if not len(starts):
+        # All one border, with a single other region: start it at its
+        # smallest point, wherever it was traced from.
+        first = np.lexsort((points[:, 1], points[:, 0]))[0]
+        points = np.roll(points, -first, axis=0)
+        return _simplify_arc(np.concatenate([points, points[:1]]), tolerance)
+
+    points = np.roll(points, -starts[0], axis=0)
+    ends = list(starts - starts[0]) + [len(points)]
+    closed = np.concatenate([points, points[:1]])
+    arcs = [
+        _simplify_arc(closed[start : end + 1], tolerance)
+        for start, end in zip(ends[:-1], ends[1:])
+    ]
+    return np.concatenate([arcs[0][:1]] + [arc[1:] for arc in arcs])
+
+
+def _signed_area(ring: np.ndarray) -> float:
+    x, y = ring[:, 0], ring[:, 1]
+    return 0.5 * float(np.sum(x[:-1] * y[1:] - x[1:] * y[:-1]))
+
+
+def _orientation(p, q, r):
+    """The sign of the turn p -> q -> r, for arrays of points."""
+    return np.sign(
+        (q[..., 0] - p[..., 0]) * (r[..., 1] - p[..., 1])
+        - (q[..., 1] - p[..., 1]) * (r[..., 0] - p[..., 0])
+    )
+
+
+def _inside_segment(p, q, r, turns):
+    """Whether points r are on segments p-q, but not at their ends.
+
+    turns is the orientation of p -> q -> r.
+    """
+    within = np.all((np.minimum(p, q) <= r) & (r <= np.maximum(p, q)), axis=-1)
+    at_end = np.all(r == p, axis=-1) | np.all(r == q, axis=-1)
+    return (turns == 0) & within & ~at_end
+
+
+def _rings_cross(rings, block_size=256) -> bool:
+    """Whether any of the rings' segments cross or overlap.
+
+    Segments may only meet at their end points, like consecutive segments
+    (or a ring pinched at a vertex).
+    """
+    starts = np.concatenate([ring[:-1] for ring in rings])
+    ends = np.concatenate([ring[1:] for ring in rings])
+    r, s = starts[np.newaxis], ends[np.newaxis]
+    for block in range(0, len(starts), block_size):
+        p = starts[block : block + block_size, np.newaxis]
+        q = ends[block : block + block_size, np.newaxis]
+        pqr, pqs = _orientation(p, q, r), _orientation(p, q, s)
+        rsp, rsq = _orientation(r, s, p), _orientation(r, s, q)
+        crossing = (pqr * pqs < 0) & (rsp * rsq < 0)
+        touching = (
+            _inside_segment(p, q, r, pqr)
+            | _inside_segment(p, q, s, pqs)
+            | _inside_segment(r, s, p, rsp)
+            | _inside_segment(r, s, q, rsq)
+        )
+        same = np.all(p == r, axis=-1) & np.all(q == s, axis=-1)
+        same |= np.all(p == s, axis=-1) & np.all(q == r, axis=-1)
+        same[np.arange(len(p)), block + np.arange(len(p))] = False
+        if np.any(crossing | touching | same):
+            return True
+    return False
+
+
+def _contains(ring: np.ndarray, point: np.ndarray) -> bool:
+    """Whether a point (not on the ring) is inside it."""
+    x, y = point
+    start, end = ring[:-1], ring[1:]
+    spans = (start[:, 1] > y) != (end[:, 1] > y)
+    start, end = start[spans], end[spans]
+    crossings = start[:, 0] + (y - start[:, 1]) * (end[:, 0] - start[:, 0]) / (
+        end[:, 1] - start[:, 1]
+    )
+    return bool(np.count_nonzero(crossings > x) % 2)
+
+
+def _valid_polygon(rings, traced_rings) -> bool:
+    """Whether simplified rings still make a valid polygon.
+
+    Each ring must keep its orientation, no segments may cross, and the
+    holes must stay inside the exterior, & outside each other.
+    """
+    for ring, traced_ring in zip(rings, traced_rings):
+        area = _signed_area(ring)
+        if len(ring) < 4 or area == 0:
+            return False
+        if np.sign(area) != np.sign(_signed_area(traced_ring)):
+            return False
+    if _rings_cross(rings):
+        return False
+    # Without crossings, a hole is inside a ring if any point of it is. A
+    # segment's middle can't be on another ring.
+    for index, hole in enumerate(rings[1:], 1):
+        middle = (hole[0] + hole[1]) / 2
+        if not _contains(rings[0], middle):
+            return False
+        for other_index, other in enumerate(rings[1:], 1):
+            if other_index != index and _contains(other, middle):
+                return False
+    return True
+
+
+def simplify_polygon(rings, junctions, row_offset, tolerance):
+    """Simplify a traced polygon's rings, keeping touching cells touching.
+
+    Each ring is split into arcs at its junctions (see _junctions), and
+    each arc is simplified with Douglas-Peucker on its own, the same way
+    whichever direction it was traced in. So every cell sharing the arc
+    gets the same simplified border.
+
+    Args:
+        rings (list[np.ndarray]): the traced (exterior & hole) rings, as
+            (column, row) pixel corners
+        junctions (np.ndarray): the junctions of the labels the rings were
+            traced from
+        row_offset (int): the row the labels start at
+        tolerance (float): the Douglas-Peucker tolerance, in pixels
+
+    Returns the simplified rings, or the traced rings if simplifying would
+    make an invalid polygon. (Then they don't match the simplified borders
+    of the touching cells.)
+    """
+    if tolerance <= 0:
+        return rings
+    simplified = [
+        _simplify_traced_ring(ring, junctions, row_offset, tolerance) for ring in rings
+    ]
+    if not _valid_polygon(simplified, rings):
+        return rings
+    return simplified
+
+
+def _trace_band(
+    band_labels,
+    band_mask,
+    row_offset,
+    encoding=GEOJSON,
+    simplify_tolerance=None,
+    integer_coordinates=False,
+):
+    """Trace a band's polygons, returning them encoded as a batch.
+
+    GeoJSON batches are a list of serialized features. WKB batches are a
+    dict of columns: label, geometry (WKB), and the bounding box.
+
+    Also returns counts of the vertices & encoded bytes, before & after
+    simplifying.
+    """
+    transform = Affine.translation(0, row_offset)
+    shapes = features.shapes(
+        band_labels, band_mask, connectivity=8, transform=transform
+    )
+    transformed = simplify_tolerance is not None or (
+        integer_coordinates and encoding == GEOJSON
+    )
+    counts = dict.fromkeys(["traced_vertices", "vertices", "traced_bytes", "bytes"], 0)
+    if simplify_tolerance is not None:
+        junctions = _junctions(band_labels)
+
+    geojson_shapes, labels, geometries, bounds = [], [], [], []
+    for shape, label in shapes:
+        counts["traced_vertices"] += sum(len(ring) for ring in shape["coordinates"])
+
+        if encoding == GEOJSON and not transformed:
+            geojson_shapes.append(_dumps(shape))
+            continue
+        if encoding == GEOJSON:
+            counts["traced_bytes"] += len(_dumps(shape))
+
+        rings = [np.asarray(ring, dtype=np.float64) for ring in shape["coordinates"]]
+        if simplify_tolerance is not None:
+            rings = simplify_polygon(rings, junctions, row_offset, simplify_tolerance)
+        counts["vertices"] += sum(len(ring) for ring in rings)
+
+        if encoding == GEOJSON:
+            # The traced coordinates are pixel edges, so they're integers.
+            if integer_coordinates:
+                rings = [ring.astype(np.int64) for ring in rings]
+            shape = {"type": "Polygon", "coordinates": [r.tolist() for r in rings]}
+            geojson_shapes.append(_dumps(shape))
+            continue
+
+        labels.append(label)
+        geometries.append(_polygon_wkb(rings))
+        # The exterior ring bounds the polygon.
+        bounds.append(np.concatenate([rings[0].min(axis=0), rings[0].max(axis=0)]))
+
+    if encoding == GEOJSON:
+        counts["bytes"] = sum(len(shape) for shape in geojson_shapes)
+        if not transformed:
+            counts["vertices"] = counts["traced_vertices"]
+            counts["traced_bytes"] = counts["bytes"]
+        return geojson_shapes, counts
+
+    counts["bytes"] = sum(len(geometry) for geometry in geometries)
+    # WKB points are 2 doubles each, whatever their values.
+    removed_vertices = counts["traced_vertices"] - counts["vertices"]
+    counts["traced_bytes"] = counts["bytes"] + 16 * removed_vertices
+
+    bounds = np.array(bounds, dtype=np.float64).reshape(-1, 4)
+    batch = {
+        "label": np.array(labels, dtype=np.int32),
+        "geometry": geometries,
+        "xmin": bounds[:, 0],
+        "ymin": bounds[:, 1],
+        "xmax": bounds[:, 2],
+        "ymax": bounds[:, 3],
+    }
+    return batch, counts
+
+
+def _iter_bands(labels, band_height):
+    """Generates (band labels, band mask, row offset) for each band.
+
+    The band labels include the row above & below the band (if any), masked
+    out: to find the junctions along the band's top & bottom edges.
+    """
+    objects = nd.find_objects(labels)
+    if not objects:
+        return
+
+    # Map each label to the band that owns it.
+    owner = np.full(len(objects) + 1, -1, dtype=np.int64)
+    band_bottom = {}
+    for index, slices in enumerate(objects):
+        if slices is None:
+            continue
+        band = slices[0].start // band_height
+        owner[index + 1] = band
+        band_bottom[band] = max(band_bottom.get(band, 0), slices[0].stop)
+
+    for band, bottom in sorted(band_bottom.items()):
+        top = band * band_height
+        bottom = max(bottom, min(top + band_height, labels.shape[0]))
+        # Cells in the rows above & below belong to other bands.
+        top, bottom = max(top - 1, 0), min(bottom + 1, labels.shape[0])
+        band_labels = np.ascontiguousarray(labels[top:bottom], dtype=np.int32)
+        band_mask = owner[band_labels] == band
+        yield band_labels, band_mask, top
+
+
+def iter_shape_batches(
+    labels,
+    encoding=GEOJSON,
+    band_height=DEFAULT_BAND_HEIGHT,
+    max_workers=None,
+    simplify_tolerance=None,
+    integer_coordinates=False,
+    stats=None,
+):
+    """Generates the encoded polygons of each band (see _trace_band).
+
+    Background (label 0) isn't traced. Coordinates are (column, row) pixel
+    edges, like features.shapes with the identity transform.
+
+    Args:
+        labels (np.ndarray): the (height, width) label mask. Labels must fit
+            in an int32.
+        encoding (str): GEOJSON or WKB
+        band_height (int): number of rows per band
+        max_workers (int): processes tracing bands. Default: available CPUs.
+            Use 1 to trace in this process.
+        simplify_tolerance (float): if set, simplify each polygon with this
+            tolerance in pixels, keeping touching cells touching (see
+            simplify_polygon).
+            Default/None: keep every traced vertex.
+        integer_coordinates (bool): write GeoJSON coordinates as integers,
+            eg 12 instead of 12.0. (WKB coordinates are always doubles.)
+        stats (dict): if set, filled in with the traced_vertices & vertices
+            written, and the traced_bytes & bytes they'd encode to, to see
+            how much simplifying saves.
+    """
+    if labels.ndim != 2:
+        raise ValueError("Expected a 2D label mask, got shape %s" % (labels.shape,))
+    if encoding not in [GEOJSON, WKB]:
+        raise ValueError("Invalid shape encoding: %s" % encoding)
+    if stats is None:
+        stats = {}
+    stats.update(
+        dict.fromkeys(["traced_vertices", "vertices", "traced_bytes", "bytes"], 0)
+    )
+
+    options = (encoding, simplify_tolerance, integer_coordinates)
+    bands = _iter_bands(labels, band_height)
+
+    def collect(result):
+        batch, counts = result
+        for key, count in counts.items():
+            stats[key] += count
+        return batch
+
+    if max_workers == 1:
+        for band in bands:
+            yield collect(_trace_band(*band, *options))
+        return
+
+    if max_workers is None:
+        max_workers = get_available_cpus()
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        # Only keep a couple of bands per worker in flight, so that we don't
+        # hold every band (or every band's shapes) in memory at once.
+        pending = []
+        for band in bands:
+            pending.append(executor.submit(_trace_band, *band, *options))
+            if len(pending) >= 2 * max_workers:
+                yield collect(pending.pop(0).result())
+        for future in pending:
+            yield collect(future.result())
+
+
+def iter_shapes(labels, **kwargs):
+    """Generates the serialized GeoJSON polygon of each labeled region.
+
+    Keyword arguments are passed on to iter_shape_batches.
+    """
+    for batch in iter_shape_batches(labels, GEOJSON, **kwargs):
+        yield from batch
+
+
+def write_shapes(labels, f, **kwargs) -> int:
+    """Write newline-delimited GeoJSON polygons to a binary file.
+
+    Keyword arguments are passed on to iter_shape_batches.
+    Returns the number of shapes written.
+    """
+    count = 0
+    for shape in iter_shapes(labels, **kwargs):
+        f.write(shape)
+        f.write(b"\n")
+        count += 1
+    return count
+
+
+def write_geoparquet(labels, f, **kwargs) -> int:
+    """Write polygons to a binary file as GeoParquet.
+
+    Each row has the cell's label, its polygon (WKB), and its bounding box
+    (xmin, ymin, xmax, ymax) for fast spatial filtering. Each band is
+    written as its own row group.
+
+    Keyword arguments are passed on to iter_shape_batches.
+    Returns the number of shapes written.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    # The bbox is optional in the GeoParquet metadata: we'd only know it once
+    # every band is written, but the metadata goes in the schema up front.
+    # The per-row bbox columns cover spatial filtering.
+    geo_metadata = {
+        "version": "1.0.0",
+        "primary_column": "geometry",
+        "columns": {"geometry": {"encoding": "WKB", "geometry_types": ["Polygon"]}},
+    }
+    schema = pa.schema(
+        [
+            ("label", pa.int32()),
+            ("geometry", pa.binary()),
+            ("xmin", pa.float64()),
+            ("ymin", pa.float64()),
+            ("xmax", pa.float64()),
+            ("ymax", pa.float64()),
+        ],
+        metadata={"geo": json.dumps(geo_metadata)},
+    )
+
+    count = 0
+    with pq.ParquetWriter(f, schema, compression="zstd") as writer:
+        for batch in iter_shape_batches(labels, WKB, **kwargs):
+            if not len(batch["label"]):
+                continue
+            writer.write_table(pa.table(batch, schema=schema))
+            count += len(batch["label"])
+
+    return count
@@ -20,7 +20,7 @@ be split between markers on opposite sides.
 import numpy as np
 from scipy import ndimage as ndi
 
-from .watershed_cy import watershed_raveled_wrapper
+from .watershed_cy import watershed_raveled_wrapper, watershed_unpadded_wrapper
 from skimage.morphology.extrema import local_minima
 from skimage.morphology._util import (
     _validate_connectivity,
@@ -105,6 +105,29 @@ def _validate_inputs(image, markers, mask, connectivity, in_place=False):
         )
 
 
+def _priority_quantization(image, priority_levels, compactness):
+    """The (levels, offset, scale) to quantize the image's priorities with,
+    for the watershed kernel: level = (value - offset) * scale.
+
+    Returns zeros (for no quantization) if priority_levels is None.
+    """
+    if priority_levels is None:
+        return 0, 0.0, 0.0
+    if not 2 <= priority_levels <= 65536:
+        raise ValueError(
+            f"priority_levels must be between 2 and 65536, got {priority_levels}"
+        )
+    if compactness > 0:
+        raise ValueError("priority_levels isn't supported with compactness")
+
+    if image.size == 0:
+        return priority_levels, 0.0, 0.0
+    low, high = float(image.min()), float(image.max())
+    # Levels are rounded down: so the max gets the top level.
+    scale = (priority_levels - 1) / (high - low) if high > low else 0.0
+    return priority_levels, low, scale
+
+
 def watershed(
     image,
     markers=None,
@@ -114,6 +137,7 @@ def watershed(
     compactness=0,
     watershed_line=False,
     in_place=False,
+    priority_levels=None,
 ):
     """Find watershed basins in an image flooded from given markers.
 
@@ -150,6 +174,12 @@ def watershed(
         Note that the method used for adding this line expects that
         marker regions are not adjacent; the watershed line may not catch
         borders between adjacent marker regions.
+    priority_levels : int, optional
+        Quantize the image to this many levels (eg 256 for 8 bits, or
+        65536 for 16 bits) between its min & max, and flood with a bucket
+        queue instead of a heap. This is faster, but pixels whose values
+        only differ within a level are flooded in the order they're reached.
+        Not supported with compactness. Default: flood the exact values.
 
     Returns
     -------
@@ -237,6 +267,7 @@ def watershed(
         image, markers, mask, connectivity, in_place
     )
     connectivity, offset = _validate_connectivity(image.ndim, connectivity, offset)
+    quantization = _priority_quantization(image, priority_levels, compactness)
 
     # pad the image, markers, and mask so that we can use the mask to
     # keep from running off the edges
@@ -260,8 +291,138 @@ def watershed(
         compactness,
         output.ravel(),
         watershed_line,
+        *quantization,
     )
 
     output = crop(output, pad_width, copy=True)
 
     return output
+
+
+def _neighbor_offsets(footprint, center):
+    """The offsets to each neighbor along each dimension, sorted by distance.
+
+    This is the same order as skimage's _offsets_to_raveled_neighbors.
+    """
+    offsets = np.stack(
+        [idx - c for idx, c in zip(np.nonzero(footprint), center)], axis=-1
+    )
+    distances = np.sqrt(np.sum(offsets**2, axis=1))
+    offsets = offsets[np.argsort(distances, kind="stable")]
+    # Remove the offset to the center.
+    offsets = offsets[np.any(offsets != 0, axis=1)]
+    return np.ascontiguousarray(offsets, dtype=np.intp)
+
+
+def watershed_unpadded(
+    image,
+    markers,
+    connectivity=1,
+    offset=None,
+    mask=None,
+    compactness=0,
+    watershed_line=False,
+    output=None,
+    priority_levels=None,
+):
+    """Find watershed basins in an image flooded from given markers, without
+    padded copies of the inputs.
+
+    Gives the same labels as ``watershed``, but the kernel checks the image
+    borders itself, so the image, markers & mask are used as they are (if
+    C-contiguous), and the labels are written straight into ``output``. So
+    the peak memory is the inputs & the output (plus the priority queue).
+
+    Parameters
+    ----------
+    image : (M, N[, ...]) ndarray
+        Data array where the lowest value points are labeled first.
+        float32 images are flooded as float32, others as float64.
+    markers : (M, N[, ...]) ndarray of int
+        An array marking the basins with the values to be assigned in the
+        label matrix. Zero means not a marker.
+    connectivity : int or ndarray, optional
+        The neighborhood connectivity, as in ``watershed``.
+    offset : array_like of shape image.ndim, optional
+        The coordinates of the center of the footprint.
+    mask : (M, N[, ...]) ndarray of bools or 0's and 1's, optional
+        Only points at which mask == True will be labeled.
+    compactness : float, optional
+        Use compact watershed with given compactness parameter.
+    watershed_line : bool, optional
+        If True, a one-pixel wide line separates the regions. (This needs a
+        copy of the mask, to mark the lines in.)
+    output : (M, N[, ...]) ndarray of int, optional
+        C-contiguous array to write the labels to. Can be ``markers`` itself,
+        to label in place. Default: a new array of the markers' type.
+    priority_levels : int, optional
+        Quantize the priorities to this many levels, as in ``watershed``.
+
+    Returns
+    -------
+    out : ndarray
+        The labels: ``output``, if given.
+    """
+    image = np.asanyarray(image)
+    markers = np.asanyarray(markers)
+    if markers.shape != image.shape:
+        message = (
+            f"`markers` (shape {markers.shape}) must have same "
+            f"shape as `image` (shape {image.shape})"
+        )
+        raise ValueError(message)
+
+    if output is None:
+        output = np.empty(markers.shape, dtype=markers.dtype)
+    elif output.shape != image.shape or not output.flags.c_contiguous:
+        raise ValueError("`output` must be C-contiguous, with the image's shape")
+
+    if mask is None:
+        if output is not markers:
+            output[...] = markers
+        if watershed_line:
+            mask = np.ones(image.size, dtype=np.int8)
+        else:
+            mask = np.empty(0, dtype=np.int8)
+    else:
+        mask = np.asanyarray(mask, dtype=bool)
+        if mask.shape != image.shape:
+            message = (
+                f"`mask` (shape {mask.shape}) must have same shape "
+                f"as `image` (shape {image.shape})"
+            )
+            raise ValueError(message)
+        np.multiply(markers, mask, out=output)
+        mask = np.ascontiguousarray(mask)
+        if watershed_line:
+            mask = mask.copy()
+        mask = mask.view(np.int8).ravel()
+
+    if image.size == 0:
+        return output
+
+    if image.dtype != np.float32:
+        image = image.astype(np.float64, copy=False)
+    image = np.ascontiguousarray(image)
+
+    footprint, center = _validate_connectivity(image.ndim, connectivity, offset)
+    quantization = _priority_quantization(image, priority_levels, compactness)
+    offsets = _neighbor_offsets(footprint, center)
+    image_strides = np.array(image.strides, dtype=np.intp) // image.itemsize
+    flat_neighborhood = offsets @ image_strides
+
+    watershed_unpadded_wrapper(
+        image.ravel(),
+        np.flatnonzero(output),
+        flat_neighborhood,
+        mask,
+        image_strides,
+        compactness,
+        output.reshape(-1),
+        watershed_line,
+        offsets,
+        np.array(image.shape, dtype=np.intp),
+        *quantization,
+    )
+
+    return output
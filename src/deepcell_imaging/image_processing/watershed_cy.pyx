@@ -16,6 +16,7 @@ ctypedef cnp.int8_t DTYPE_BOOL_t
 
 
 include "heap_watershed.pxi"
+include "bucket_queue.pxi"
 
 
 @cython.wraparound(False)
@@ -37,6 +38,49 @@ cdef inline cnp.float64_t _euclid_dist(Py_ssize_t pt0, Py_ssize_t pt1,
     return sqrt(result)
 
 
+@cython.wraparound(False)
+@cython.boundscheck(False)
+@cython.cdivision(True)
+@cython.unraisable_tracebacks(False)
+@cython.exceptval(check=False)
+cdef inline bint _coords(Py_ssize_t index,
+                         cnp.intp_t[::1] strides,
+                         cnp.intp_t[::1] shape,
+                         cnp.intp_t[::1] radius,
+                         cnp.intp_t[::1] coords) nogil:
+    """Set ``coords`` to the coordinates of raveled point ``index``.
+
+    Return whether the point is within ``radius`` of the image border, so
+    some of its neighbors may be outside the image.
+    """
+    cdef bint near_border = False
+    for i in range(shape.shape[0]):
+        coords[i] = index // strides[i]
+        index -= coords[i] * strides[i]
+        if coords[i] < radius[i] or coords[i] >= shape[i] - radius[i]:
+            near_border = True
+    return near_border
+
+
+@cython.wraparound(False)
+@cython.boundscheck(False)
+@cython.unraisable_tracebacks(False)
+@cython.exceptval(check=False)
+cdef inline bint _in_bounds(cnp.intp_t[:, ::1] offsets,
+                            Py_ssize_t neighbor,
+                            cnp.intp_t[::1] coords,
+                            cnp.intp_t[::1] shape) nogil:
+    """Return whether the point at ``coords`` + ``offsets[neighbor]`` is
+    inside the image.
+    """
+    cdef Py_ssize_t i, coord
+    for i in range(shape.shape[0]):
+        coord = coords[i] + offsets[neighbor, i]
+        if coord < 0 or coord >= shape[i]:
+            return False
+    return True
+
+
 @cython.wraparound(False)
 @cython.boundscheck(False)
 @cython.cdivision(True)
@@ -47,11 +91,18 @@ cdef inline DTYPE_BOOL_t _diff_neighbors(np_anyint[::1] output,
                                          DTYPE_BOOL_t[::1] mask,
                                          Py_ssize_t index,
                                          np_anyint label,
+                                         cnp.intp_t[:, ::1] offsets,
+                                         cnp.intp_t[::1] coords,
+                                         cnp.intp_t[::1] shape,
+                                         bint near_border,
                                          ) nogil:
     """
     Return ``True`` and set ``mask[index]`` to ``False`` if the neighbors of
     ``index`` (as given by the offsets in ``structure``) have more than one
     distinct nonzero label.
+
+    If ``index`` is ``near_border``, neighbors outside the image are
+    skipped, using the ``offsets`` & the ``coords`` of ``index``.
     """
     cdef:
         Py_ssize_t i, neighbor_index
@@ -62,6 +113,8 @@ cdef inline DTYPE_BOOL_t _diff_neighbors(np_anyint[::1] output,
         return True
 
     for i in range(nneighbors):
+        if near_border and not _in_bounds(offsets, i, coords, shape):
+            continue
         neighbor_index = structure[i] + index
         if mask[neighbor_index]:  # neighbor not a watershed line
             neighbor_label = output[neighbor_index]
@@ -78,12 +131,79 @@ def watershed_raveled_wrapper(np_floats[::1] image,
                               cnp.intp_t[::1] strides,
                               cnp.float64_t compactness,
                               np_anyint[::1] output,
-                              DTYPE_BOOL_t wsl):
-    """Wrapper for watershed_raveled that accepts numpy arrays."""
-    if np_floats is cnp.float32_t:
-        watershed_raveled(<Heapitem32*> 0, <Heap32*> 0, <cnp.float32_t> 0, image, marker_locations, structure, mask, strides, compactness, output, wsl)
+                              DTYPE_BOOL_t wsl,
+                              Py_ssize_t priority_levels=0,
+                              cnp.float64_t priority_offset=0,
+                              cnp.float64_t priority_scale=0):
+    """Wrapper for watershed_raveled that accepts numpy arrays.
+
+    The image, mask & output must be padded, with the mask 0 on the border.
+
+    If ``priority_levels`` is nonzero, the priorities are quantized to that
+    many levels, as ``(value - priority_offset) * priority_scale``, & flooded
+    with a bucket queue (see watershed_bucket_raveled).
+    """
+    cdef cnp.intp_t[:, ::1] no_offsets = np.empty((0, 0), dtype=np.intp)
+    cdef cnp.intp_t[::1] no_shape = np.empty(0, dtype=np.intp)
+    _watershed_raveled_dispatch(image, marker_locations, structure, mask, strides,
+                                compactness, output, wsl, no_offsets, no_shape,
+                                priority_levels, priority_offset, priority_scale)
+
+
+def watershed_unpadded_wrapper(np_floats[::1] image,
+                               cnp.intp_t[::1] marker_locations,
+                               cnp.intp_t[::1] structure,
+                               DTYPE_BOOL_t[::1] mask,
+                               cnp.intp_t[::1] strides,
+                               cnp.float64_t compactness,
+                               np_anyint[::1] output,
+                               DTYPE_BOOL_t wsl,
+                               cnp.intp_t[:, ::1] offsets,
+                               cnp.intp_t[::1] shape,
+                               Py_ssize_t priority_levels=0,
+                               cnp.float64_t priority_offset=0,
+                               cnp.float64_t priority_scale=0):
+    """Wrapper for watershed_raveled, checking the image borders itself.
+
+    ``offsets`` are the neighbor offsets along each dimension (in the same
+    order as ``structure``), & ``shape`` is the image shape. The mask may be
+    empty, for no mask (but not with ``wsl``: the lines are written to it).
+
+    The priority arguments are as in watershed_raveled_wrapper.
+    """
+    _watershed_raveled_dispatch(image, marker_locations, structure, mask, strides,
+                                compactness, output, wsl, offsets, shape,
+                                priority_levels, priority_offset, priority_scale)
+
+
+cdef _watershed_raveled_dispatch(np_floats[::1] image,
+                                 cnp.intp_t[::1] marker_locations,
+                                 cnp.intp_t[::1] structure,
+                                 DTYPE_BOOL_t[::1] mask,
+                                 cnp.intp_t[::1] strides,
+                                 cnp.float64_t compactness,
+                                 np_anyint[::1] output,
+                                 DTYPE_BOOL_t wsl,
+                                 cnp.intp_t[:, ::1] offsets,
+                                 cnp.intp_t[::1] shape,
+                                 Py_ssize_t priority_levels,
+                                 cnp.float64_t priority_offset,
+                                 cnp.float64_t priority_scale):
+    cdef cnp.intp_t[::1] coords = np.zeros(shape.shape[0], dtype=np.intp)
+    # How far the neighbors reach along each dimension.
+    cdef cnp.intp_t[::1] radius = np.zeros(shape.shape[0], dtype=np.intp)
+    if offsets.shape[0] > 0:
+        radius = np.abs(np.asarray(offsets)).max(axis=0)
+    if priority_levels:
+        if compactness > 0:
+            raise ValueError("Quantized priorities don't support compactness")
+        watershed_bucket_raveled(image, marker_locations, structure, mask,
+                                 strides, output, wsl, offsets, shape, radius, coords,
+                                 priority_levels, priority_offset, priority_scale)
+    elif np_floats is cnp.float32_t:
+        watershed_raveled(<Heapitem32*> 0, <Heap32*> 0, <cnp.float32_t> 0, image, marker_locations, structure, mask, strides, compactness, output, wsl, offsets, shape, radius, coords)
     elif np_floats is cnp.float64_t:
-        watershed_raveled(<Heapitem64*> 0, <Heap64*> 0, <cnp.float64_t> 0, image, marker_locations, structure, mask, strides, compactness, output, wsl)
+        watershed_raveled(<Heapitem64*> 0, <Heap64*> 0, <cnp.float64_t> 0, image, marker_locations, structure, mask, strides, compactness, output, wsl, offsets, shape, radius, coords)
     else:
         raise ValueError("image must be of type float32 or float64")
 
@@ -100,7 +220,11 @@ cdef void watershed_raveled(Heapitem* _dummy_heapitem,
                        cnp.intp_t[::1] strides,
                        cnp.float64_t compactness,
                        np_anyint[::1] output,
-                       DTYPE_BOOL_t wsl):
+                       DTYPE_BOOL_t wsl,
+                       cnp.intp_t[:, ::1] offsets,
+                       cnp.intp_t[::1] shape,
+                       cnp.intp_t[::1] radius,
+                       cnp.intp_t[::1] coords):
     """Perform watershed algorithm using a raveled image and neighborhood.
 
     Parameters
@@ -118,9 +242,10 @@ cdef void watershed_raveled(Heapitem* _dummy_heapitem,
     mask : array of int
         An array of the same shape as `image` where each pixel contains a
         nonzero value if it is to be considered for flooding with watershed,
-        zero otherwise. NOTE: it is *essential* that the border pixels (those
-        with neighbors falling outside the volume) are all set to zero, or
-        segfaults could occur.
+        zero otherwise. NOTE: unless ``shape`` is given, it is *essential*
+        that the border pixels (those with neighbors falling outside the
+        volume) are all set to zero, or segfaults could occur. If empty,
+        every pixel is considered.
     strides : array of int
         An array representing the number of steps to move along each dimension.
         This is used in computing the Euclidean distance between raveled
@@ -134,6 +259,18 @@ cdef void watershed_raveled(Heapitem* _dummy_heapitem,
     wsl : bool
         Parameter indicating whether the watershed line is calculated.
         If wsl is set to True, the watershed line is calculated.
+    offsets : 2D array of int
+        The neighbor offsets along each dimension, in the order of
+        ``structure``. Only used with ``shape``.
+    shape : array of int
+        The image shape, to skip neighbors outside the image (instead of
+        relying on a padded mask). If empty, the image is padded.
+    radius : array of int
+        How far the neighbors reach along each dimension: the neighbors of
+        pixels further from the border are all inside the image.
+    coords : array of int
+        Scratch space for the current pixel's coordinates, of length
+        ``shape.shape[0]``.
     """
     cdef Heapitem elem
     cdef Heapitem new_elem
@@ -143,6 +280,9 @@ cdef void watershed_raveled(Heapitem* _dummy_heapitem,
     cdef Py_ssize_t index = 0
     cdef Py_ssize_t neighbor_index = 0
     cdef DTYPE_BOOL_t compact = (compactness > 0)
+    cdef DTYPE_BOOL_t has_mask = (mask.shape[0] > 0)
+    cdef DTYPE_BOOL_t check_bounds = (shape.shape[0] > 0)
+    cdef bint near_border = False
     cdef np_floats neg_inf = -np.inf
 
     cdef Heap *hp
@@ -174,6 +314,9 @@ cdef void watershed_raveled(Heapitem* _dummy_heapitem,
             while hp.items > 0:
                 heappop[Heap, Heapitem](hp, &elem)
 
+                if check_bounds:
+                    near_border = _coords(elem.index, strides, shape, radius, coords)
+
                 if compact or wsl:
                     # in the compact case, we need to label pixels as they come off
                     # the heap, because the same pixel can be pushed twice, *and* the
@@ -190,14 +333,18 @@ cdef void watershed_raveled(Heapitem* _dummy_heapitem,
                     # when `wsl` is `True`, label is only set for pixels without a neighbor of different label
                     # NOTE: `_diff_neighbors` sets `mask[elem.index]` to `False` if
                     #        neighbor has different label
-                    if compact or not _diff_neighbors(output, structure, mask, elem.index, output[elem.source]):
+                    if compact or not _diff_neighbors(output, structure, mask, elem.index, output[elem.source], offsets, coords, shape, near_border):
                         output[elem.index] = output[elem.source]
 
                 for i in range(nneighbors):
+                    if near_border and not _in_bounds(offsets, i, coords, shape):
+                        # neighbor is outside the (unpadded) image
+                        continue
+
                     # get the flattened address of the neighbor
                     neighbor_index = structure[i] + elem.index
 
-                    if not mask[neighbor_index]:
+                    if has_mask and not mask[neighbor_index]:
                         # this branch includes basin boundaries, aka watershed lines
                         # neighbor is not in mask
                         continue
@@ -232,4 +379,108 @@ cdef void watershed_raveled(Heapitem* _dummy_heapitem,
                     heappush[Heap, Heapitem](hp, &new_elem)
 
 
-        heap_done[Heap](hp)
\ No newline at end of file
+        heap_done[Heap](hp)
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+@cython.exceptval(check=False)
+cdef inline Py_ssize_t _priority_level(cnp.float64_t value,
+                                       Py_ssize_t levels,
+                                       cnp.float64_t offset,
+                                       cnp.float64_t scale) nogil:
+    """Quantize a priority to a level in [0, levels)."""
+    cdef cnp.float64_t level = (value - offset) * scale
+    # (NaN isn't >= 0 either.)
+    if not level >= 0:
+        return 0
+    if level >= levels - 1:
+        return levels - 1
+    return <Py_ssize_t> level
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef int watershed_bucket_raveled(np_floats[::1] image,
+                                   cnp.intp_t[::1] marker_locations,
+                                   cnp.intp_t[::1] structure,
+                                   DTYPE_BOOL_t[::1] mask,
+                                   cnp.intp_t[::1] strides,
+                                   np_anyint[::1] output,
+                                   DTYPE_BOOL_t wsl,
+                                   cnp.intp_t[:, ::1] offsets,
+                                   cnp.intp_t[::1] shape,
+                                   cnp.intp_t[::1] radius,
+                                   cnp.intp_t[::1] coords,
+                                   Py_ssize_t levels,
+                                   cnp.float64_t offset,
+                                   cnp.float64_t scale) except -1:
+    """Perform watershed algorithm like watershed_raveled, but with the
+    priorities quantized to ``levels`` levels, in a bucket queue.
+
+    Pixels of the same level are flooded in the order they were pushed, just
+    like the heap breaks ties by age. The markers come first, at level 0.
+
+    Compactness isn't supported: it's the plain flooding (optionally with
+    the watershed line).
+
+    Raises MemoryError if the queue can't grow.
+    """
+    cdef BucketItem elem
+    cdef Py_ssize_t nneighbors = structure.shape[0]
+    cdef Py_ssize_t i = 0
+    cdef Py_ssize_t index = 0
+    cdef Py_ssize_t neighbor_index = 0
+    cdef Py_ssize_t level = 0
+    cdef DTYPE_BOOL_t has_mask = (mask.shape[0] > 0)
+    cdef DTYPE_BOOL_t check_bounds = (shape.shape[0] > 0)
+    cdef bint near_border = False
+    cdef BucketQueue *queue
+
+    queue = bucket_queue_new(levels)
+    try:
+        with nogil:
+            for i in range(marker_locations.shape[0]):
+                index = marker_locations[i]
+                bucket_push(queue, 0, index, index)
+
+            while queue.items > 0:
+                bucket_pop(queue, &elem)
+
+                if check_bounds:
+                    near_border = _coords(elem.index, strides, shape, radius, coords)
+
+                if wsl:
+                    # As in watershed_raveled: label pixels as they come off the
+                    # queue, unless they're on the watershed line.
+                    if output[elem.index] and elem.index != elem.source:
+                        continue
+                    if not _diff_neighbors(output, structure, mask, elem.index, output[elem.source], offsets, coords, shape, near_border):
+                        output[elem.index] = output[elem.source]
+
+                for i in range(nneighbors):
+                    if near_border and not _in_bounds(offsets, i, coords, shape):
+                        continue
+
+                    neighbor_index = structure[i] + elem.index
+
+                    if has_mask and not mask[neighbor_index]:
+                        continue
+
+                    if output[neighbor_index]:
+                        continue
+
+                    if not wsl:
+                        output[neighbor_index] = output[elem.index]
+
+                    # The cost of moving to the neighbor is at least the cost of
+                    # its own neighboring pixel: the current level.
+                    level = _priority_level(image[neighbor_index], levels, offset, scale)
+                    if level < queue.level:
+                        level = queue.level
+
+                    bucket_push(queue, level, neighbor_index, elem.source)
+
+    finally:
+        bucket_queue_done(queue)
+    return 0
@@ -6,8 +6,11 @@ remove the stateful class object. Instead, each function is a standalone
 function that can be called independently.
 """
 
+import inspect
+import itertools
 import logging
 import timeit
+from concurrent.futures import ThreadPoolExecutor
 
 import numpy as np
 from deepcell_toolbox.processing import histogram_normalization
@@ -19,21 +22,25 @@ from deepcell_toolbox.utils import (
     untile_image,
 )
 import scipy.ndimage as nd
-from skimage.feature import peak_local_max
-from skimage.measure import label, euler_number
+from skimage.measure import label
 from skimage.morphology import (
     disk,
     ball,
     square,
     cube,
     dilation,
-    remove_small_objects,
-    remove_small_holes,
 )
-from skimage.segmentation import relabel_sequential
 
+from deepcell_imaging.image_processing.dynamics import (
+    h_maxima_from_dynamics,
+    maxima_dynamics,
+)
 from deepcell_imaging.image_processing.extrema import h_maxima
-from deepcell_imaging.image_processing.watershed import watershed
+from deepcell_imaging.image_processing.holes import fill_holes
+from deepcell_imaging.image_processing.peaks import peak_local_max_markers
+from deepcell_imaging.image_processing.relabel import remove_small_objects_and_relabel
+from deepcell_imaging.image_processing.watershed import watershed_unpadded
+from deepcell_imaging.utils.lru_cache import LRUCache
 
 MODEL_REMOTE_PATH = "gs://davids-genomics-data-public/cellular-segmentation/deep-cell/vanvalenlab-tf-model-multiplex-downloaded-20230706/MultiplexSegmentation.tar.gz"
 
@@ -121,7 +128,25 @@ def postprocess(
     compartment="whole-cell",
     whole_cell_kwargs={},
     nuclear_kwargs={},
+    compartment_callback=None,
+    whole_cell_from_nuclei=False,
+    concurrent_compartments=True,
 ):
+    """Postprocess model output into label images, resized to the input shape.
+
+    If compartment_callback is set, it's called as
+    compartment_callback(compartment, label_image) as soon as each
+    compartment is segmented, with the (height, width, 1) label image. This
+    lets callers start writing one compartment while the next is computed.
+
+    If whole_cell_from_nuclei is set (with compartment "both"), the nuclei
+    are the whole-cell watershed's markers: see mesmer_postprocess.
+
+    With compartment "both", the compartments are segmented at the same
+    time unless concurrent_compartments is False (eg to hold only one
+    compartment's temporary arrays in memory). The callback may then be
+    called from another thread.
+    """
     logger = logging.getLogger(__name__)
 
     # TODO: We need to validate the input (the output_images parameter)
@@ -162,8 +187,19 @@ def postprocess(
         "whole_cell_kwargs": postprocess_kwargs_whole_cell,
         "nuclear_kwargs": postprocess_kwargs_nuclear,
         "compartment": compartment,
+        "whole_cell_from_nuclei": whole_cell_from_nuclei,
+        "concurrent_compartments": concurrent_compartments,
     }
 
+    if compartment_callback:
+
+        def on_compartment_done(compartment_name, label_images):
+            compartment_callback(
+                compartment_name, _resize_output(label_images, input_shape)[0]
+            )
+
+        postprocess_kwargs["compartment_callback"] = on_compartment_done
+
     # Postprocess predictions to create label image
     t = timeit.default_timer()
     logger.debug(
@@ -346,7 +382,13 @@ def format_output_mesmer(output_list):
 
 
 def mesmer_postprocess(
-    model_output, compartment="whole-cell", whole_cell_kwargs=None, nuclear_kwargs=None
+    model_output,
+    compartment="whole-cell",
+    whole_cell_kwargs=None,
+    nuclear_kwargs=None,
+    compartment_callback=None,
+    whole_cell_from_nuclei=False,
+    concurrent_compartments=True,
 ):
     """Postprocess Mesmer output to generate predictions for distinct cellular compartments
 
@@ -362,12 +404,23 @@ def mesmer_postprocess(
             must be one of 'whole_cell', 'nuclear', 'both'
         whole_cell_kwargs (dict): Optional list of post-processing kwargs for whole-cell prediction
         nuclear_kwargs (dict): Optional list of post-processing kwargs for nuclear prediction
+        compartment_callback (function): Optional function called with
+            (compartment, label_images) as each compartment finishes
+        whole_cell_from_nuclei (bool): With compartment 'both', whether to
+            use the nuclei as the whole-cell markers, instead of finding
+            the whole-cell maxima. Each cell then has its nucleus's label
+            (& contains it). Only valid with compartment 'both'.
+        concurrent_compartments (bool): With compartment 'both', whether to
+            segment the compartments at the same time, in 2 threads (the
+            watershed kernels release the GIL). Not when tracing memory, or
+            when the whole cells are grown from the nuclei.
 
     Returns:
         numpy.array: Uniquely labeled mask for each compartment
 
     Raises:
-        ValueError: for invalid compartment flag
+        ValueError: for invalid compartment flag, or whole_cell_from_nuclei
+            without compartment 'both'
     """
 
     valid_compartments = ["whole-cell", "nuclear", "both"]
@@ -384,21 +437,71 @@ def mesmer_postprocess(
             f"Must be one of {valid_compartments}"
         )
 
+    if whole_cell_from_nuclei and compartment != "both":
+        raise ValueError(
+            "whole_cell_from_nuclei needs both compartments, "
+            f"not compartment: {compartment}"
+        )
+
+    def segment(compartment_name, kwargs, out=None):
+        label_images = deep_watershed(model_output[compartment_name], **kwargs)
+        if compartment_callback:
+            compartment_callback(compartment_name, label_images)
+        if out is not None:
+            out[...] = label_images
+        return label_images
+
     if compartment == "whole-cell":
-        label_images = deep_watershed(model_output["whole-cell"], **whole_cell_kwargs)
+        label_images = segment("whole-cell", whole_cell_kwargs)
     elif compartment == "nuclear":
-        label_images = deep_watershed(model_output["nuclear"], **nuclear_kwargs)
+        label_images = segment("nuclear", nuclear_kwargs)
     elif compartment == "both":
-        label_images_cell = deep_watershed(
-            model_output["whole-cell"], **whole_cell_kwargs
+        # Both compartments go straight into one array, without concatenating.
+        label_images = np.empty(
+            model_output["whole-cell"][0].shape[:-1] + (2,),
+            dtype=np.result_type(
+                _label_dtype(whole_cell_kwargs.get("memory_lean")),
+                _label_dtype(nuclear_kwargs.get("memory_lean")),
+            ),
         )
+        label_images_cell = label_images[..., 0:1]
+        label_images_nucleus = label_images[..., 1:2]
 
-        label_images_nucleus = deep_watershed(model_output["nuclear"], **nuclear_kwargs)
-
-        label_images = np.concatenate(
-            [label_images_cell, label_images_nucleus], axis=-1
+        # The memory tracker's steps would mix up if run concurrently.
+        concurrent_compartments = concurrent_compartments and not (
+            whole_cell_kwargs.get("memory_tracker")
+            or nuclear_kwargs.get("memory_tracker")
         )
 
+        if whole_cell_from_nuclei:
+            segment("nuclear", nuclear_kwargs, out=label_images_nucleus)
+
+            # Grow each nucleus into its cell, keeping its label.
+            segment(
+                "whole-cell",
+                {
+                    **whole_cell_kwargs,
+                    "markers": label_images_nucleus,
+                    "relabel": False,
+                },
+                out=label_images_cell,
+            )
+        elif concurrent_compartments:
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                futures = [
+                    executor.submit(
+                        segment, "whole-cell", whole_cell_kwargs, label_images_cell
+                    ),
+                    executor.submit(
+                        segment, "nuclear", nuclear_kwargs, label_images_nucleus
+                    ),
+                ]
+            for future in futures:
+                future.result()
+        else:
+            segment("whole-cell", whole_cell_kwargs, out=label_images_cell)
+            segment("nuclear", nuclear_kwargs, out=label_images_nucleus)
+
     else:
         raise ValueError(
             f"Invalid compartment supplied: {compartment}. "
@@ -452,6 +555,14 @@ def deep_watershed(
     fill_holes_threshold=0,
     pixel_expansion=None,
     maxima_algorithm="h_maxima",
+    memory_lean=False,
+    memory_tracker=None,
+    priority_levels=None,
+    maxima_quantize=None,
+    markers=None,
+    relabel=True,
+    num_workers=1,
+    overwrite_outputs=False,
     **kwargs,
 ):
     """Uses ``maximas`` and ``interiors`` to perform watershed segmentation.
@@ -478,9 +589,34 @@ def deep_watershed(
             objects to be filled.
         pixel_expansion (int): Number of pixels to expand ``interiors``.
         maxima_algorithm (str): Algorithm used to locate peaks in ``maximas``.
-            One of ``h_maxima`` (default) or ``peak_local_max``.
+            One of ``h_maxima`` (default), ``max_tree`` (the same maxima as
+            ``h_maxima``, from the maxima dynamics) or ``peak_local_max``.
             ``peak_local_max`` is much faster but seems to underperform when
             given regious of ambiguous maxima.
+        memory_lean (bool): Avoid full-size temporary arrays: smooth the
+            predictions as float32 (in place, with ``overwrite_outputs``)
+            & label with uint32.
+        memory_tracker (benchmark_utils.StepPeakMemory): Optional tracker
+            to record each step's peak memory in.
+        priority_levels (int): Quantize the interior to this many levels
+            (eg 256 or 65536) for a faster, approximate watershed.
+            Use ``None`` (default) for the exact watershed.
+        maxima_quantize (dtype): ``np.uint8`` or ``np.uint16`` to find the
+            ``h_maxima`` in that integer type rather than floating point,
+            using 4-8x less memory. Use ``None`` (default) for floating point.
+        markers (numpy.array): Optional labeled markers, shaped like the
+            returned label images (eg another compartment's labels), to
+            use instead of finding the ``maximas``' peaks. The markers are
+            part of the mask: each object contains its marker.
+        relabel (bool): Whether to relabel the objects from 1. If not, each
+            object keeps its marker's label.
+        num_workers (int): How many frames of the batch to segment at the
+            same time. The worker threads share the inputs (the watershed
+            kernels release the GIL) & write into one preallocated stack.
+            Frames are segmented one at a time when tracing memory.
+        overwrite_outputs (bool): With ``memory_lean``, smooth ``outputs``
+            in place (if they're writeable float32 arrays), rather than a
+            copy of each frame. Only for callers done with ``outputs``.
 
     Returns:
         numpy.array: Integer label mask for instance segmentation.
@@ -498,7 +634,7 @@ def deep_watershed(
             "`outputs` should be a list of at least two " "NumPy arryas of equal shape."
         )
 
-    valid_algos = {"h_maxima", "peak_local_max"}
+    valid_algos = {"h_maxima", "max_tree", "peak_local_max"}
     if maxima_algorithm not in valid_algos:
         raise ValueError(
             "Invalid value for maxima_algorithm: {}. "
@@ -557,100 +693,394 @@ def deep_watershed(
         logger.warning("`fill_holes` is not supported for 3D data.")
         fill_holes_threshold = 0
 
-    label_images = []
-    for maxima, interior in zip(maximas, interiors):
+    def step_done(name):
+        if memory_tracker:
+            memory_tracker.step_done(name)
+
+    if markers is not None and markers.shape[:-1] != interiors.shape[:-1]:
+        raise ValueError(
+            "The markers must have the same shape as the outputs. "
+            "Got {} and {}".format(markers.shape, interiors.shape)
+        )
+
+    def segment_frame(batch):
+        maxima = maximas[batch]
+        interior = interiors[batch]
+
         # squeeze out the channel dimension if passed
-        maxima = nd.gaussian_filter(maxima[..., 0], maxima_smooth)
-        interior = nd.gaussian_filter(interior[..., 0], interior_smooth)
+        if markers is not None:
+            # The maxima aren't needed.
+            maxima = None
+        elif memory_lean:
+            maxima = _smooth_in_place(
+                maxima[..., 0], maxima_smooth, copy=not overwrite_outputs
+            )
+        else:
+            maxima = nd.gaussian_filter(maxima[..., 0], maxima_smooth)
+        if memory_lean:
+            interior = _smooth_in_place(
+                interior[..., 0], interior_smooth, copy=not overwrite_outputs
+            )
+        else:
+            interior = nd.gaussian_filter(interior[..., 0], interior_smooth)
 
         if pixel_expansion:
             fn = cube if input_is_3d else square
             interior = dilation(interior, footprint=fn(pixel_expansion * 2 + 1))
 
-        # peak_local_max is much faster but has poorer performance
-        # when dealing with more ambiguous local maxima
-        if maxima_algorithm == "peak_local_max":
-            coords = peak_local_max(
+        step_done("smooth")
+
+        if markers is not None:
+            # A copy, as the watershed labels its markers in place.
+            batch_markers = np.array(
+                markers[batch, ..., 0],
+                dtype=_label_dtype(memory_lean),
+            )
+        else:
+            batch_markers = _find_markers(
                 maxima,
-                min_distance=radius,
-                threshold_abs=maxima_threshold,
+                maxima_algorithm,
+                radius,
+                maxima_threshold,
+                input_is_3d,
+                maxima_quantize=maxima_quantize,
                 exclude_border=kwargs.get("exclude_border", False),
+                memory_lean=memory_lean,
             )
 
-            markers = np.zeros_like(maxima)
-            slc = tuple(coords[:, i] for i in range(coords.shape[1]))
-            markers[slc] = 1
+        if memory_lean:
+            # Threshold, then negate in place.
+            mask = interior > interior_threshold
+            interior = np.negative(interior, out=interior)
         else:
-            # Find peaks and merge equal regions
-            fn = ball if input_is_3d else disk
-            markers = h_maxima(image=maxima, h=maxima_threshold, footprint=fn(radius))
-
-        markers = label(markers)
-        label_image = watershed(
-            -1 * interior,
-            markers,
-            mask=interior > interior_threshold,
+            mask = interior > interior_threshold
+            interior = -1 * interior
+        if markers is not None:
+            # Given markers (eg nuclei) are kept whole, even past the mask.
+            mask |= batch_markers > 0
+
+        step_done("maxima")
+
+        # Label the markers in place.
+        label_image = watershed_unpadded(
+            interior,
+            batch_markers,
+            mask=mask,
             watershed_line=0,
-            in_place=True,
+            output=batch_markers,
+            priority_levels=priority_levels,
+        )
+        # Free the full-size temporaries before the next steps.
+        batch_markers = mask = interior = maxima = None
+
+        label_image = _clean_up_labels(
+            label_image,
+            label_erosion,
+            small_objects_threshold,
+            fill_holes_threshold,
+            step_done,
+            relabel=relabel,
         )
 
-        if label_erosion:
-            label_image = erode_edges(label_image, label_erosion)
-
-        # Remove small objects
-        if small_objects_threshold:
-            label_image = remove_small_objects(
-                label_image, min_size=small_objects_threshold
-            )
+        return label_image
 
-        # fill in holes that lie completely within a segmentation label
-        if fill_holes_threshold > 0:
-            label_image = fill_holes(label_image, size=fill_holes_threshold)
+    num_frames = len(interiors)
+    if num_frames == 1:
+        # Add the batch & channel dimensions without copying.
+        return segment_frame(0)[np.newaxis, ..., np.newaxis]
 
-        # Relabel the label image
-        label_image, _, _ = relabel_sequential(label_image)
+    # Each frame goes straight into the stack, as soon as it's segmented.
+    label_images = np.empty(
+        interiors.shape[:-1] + (1,), dtype=_label_dtype(memory_lean)
+    )
 
-        label_images.append(label_image)
+    def segment_into_stack(batch):
+        label_images[batch, ..., 0] = segment_frame(batch)
 
-    label_images = np.stack(label_images, axis=0)
-    label_images = np.expand_dims(label_images, axis=-1)
+    # The memory tracker's steps would mix up across threads.
+    if memory_tracker or num_workers <= 1:
+        for batch in range(num_frames):
+            segment_into_stack(batch)
+    else:
+        with ThreadPoolExecutor(max_workers=min(num_workers, num_frames)) as executor:
+            # (Consuming the results raises the first frame's error, if any.)
+            list(executor.map(segment_into_stack, range(num_frames)))
 
     return label_images
 
 
-# Copied from deepcell-toolbox:
-# https://github.com/vanvalenlab/deepcell-toolbox/blob/e8c1277ee4243bc6a34916d554d0c2eab0cf7505/deepcell_toolbox/utils.py#L660
-# Then adapted
-def fill_holes(label_img, size=10, connectivity=1):
-    """Fills holes located completely within a given label with pixels of the same value
+def _label_dtype(memory_lean):
+    """The dtype of deep_watershed's labels."""
+    return np.uint32 if memory_lean else np.int64
 
-    Args:
-        label_img (numpy.array): a 2D labeled image
-        size (int): maximum size for a hole to be filled in
-        connectivity (int): the connectivity used to define the hole
 
-    Returns:
-        numpy.array: a labeled image with no holes smaller than ``size``
-            contained within any label.
+def _find_markers(
+    maxima,
+    maxima_algorithm,
+    radius,
+    maxima_threshold,
+    input_is_3d,
+    maxima_quantize=None,
+    exclude_border=False,
+    memory_lean=False,
+):
+    """Find the labeled watershed markers in a smoothed maxima image.
+
+    The labels are int64 (like skimage's label), or uint32 if memory_lean.
     """
-    output_image = np.copy(label_img)
-    labeled_image = label_img.astype("int")
+    # peak_local_max is much faster but has poorer performance
+    # when dealing with more ambiguous local maxima
+    if maxima_algorithm == "peak_local_max":
+        # The peaks are labeled directly, without a marker image to label.
+        return peak_local_max_markers(
+            maxima,
+            min_distance=radius,
+            threshold_abs=maxima_threshold,
+            exclude_border=exclude_border,
+            dtype=np.uint32 if memory_lean else np.int64,
+        )
+
+    fn = ball if input_is_3d else disk
+    if maxima_algorithm == "max_tree":
+        markers = h_maxima_from_dynamics(
+            maxima_dynamics(maxima, footprint=fn(radius)), maxima_threshold
+        )
+    else:
+        # Find peaks and merge equal regions
+        markers = h_maxima(
+            image=maxima,
+            h=maxima_threshold,
+            footprint=fn(radius),
+            quantize=maxima_quantize,
+        )
+
+    return _label_markers(markers) if memory_lean else label(markers)
 
-    objects = nd.find_objects(labeled_image)
-    for idx, slice in enumerate(objects):
-        if slice is None:
-            continue
 
-        label = idx + 1
+def _label_markers(markers):
+    """Same labels as skimage's label, but uint32 instead of int64."""
+    labeled_markers = np.zeros(markers.shape, dtype=np.uint32)
+    nd.label(
+        markers,
+        structure=np.ones((3,) * markers.ndim),
+        output=labeled_markers,
+    )
+    return labeled_markers
 
-        obj_image = labeled_image[slice] == label
-        eu_num = euler_number(obj_image, 2)  # 2 dimensions
 
-        if eu_num < 1:
-            patch = output_image[slice]
-            filled = remove_small_holes(
-                ar=(patch == label), area_threshold=size, connectivity=connectivity
+def _clean_up_labels(
+    label_image,
+    label_erosion,
+    small_objects_threshold,
+    fill_holes_threshold,
+    step_done,
+    relabel=True,
+):
+    """Erode, remove small objects, relabel & fill holes after the watershed."""
+    if label_erosion:
+        label_image = erode_edges(label_image, label_erosion)
+
+    step_done("watershed")
+
+    # Remove small objects & relabel the label image, in one pass.
+    label_image = remove_small_objects_and_relabel(
+        label_image,
+        min_size=small_objects_threshold,
+        in_place=label_image.flags.c_contiguous,
+        relabel=relabel,
+    )
+
+    step_done("relabel")
+
+    # fill in holes that lie completely within a segmentation label
+    if fill_holes_threshold > 0:
+        label_image, erased = fill_holes(
+            label_image, size=fill_holes_threshold, return_erased=True
+        )
+        # Filling keeps the labels in order, but a hole can contain
+        # (& erase) a whole other label: then relabel again.
+        if erased and relabel:
+            label_image = remove_small_objects_and_relabel(label_image, in_place=True)
+
+    step_done("fill_holes")
+
+    return label_image
+
+
+# The deep_watershed parameters a sweep can vary. The combinations run in
+# this order (the first varies slowest), so each stage's outputs are
+# reused by all the combinations of the parameters after it.
+SWEEP_PARAMETERS = [
+    "maxima_smooth",
+    "radius",
+    "maxima_threshold",
+    "interior_smooth",
+    "interior_threshold",
+]
+
+
+def deep_watershed_sweep(outputs, parameter_grid, memory_budget_gb=4, **kwargs):
+    """Run ``deep_watershed`` for each combination of a parameter grid.
+
+    The combinations share their work: each stage's outputs are cached,
+    keyed by the parameters that stage depends on.
+
+    - the smoothed maxima, by ``maxima_smooth``
+    - the smoothed interior, by ``interior_smooth``
+    - the maxima dynamics (for ``max_tree``), by ``maxima_smooth`` &
+      ``radius``: each ``maxima_threshold`` is then just a threshold.
+    - the labeled markers, by ``maxima_smooth``, ``radius`` &
+      ``maxima_threshold``: they're reused for each interior parameter.
+
+    Past the memory budget, the least recently used outputs are evicted.
+
+    Args:
+        outputs (list): the model outputs, as for ``deep_watershed``
+        parameter_grid (dict): the values to try for any of
+            ``SWEEP_PARAMETERS``. The others take the value from kwargs,
+            or deep_watershed's default.
+        memory_budget_gb (float): the most memory the cached stage outputs
+            can use, in GB.
+        kwargs: the other ``deep_watershed`` arguments, the same for every
+            combination (except ``memory_lean`` & ``memory_tracker``).
+
+    Yields:
+        tuple: for each combination, a dict of its parameter_grid values,
+            its label images (as from ``deep_watershed``, but uint32), &
+            the number of cells in each image.
+    """
+    logger = logging.getLogger(__name__)
+
+    unknown = set(parameter_grid) - set(SWEEP_PARAMETERS)
+    if unknown:
+        raise ValueError(
+            "Can't sweep {}. Must be among {}".format(sorted(unknown), SWEEP_PARAMETERS)
+        )
+    if kwargs.get("memory_lean") or kwargs.get("memory_tracker"):
+        raise ValueError("memory_lean & memory_tracker aren't supported in sweeps")
+
+    # The fixed arguments, with deep_watershed's defaults.
+    settings = {
+        name: parameter.default
+        for name, parameter in inspect.signature(deep_watershed).parameters.items()
+        if parameter.default is not inspect.Parameter.empty
+    }
+    settings.update(kwargs)
+
+    valid_algos = {"h_maxima", "max_tree", "peak_local_max"}
+    if settings["maxima_algorithm"] not in valid_algos:
+        raise ValueError(
+            "Invalid value for maxima_algorithm: {}. "
+            "Must be one of {}".format(settings["maxima_algorithm"], valid_algos)
+        )
+
+    maximas = outputs[settings["maxima_index"]]
+    interiors = outputs[settings["interior_index"]]
+    input_is_3d = maximas.ndim > 4
+
+    # fill_holes is not supported in 3D
+    if settings["fill_holes_threshold"] and input_is_3d:
+        logger.warning("`fill_holes` is not supported for 3D data.")
+        settings["fill_holes_threshold"] = 0
+
+    cache = LRUCache(int(memory_budget_gb * 1e9))
+
+    def negated_interior(batch, interior_smooth):
+        interior = nd.gaussian_filter(interiors[batch][..., 0], interior_smooth)
+        if settings["pixel_expansion"]:
+            fn = cube if input_is_3d else square
+            footprint = fn(settings["pixel_expansion"] * 2 + 1)
+            interior = dilation(interior, footprint=footprint)
+        return np.negative(interior, out=interior)
+
+    def maxima_image(batch, maxima_smooth):
+        return cache.get(
+            ("maxima", batch, maxima_smooth),
+            lambda: nd.gaussian_filter(maximas[batch][..., 0], maxima_smooth),
+        )
+
+    def labeled_markers(batch, params):
+        maxima = maxima_image(batch, params["maxima_smooth"])
+        if settings["maxima_algorithm"] == "max_tree":
+            fn = ball if input_is_3d else disk
+            dynamics = cache.get(
+                ("dynamics", batch, params["maxima_smooth"], params["radius"]),
+                lambda: maxima_dynamics(maxima, footprint=fn(params["radius"])),
+            )
+            return _label_markers(
+                h_maxima_from_dynamics(dynamics, params["maxima_threshold"])
+            )
+        return _find_markers(
+            maxima,
+            settings["maxima_algorithm"],
+            params["radius"],
+            params["maxima_threshold"],
+            input_is_3d,
+            maxima_quantize=settings["maxima_quantize"],
+            exclude_border=settings.get("exclude_border", False),
+            memory_lean=True,
+        )
+
+    grid = [parameter_grid.get(name, [settings[name]]) for name in SWEEP_PARAMETERS]
+    for values in itertools.product(*grid):
+        params = dict(zip(SWEEP_PARAMETERS, values))
+
+        label_images = []
+        for batch in range(len(maximas)):
+            markers = cache.get(
+                (
+                    "markers",
+                    batch,
+                    params["maxima_smooth"],
+                    params["radius"],
+                    params["maxima_threshold"],
+                ),
+                lambda: labeled_markers(batch, params),
+            )
+            interior = cache.get(
+                ("interior", batch, params["interior_smooth"]),
+                lambda: negated_interior(batch, params["interior_smooth"]),
+            )
+
+            # The cached markers stay as they are: label a copy.
+            label_image = watershed_unpadded(
+                interior,
+                markers,
+                mask=interior < -params["interior_threshold"],
+                watershed_line=0,
+                output=markers.copy(),
+                priority_levels=settings["priority_levels"],
+            )
+            label_images.append(
+                _clean_up_labels(
+                    label_image,
+                    settings["label_erosion"],
+                    settings["small_objects_threshold"],
+                    settings["fill_holes_threshold"],
+                    lambda name: None,
+                )
             )
-            output_image[slice] = np.where(filled, label, patch)
 
-    return output_image
+        label_images = np.stack(label_images, axis=0)[..., np.newaxis]
+        cell_counts = [int(image.max(initial=0)) for image in label_images]
+        yield {name: params[name] for name in parameter_grid}, label_images, cell_counts
+
+    logger.info(
+        "Sweep cache: %s hits, %s misses, %s GB",
+        cache.hits,
+        cache.misses,
+        round(cache.nbytes / 1e9, 3),
+    )
+
+
+def _smooth_in_place(prediction, sigma, copy=False):
+    """Gaussian-smooth a prediction as float32, reusing its memory if possible.
+
+    With copy, or if it isn't a writeable float32 array, a copy is smoothed.
+    """
+    if copy or prediction.dtype != np.float32 or not prediction.flags.writeable:
+        prediction = prediction.astype(np.float32)
+    # (A sigma of 0 leaves the prediction as is.)
+    if sigma:
+        nd.gaussian_filter(prediction, sigma, output=prediction)
+    return prediction
@@ -0,0 +1,274 @@
+"""
+A chunked array store for pipeline intermediates.
+
+Each array is split into fixed-size chunks, and each chunk is compressed
+and stored as its own file. Readers can then fetch just the chunks
+overlapping the region they need, instead of downloading & decompressing
+the entire intermediate.
+
+The on-disk layout follows the Zarr v2 directory format, so the stores
+can also be opened with the `zarr` library (eg for inspection in a
+notebook). We don't depend on `zarr` itself: we only need a small subset.
+
+    store.zarr/
+      .zgroup
+      .zattrs           {"arrays": ["arr_0", "arr_1", ...]}
+      arr_0/
+        .zarray         shape, dtype, chunk shape, compressor
+        0.0.0.0         one compressed file per chunk
+        0.0.1.0
+        ...
+
+Stores can live on a local path or any URI supported by smart_open.
+"""
+
+import itertools
+import json
+import math
+import os
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import smart_open
+
+DEFAULT_CHUNK_SIZE = 512
+DEFAULT_COMPRESSION_LEVEL = 1
+
+# Chunk I/O is dominated by network latency, so use plenty of threads.
+DEFAULT_MAX_WORKERS = 32
+
+
+def is_chunked_store_uri(uri: str) -> bool:
+    return uri.rstrip("/").endswith(".zarr")
+
+
+def _join(uri, *parts):
+    return "/".join([uri.rstrip("/"), *parts])
+
+
+def _makedirs(uri):
+    # Object stores don't have directories, but local filesystems do.
+    if "://" not in uri:
+        os.makedirs(uri, exist_ok=True)
+
+
+def _write_json(uri, data):
+    with smart_open.open(uri, "w") as f:
+        json.dump(data, f)
+
+
+def _read_json(uri):
+    with smart_open.open(uri, "r") as f:
+        return json.load(f)
+
+
+def _chunk_key(chunk_index):
+    return ".".join(str(i) for i in chunk_index)
+
+
+def _default_chunks(shape, chunk_size):
+    return tuple(max(1, min(dim, chunk_size)) for dim in shape)
+
+
+def _chunk_grid(shape, chunks):
+    return tuple(math.ceil(dim / chunk) for dim, chunk in zip(shape, chunks))
+
+
+def _chunk_slices(chunk_index, shape, chunks):
+    return tuple(
+        slice(i * chunk, min((i + 1) * chunk, dim))
+        for i, chunk, dim in zip(chunk_index, chunks, shape)
+    )
+
+
+def write_arrays(
+    uri,
+    arrays: dict,
+    chunk_size=DEFAULT_CHUNK_SIZE,
+    compression_level=DEFAULT_COMPRESSION_LEVEL,
+    max_workers=DEFAULT_MAX_WORKERS,
+):
+    """Write named arrays to a chunked store at the given URI.
+
+    Every dimension is split into chunks of at most chunk_size elements.
+    Chunks are compressed independently (zlib), in a thread pool.
+
+    Args:
+        uri (str): the store location, conventionally ending in .zarr
+        arrays (dict): array name -> numpy array
+        chunk_size (int): maximum chunk length along each dimension
+        compression_level (int): zlib compression level, 0-9
+        max_workers (int): number of threads compressing & writing chunks
+    """
+    _makedirs(uri)
+    _write_json(_join(uri, ".zgroup"), {"zarr_format": 2})
+    _write_json(_join(uri, ".zattrs"), {"arrays": list(arrays.keys())})
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for name, array in arrays.items():
+            array = np.ascontiguousarray(array)
+            chunks = _default_chunks(array.shape, chunk_size)
+            array_uri = _join(uri, name)
+            _makedirs(array_uri)
+            _write_json(
+                _join(array_uri, ".zarray"),
+                {
+                    "zarr_format": 2,
+                    "shape": list(array.shape),
+                    "chunks": list(chunks),
+                    "dtype": array.dtype.str,
+                    "compressor": {"id": "zlib", "level": compression_level},
+                    "fill_value": 0,
+                    "filters": None,
+                    "order": "C",
+                    "dimension_separator": ".",
+                },
+            )
+
+            def write_chunk(chunk_index):
+                block = array[_chunk_slices(chunk_index, array.shape, chunks)]
+                # Zarr v2 stores edge chunks padded out to the full chunk shape.
+                if block.shape != chunks:
+                    padded = np.zeros(chunks, dtype=array.dtype)
+                    padded[tuple(slice(0, d) for d in block.shape)] = block
+                    block = padded
+                data = zlib.compress(
+                    np.ascontiguousarray(block).tobytes(), compression_level
+                )
+                chunk_uri = _join(array_uri, _chunk_key(chunk_index))
+                with smart_open.open(chunk_uri, "wb") as f:
+                    f.write(data)
+
+            grid = _chunk_grid(array.shape, chunks)
+            # list() to surface any exception raised in a worker.
+            list(
+                executor.map(write_chunk, itertools.product(*[range(n) for n in grid]))
+            )
+
+
+class ChunkedArray:
+    """A lazily-loaded array in a chunked store.
+
+    Indexing with slices only fetches & decompresses the overlapping
+    chunks. Use iter_chunks() to stream the whole array chunk by chunk.
+
+    Note: unlike zarr, we require every chunk to be present (write_arrays
+    always writes them all), rather than treating missing chunks as fill.
+    """
+
+    def __init__(self, uri, name, max_workers=DEFAULT_MAX_WORKERS):
+        self.uri = _join(uri, name)
+        self.name = name
+        self.max_workers = max_workers
+
+        metadata = _read_json(_join(self.uri, ".zarray"))
+        compressor = metadata.get("compressor") or {}
+        if compressor.get("id") not in {None, "zlib"}:
+            raise ValueError("Unsupported compressor: %s" % compressor["id"])
+        if metadata.get("filters"):
+            raise ValueError("Chunk filters are not supported")
+
+        self.shape = tuple(metadata["shape"])
+        self.chunks = tuple(metadata["chunks"])
+        self.dtype = np.dtype(metadata["dtype"])
+        self.compressed = bool(compressor)
+        self.grid = _chunk_grid(self.shape, self.chunks)
+        self.ndim = len(self.shape)
+
+    def read_chunk(self, chunk_index):
+        """Read one chunk, cropped to the array bounds."""
+        chunk_uri = _join(self.uri, _chunk_key(chunk_index))
+        with smart_open.open(chunk_uri, "rb") as f:
+            data = f.read()
+        if self.compressed:
+            data = zlib.decompress(data)
+        block = np.frombuffer(data, dtype=self.dtype).reshape(self.chunks)
+
+        slices = _chunk_slices(chunk_index, self.shape, self.chunks)
+        return block[tuple(slice(0, s.stop - s.start) for s in slices)]
+
+    def iter_chunks(self):
+        """Yield (slices, block) for every chunk, in C order.
+
+        Chunks are prefetched in a thread pool, but only a bounded number
+        are held in memory at once.
+        """
+        indices = itertools.product(*[range(n) for n in self.grid])
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            pending = []
+            for chunk_index in indices:
+                pending.append(
+                    (chunk_index, executor.submit(self.read_chunk, chunk_index))
+                )
+                if len(pending) >= self.max_workers:
+                    chunk_index, future = pending.pop(0)
+                    yield _chunk_slices(
+                        chunk_index, self.shape, self.chunks
+                    ), future.result()
+            for chunk_index, future in pending:
+                yield _chunk_slices(
+                    chunk_index, self.shape, self.chunks
+                ), future.result()
+
+    def _normalize_key(self, key):
+        if not isinstance(key, tuple):
+            key = (key,)
+        if Ellipsis in key:
+            i = key.index(Ellipsis)
+            key = key[:i] + (slice(None),) * (self.ndim - len(key) + 1) + key[i + 1 :]
+        key = key + (slice(None),) * (self.ndim - len(key))
+
+        normalized = []
+        for k, dim in zip(key, self.shape):
+            if not isinstance(k, slice):
+                raise TypeError("Chunked arrays only support slice indexing")
+            start, stop, step = k.indices(dim)
+            if step != 1:
+                raise ValueError("Chunked arrays don't support strided slices")
+            normalized.append(slice(start, max(start, stop)))
+        return tuple(normalized)
+
+    def __getitem__(self, key):
+        region = self._normalize_key(key)
+        out = np.empty(tuple(s.stop - s.start for s in region), dtype=self.dtype)
+
+        chunk_ranges = [
+            range(s.start // c, math.ceil(s.stop / c)) if s.stop > s.start else []
+            for s, c in zip(region, self.chunks)
+        ]
+
+        def copy_chunk(chunk_index):
+            block = self.read_chunk(chunk_index)
+            chunk_region = _chunk_slices(chunk_index, self.shape, self.chunks)
+            src, dst = [], []
+            for r, c in zip(region, chunk_region):
+                lo, hi = max(r.start, c.start), min(r.stop, c.stop)
+                src.append(slice(lo - c.start, hi - c.start))
+                dst.append(slice(lo - r.start, hi - r.start))
+            out[tuple(dst)] = block[tuple(src)]
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            list(executor.map(copy_chunk, itertools.product(*chunk_ranges)))
+
+        return out
+
+    def __array__(self, dtype=None):
+        array = self[...]
+        return array if dtype is None else array.astype(dtype)
+
+
+def list_arrays(uri):
+    return _read_json(_join(uri, ".zattrs"))["arrays"]
+
+
+def open_array(uri, name, max_workers=DEFAULT_MAX_WORKERS) -> ChunkedArray:
+    return ChunkedArray(uri, name, max_workers=max_workers)
+
+
+def read_arrays(uri, names=None, max_workers=DEFAULT_MAX_WORKERS) -> dict:
+    """Read named arrays (default: all arrays) fully into memory."""
+    if names is None:
+        names = list_arrays(uri)
+    return {name: open_array(uri, name, max_workers)[...] for name in names}
@@ -0,0 +1,135 @@
+"""
+Multithreaded file compression for pipeline intermediates.
+
+Each codec is identified by its file extension, so that an intermediate's
+URI says how to decompress it:
+
+- gzip (`.gz`): pigz if available (multithreaded), otherwise gzip.
+- zstd (`.zst`): the `zstandard` package, with multithreaded compression.
+- lz4 (`.lz4`): the `lz4` package. lz4 is single-threaded, but fast
+  enough that it's usually limited by disk or network anyway.
+
+zstandard & lz4 are in requirements.txt, but they're only imported when a
+file using them is compressed or decompressed, so other codecs work
+without them.
+"""
+
+import os
+import shutil
+import subprocess
+from typing import Optional
+
+CODEC_EXTENSIONS = {
+    "gzip": ".gz",
+    "zstd": ".zst",
+    "lz4": ".lz4",
+}
+
+# gzip's default matches pigz/gzip. zstd's is the library default. lz4's
+# "0" is its fast (non-HC) mode.
+DEFAULT_COMPRESSION_LEVELS = {
+    "gzip": 6,
+    "zstd": 3,
+    "lz4": 0,
+}
+
+# Stream in 16 MiB blocks, so large intermediates aren't held in memory.
+_BLOCK_SIZE = 16 * 1024 * 1024
+
+
+def get_available_cpus() -> int:
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count()
+
+
+def get_codec(path: str) -> Optional[str]:
+    """The codec for a compressed file path, or None if not compressed."""
+    for codec, extension in CODEC_EXTENSIONS.items():
+        if path.endswith(extension):
+            return codec
+    return None
+
+
+def _run(command, src_path, dest_path):
+    with open(dest_path, "wb") as dest:
+        result = subprocess.run(
+            command + [src_path], stdout=dest, stderr=subprocess.PIPE
+        )
+    if result.returncode != 0:
+        raise RuntimeError(
+            "Command %s failed for %s: %s" % (command[0], src_path, result.stderr)
+        )
+
+
+def compress_file(
+    src_path: str,
+    dest_path: str,
+    codec: str,
+    level: Optional[int] = None,
+    threads: Optional[int] = None,
+) -> None:
+    """Compress a local file with the given codec.
+
+    Args:
+        src_path (str): the file to compress
+        dest_path (str): where to write the compressed file
+        codec (str): one of CODEC_EXTENSIONS
+        level (int): codec compression level. Default/None: codec default
+        threads (int): compression threads. Default/None: all available CPUs
+    """
+    if codec not in CODEC_EXTENSIONS:
+        raise ValueError(
+            f"Invalid codec: {codec}. Must be one of {list(CODEC_EXTENSIONS)}"
+        )
+    if level is None:
+        level = DEFAULT_COMPRESSION_LEVELS[codec]
+    if threads is None:
+        threads = get_available_cpus()
+
+    if codec == "gzip":
+        if shutil.which("pigz"):
+            _run(["pigz", "-c", f"-{level}", "-p", str(threads)], src_path, dest_path)
+        else:
+            _run(["gzip", "-c", f"-{level}"], src_path, dest_path)
+
+    elif codec == "zstd":
+        import zstandard
+
+        compressor = zstandard.ZstdCompressor(level=level, threads=threads)
+        with open(src_path, "rb") as src, open(dest_path, "wb") as dest:
+            compressor.copy_stream(src, dest, read_size=_BLOCK_SIZE)
+
+    elif codec == "lz4":
+        import lz4.frame
+
+        with open(src_path, "rb") as src, lz4.frame.open(
+            dest_path, "wb", compression_level=level
+        ) as dest:
+            shutil.copyfileobj(src, dest, _BLOCK_SIZE)
+
+
+def decompress_file(src_path: str, dest_path: str, codec: str) -> None:
+    """Decompress a local file compressed with the given codec."""
+    if codec == "gzip":
+        tool = "unpigz" if shutil.which("unpigz") else "gunzip"
+        _run([tool, "-c"], src_path, dest_path)
+
+    elif codec == "zstd":
+        import zstandard
+
+        decompressor = zstandard.ZstdDecompressor()
+        with open(src_path, "rb") as src, open(dest_path, "wb") as dest:
+            decompressor.copy_stream(src, dest, read_size=_BLOCK_SIZE)
+
+    elif codec == "lz4":
+        import lz4.frame
+
+        with lz4.frame.open(src_path, "rb") as src, open(dest_path, "wb") as dest:
+            shutil.copyfileobj(src, dest, _BLOCK_SIZE)
+
+    else:
+        raise ValueError(
+            f"Invalid codec: {codec}. Must be one of {list(CODEC_EXTENSIONS)}"
+        )
@@ -0,0 +1,240 @@
+"""
+Reading & writing the intermediate arrays passed between pipeline phases.
+
+The format is chosen by the URI's extension:
+
+- `.npz`: an uncompressed numpy npz archive. Readers only fetch the
+  requested arrays, using ranged reads.
+- `.npz.gz`, `.npz.zst`, `.npz.lz4`: a compressed numpy npz archive (see
+  compression.py). The whole file is downloaded & decompressed before
+  reading.
+- `.zarr`: a chunked store (see chunked_store.py). Only the requested
+  arrays are fetched, chunk by chunk.
+
+When the phases run on the same machine, they can also share a local
+scratch directory (eg the job's attached workspace disk). Writers then
+save each array uncompressed as a .npy file in the scratch directory, and
+upload the copy at the URI in the background, for durability. Readers
+memory-map the scratch copy if it exists, so large arrays are paged in on
+demand instead of being downloaded, decompressed & copied into memory.
+
+Label masks can also be run-length encoded (see rle.py), by adding .rle
+before the format extension, eg predictions.rle.npz.gz. Use read_labels &
+write_labels for masks, to handle either encoding.
+
+Readers & writers can fill in a stats dict, to benchmark the formats:
+compress_time_s & size_mb when writing, decompress_time_s when reading.
+"""
+
+import logging
+import os
+import shutil
+import tempfile
+import timeit
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Optional
+
+import gs_fastcopy
+import numpy as np
+
+from deepcell_imaging.utils import chunked_store, rle
+from deepcell_imaging.utils.compression import (
+    CODEC_EXTENSIONS,
+    compress_file,
+    decompress_file,
+    get_codec,
+)
+from deepcell_imaging.utils.numpy import npz_read_arrays
+
+# The extensions that build_segment_job_tasks knows how to use.
+INTERMEDIATE_FORMATS = ["npz.gz", "npz.zst", "npz.lz4", "npz", "zarr"]
+DEFAULT_INTERMEDIATE_FORMAT = "npz.gz"
+
+logger = logging.getLogger(__name__)
+
+
+def get_intermediate_format(uri: str) -> str:
+    """The intermediate format of a URI, eg npz.gz for .../preprocessed.npz.gz"""
+    return uri.rstrip("/").split("/")[-1].partition(".")[2]
+
+
+def is_rle_uri(uri: str) -> bool:
+    return ".rle." in uri.rstrip("/").split("/")[-1]
+
+
+def get_scratch_path(uri: str, local_scratch_dir: str) -> str:
+    """The scratch directory holding the local copy of an intermediate URI."""
+    return os.path.join(local_scratch_dir, uri.split("://")[-1].lstrip("/"))
+
+
+def _read_scratch_arrays(scratch_path: str, names: list[str]) -> Optional[dict]:
+    array_paths = {name: os.path.join(scratch_path, f"{name}.npy") for name in names}
+    if not all(os.path.exists(path) for path in array_paths.values()):
+        return None
+
+    return {name: np.load(path, mmap_mode="r") for name, path in array_paths.items()}
+
+
+def _write_scratch_arrays(scratch_path: str, arrays: dict) -> None:
+    # Write to a temporary directory then rename, so that readers never
+    # see a partially written copy (eg if the VM is preempted mid-write).
+    tmp_path = scratch_path + ".tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+
+    for name, array in arrays.items():
+        np.save(os.path.join(tmp_path, f"{name}.npy"), array)
+
+    shutil.rmtree(scratch_path, ignore_errors=True)
+    os.replace(tmp_path, scratch_path)
+
+
+def read_arrays(
+    uri: str,
+    names: list[str],
+    local_scratch_dir: str = "",
+    stats: Optional[dict] = None,
+) -> dict:
+    """Read the named arrays from an intermediate file or store.
+
+    If local_scratch_dir is set and has a copy of the intermediate, the
+    arrays are returned memory-mapped (read-only) from the local copy.
+    """
+    if stats is None:
+        stats = {}
+
+    if local_scratch_dir:
+        scratch_path = get_scratch_path(uri, local_scratch_dir)
+        arrays = _read_scratch_arrays(scratch_path, names)
+        if arrays is not None:
+            logger.info("Memory-mapped local copy of %s", uri)
+            return arrays
+        logger.info("No local copy of %s, reading from the URI", uri)
+
+    if chunked_store.is_chunked_store_uri(uri):
+        return chunked_store.read_arrays(uri, names)
+
+    if uri.endswith(".npz"):
+        return npz_read_arrays(uri, names)
+
+    codec = get_codec(uri)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        if "://" in uri:
+            local_path = os.path.join(tmp_dir, "download.npz")
+            if codec:
+                local_path += CODEC_EXTENSIONS[codec]
+            gs_fastcopy.copy(uri, local_path)
+        else:
+            local_path = uri
+
+        if codec:
+            npz_path = os.path.join(tmp_dir, "arrays.npz")
+            t = timeit.default_timer()
+            decompress_file(local_path, npz_path, codec)
+            stats["decompress_time_s"] = timeit.default_timer() - t
+        else:
+            npz_path = local_path
+
+        with np.load(npz_path) as loader:
+            return {name: loader[name] for name in names}
+
+
+def write_arrays(
+    uri: str,
+    arrays: dict,
+    local_scratch_dir: str = "",
+    compression_level: Optional[int] = None,
+    stats: Optional[dict] = None,
+) -> Optional[Future]:
+    """Write the named arrays to an intermediate file or store.
+
+    If local_scratch_dir is set, the arrays are first saved uncompressed to
+    the scratch directory, then the copy at the URI is written in a
+    background thread. In that case this returns the upload's Future: call
+    result() before exiting (and before using stats), to wait for the
+    upload & raise any error. Otherwise this returns None when the write
+    is complete.
+
+    compression_level applies to the compressed npz formats.
+    Default/None: the codec's default level.
+    """
+    if stats is None:
+        stats = {}
+
+    if not local_scratch_dir:
+        _write_uri_arrays(uri, arrays, compression_level, stats)
+        return None
+
+    scratch_path = get_scratch_path(uri, local_scratch_dir)
+    _write_scratch_arrays(scratch_path, arrays)
+
+    # Upload from the memory-mapped copy, so the caller can free its arrays.
+    scratch_arrays = _read_scratch_arrays(scratch_path, list(arrays.keys()))
+
+    def upload():
+        t = timeit.default_timer()
+        _write_uri_arrays(uri, scratch_arrays, compression_level, stats)
+        logger.info("Uploaded %s in %s s", uri, round(timeit.default_timer() - t, 2))
+
+    executor = ThreadPoolExecutor(max_workers=1)
+    future = executor.submit(upload)
+    # Don't block here: the thread finishes the upload on its own.
+    executor.shutdown(wait=False)
+    return future
+
+
+def _write_uri_arrays(
+    uri: str, arrays: dict, compression_level: Optional[int], stats: dict
+) -> None:
+    if chunked_store.is_chunked_store_uri(uri):
+        chunked_store.write_arrays(uri, arrays)
+        return
+
+    codec = get_codec(uri)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        upload_path = os.path.join(tmp_dir, "arrays.npz")
+        np.savez(upload_path, **arrays)
+
+        if codec:
+            npz_path = upload_path
+            upload_path += CODEC_EXTENSIONS[codec]
+            t = timeit.default_timer()
+            compress_file(npz_path, upload_path, codec, compression_level)
+            stats["compress_time_s"] = timeit.default_timer() - t
+            # Free up the disk space before uploading.
+            os.remove(npz_path)
+
+        stats["size_mb"] = round(os.path.getsize(upload_path) / 1e6, 2)
+
+        # The local file is already compressed like the URI, so this
+        # uploads it as-is.
+        gs_fastcopy.copy(upload_path, uri)
+
+
+def read_labels(uri: str, name: str = "image", **kwargs) -> np.ndarray:
+    """Read a label mask, decoding it if the URI is run-length encoded.
+
+    Keyword arguments are passed on to read_arrays.
+    """
+    if not is_rle_uri(uri):
+        return read_arrays(uri, [name], **kwargs)[name]
+
+    keys = {key: f"{name}_{key}" for key in ["values", "lengths", "shape"]}
+    arrays = read_arrays(uri, list(keys.values()), **kwargs)
+    return rle.decode(**{key: arrays[array_name] for key, array_name in keys.items()})
+
+
+def write_labels(
+    uri: str, labels: np.ndarray, name: str = "image", **kwargs
+) -> Optional[Future]:
+    """Write a label mask, encoding it if the URI is run-length encoded.
+
+    Keyword arguments are passed on to write_arrays.
+    """
+    if not is_rle_uri(uri):
+        return write_arrays(uri, {name: labels}, **kwargs)
+
+    encoded = rle.encode(labels)
+    return write_arrays(
+        uri, {f"{name}_{key}": array for key, array in encoded.items()}, **kwargs
+    )
@@ -0,0 +1,54 @@
+from collections import OrderedDict
+
+import numpy as np
+
+
+def value_nbytes(value):
+    """The bytes held by a cached value: its arrays, or 0 for anything else."""
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (tuple, list)):
+        return sum(value_nbytes(item) for item in value)
+    return 0
+
+
+class LRUCache:
+    """A cache of computed values, within a memory budget.
+
+    Values are kept until they don't fit in the budget anymore: then the
+    least recently used are evicted first. A value larger than the whole
+    budget is returned but not kept.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._values = OrderedDict()
+
+    def __len__(self):
+        return len(self._values)
+
+    def __contains__(self, key):
+        return key in self._values
+
+    def get(self, key, compute):
+        """Return the value for key, calling compute() to make it if needed."""
+        if key in self._values:
+            self.hits += 1
+            self._values.move_to_end(key)
+            return self._values[key]
+
+        self.misses += 1
+        value = compute()
+        size = value_nbytes(value)
+        if size > self.max_bytes:
+            return value
+
+        while self.nbytes + size > self.max_bytes:
+            _, evicted = self._values.popitem(last=False)
+            self.nbytes -= value_nbytes(evicted)
+        self._values[key] = value
+        self.nbytes += size
+        return value
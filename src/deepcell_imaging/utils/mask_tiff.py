@@ -0,0 +1,81 @@
+"""
+Writing segmentation masks as tiled, pyramidal OME-TIFFs.
+
+Viewers like QuPath only need to read the tiles (and pyramid level) in
+view, rather than the whole mask. Each tile is cast to int32 as it's
+written, so the full-size mask is never copied, and tiles are compressed
+in a thread pool.
+
+Pyramid levels are downsampled by taking every other pixel (nearest
+neighbor), which keeps them valid label images.
+"""
+
+import numpy as np
+import tifffile
+
+from deepcell_imaging.utils.compression import get_available_cpus
+
+DEFAULT_TILE_SIZE = 512
+
+# Deflate is lossless & supported by every TIFF reader, including QuPath.
+DEFAULT_COMPRESSION = "zlib"
+
+
+def _iter_tiles(labels, tile_size):
+    for y in range(0, labels.shape[0], tile_size):
+        for x in range(0, labels.shape[1], tile_size):
+            # tifffile pads the edge tiles.
+            yield np.ascontiguousarray(
+                labels[y : y + tile_size, x : x + tile_size], dtype=np.int32
+            )
+
+
+def get_pyramid_levels(labels: np.ndarray, tile_size: int = DEFAULT_TILE_SIZE):
+    """The mask at full resolution, then halved until it fits in a tile.
+
+    Each level is a strided view of the mask, not a copy.
+    """
+    levels = [labels]
+    while max(levels[-1].shape) > tile_size:
+        levels.append(levels[-1][::2, ::2])
+    return levels
+
+
+def write_mask_tiff(
+    f,
+    labels: np.ndarray,
+    tile_size: int = DEFAULT_TILE_SIZE,
+    compression: str = DEFAULT_COMPRESSION,
+    maxworkers: int = None,
+) -> None:
+    """Write a 2D label mask as a tiled, compressed, pyramidal OME-TIFF.
+
+    Args:
+        f: a file path or binary file handle to write to
+        labels (np.ndarray): the (height, width) label mask. Labels must fit
+            in an int32.
+        tile_size (int): tile height & width, a multiple of 16
+        compression (str): tifffile compression for each tile
+        maxworkers (int): threads compressing tiles. Default: available CPUs
+    """
+    if labels.ndim != 2:
+        raise ValueError("Expected a 2D label mask, got shape %s" % (labels.shape,))
+    if maxworkers is None:
+        maxworkers = get_available_cpus()
+
+    levels = get_pyramid_levels(labels, tile_size)
+
+    with tifffile.TiffWriter(f, bigtiff=True, ome=True) as tif:
+        for index, level in enumerate(levels):
+            tif.write(
+                _iter_tiles(level, tile_size),
+                shape=level.shape,
+                dtype=np.int32,
+                tile=(tile_size, tile_size),
+                compression=compression,
+                maxworkers=maxworkers,
+                # The reduced-resolution levels are sub-IFDs of the first.
+                subifds=len(levels) - 1 if index == 0 else None,
+                subfiletype=1 if index > 0 else 0,
+                metadata={"axes": "YX"} if index == 0 else None,
+            )
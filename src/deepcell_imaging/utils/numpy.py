@@ -1,3 +1,5 @@
+import struct
+
 import numpy as np
 import smart_open
 import zipfile
@@ -18,3 +20,61 @@ def npz_headers(npz):
             version = np.lib.format.read_magic(npy)
             shape, fortran, dtype = np.lib.format._read_array_header(npy, version)
             yield name[:-4], shape, dtype
+
+
+def _read_stored_member(f, info):
+    """Read an uncompressed (stored) .npy member straight from the file.
+
+    Returns None if the member can't be read this way (eg object arrays).
+    """
+    # The member's local header can have a different extra field than its
+    # central directory entry, so we have to read it to find the data.
+    f.seek(info.header_offset)
+    header = struct.unpack(zipfile.structFileHeader, f.read(zipfile.sizeFileHeader))
+    filename_length = header[zipfile._FH_FILENAME_LENGTH]
+    extra_length = header[zipfile._FH_EXTRA_FIELD_LENGTH]
+    f.seek(info.header_offset + zipfile.sizeFileHeader + filename_length + extra_length)
+
+    version = np.lib.format.read_magic(f)
+    shape, fortran_order, dtype = np.lib.format._read_array_header(f, version)
+    if dtype.hasobject:
+        return None
+
+    array = np.empty(int(np.prod(shape)), dtype=dtype)
+    buffer = memoryview(array).cast("B")
+    offset = 0
+    while offset < array.nbytes:
+        count = f.readinto(buffer[offset:])
+        if not count:
+            raise EOFError("Truncated npz member: %s" % info.filename)
+        offset += count
+
+    return array.reshape(shape, order="F" if fortran_order else "C")
+
+
+def npz_read_arrays(npz, names):
+    """Read only the named arrays from an .npz file.
+
+    Only the zip central directory and the requested members are read: for
+    remote files, smart_open turns the seeks into ranged reads. Members
+    written with np.savez (stored, not compressed) are read with a single
+    read per array; compressed members are streamed through zipfile.
+
+    Returns a dict of array name -> numpy array.
+    """
+    arrays = {}
+    with smart_open.open(npz, mode="rb") as f:
+        with zipfile.ZipFile(f) as archive:
+            for name in names:
+                info = archive.getinfo(f"{name}.npy")
+
+                array = None
+                if info.compress_type == zipfile.ZIP_STORED:
+                    array = _read_stored_member(f, info)
+                if array is None:
+                    with archive.open(info) as npy:
+                        array = np.lib.format.read_array(npy)
+
+                arrays[name] = array
+
+    return arrays
@@ -0,0 +1,82 @@
+"""
+Writing a phase's outputs concurrently.
+
+Encoding & uploading outputs is mostly waiting on compression libraries,
+subprocesses & the network, all of which release the GIL. So a few
+threads can write several outputs at once, and a phase can start writing
+an output as soon as it's ready, while it computes the next one.
+"""
+
+import logging
+import timeit
+from concurrent.futures import ThreadPoolExecutor, wait
+
+logger = logging.getLogger(__name__)
+
+
+class OutputStage:
+    """Runs output writes in a thread pool, timing each one.
+
+    Usage:
+
+        with OutputStage() as outputs:
+            outputs.submit("npz", write_npz, uri, array)
+            outputs.submit("tiff", write_tiff, other_uri, array)
+
+    Exiting the with block waits for every write, then raises the first
+    error (if any). Then write_times_s has each output's wall time.
+    """
+
+    def __init__(self, max_workers=4):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._futures = {}
+        self._intervals = {}
+
+    def submit(self, name, fn, *args, **kwargs):
+        """Start writing an output in the background."""
+        if name in self._futures:
+            raise ValueError("Output already submitted: %s" % name)
+
+        def run():
+            start = timeit.default_timer()
+            fn(*args, **kwargs)
+            end = timeit.default_timer()
+            self._intervals[name] = (start, end)
+            logger.info("Saved %s output in %s s", name, round(end - start, 2))
+
+        self._futures[name] = self._executor.submit(run)
+
+    def wait(self):
+        """Wait for every output, then raise the first error (if any)."""
+        wait(self._futures.values())
+        self._executor.shutdown()
+        for future in self._futures.values():
+            future.result()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.wait()
+        else:
+            # Let the in-flight writes finish, but report the original error.
+            self._executor.shutdown()
+
+    @property
+    def write_times_s(self) -> dict:
+        """Each completed output's wall time, by name."""
+        return {name: end - start for name, (start, end) in self._intervals.items()}
+
+    @property
+    def overlap_time_s(self) -> float:
+        """How much time writing outputs concurrently saved.
+
+        That's the total of the outputs' wall times, minus the wall time from
+        the first output starting to the last one finishing.
+        """
+        if not self._intervals:
+            return 0.0
+        first_start = min(start for start, _ in self._intervals.values())
+        last_end = max(end for _, end in self._intervals.values())
+        return max(0.0, sum(self.write_times_s.values()) - (last_end - first_start))
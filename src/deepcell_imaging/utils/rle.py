@@ -0,0 +1,56 @@
+"""
+Run-length encoding for label masks.
+
+Segmentation masks are mostly long runs of the same label (including the
+background), so storing (value, length) per run is much smaller than the
+dense array, and decoding is a single np.repeat.
+
+Masks are channel-last (height, width, channel): each channel is encoded
+separately, one row after another, so runs don't interleave channels.
+"""
+
+import numpy as np
+
+
+def encode(labels: np.ndarray) -> dict:
+    """Run-length encode a label array.
+
+    Returns a dict of arrays: values & lengths of the runs, and the shape
+    of the labels. Use decode(**encoded) to get the labels back.
+    """
+    labels = np.asarray(labels)
+    shape = np.array(labels.shape, dtype=np.int64)
+
+    # Put the channels first, so each channel's runs are contiguous.
+    if labels.ndim > 2:
+        labels = np.moveaxis(labels, -1, 0)
+    flat = labels.ravel()
+
+    if flat.size == 0:
+        return {
+            "values": np.empty(0, dtype=labels.dtype),
+            "lengths": np.empty(0, dtype=np.int64),
+            "shape": shape,
+        }
+
+    starts = np.flatnonzero(flat[1:] != flat[:-1]) + 1
+    starts = np.concatenate([[0], starts])
+    lengths = np.diff(np.append(starts, flat.size))
+
+    return {
+        "values": flat[starts],
+        "lengths": lengths.astype(np.min_scalar_type(flat.size)),
+        "shape": shape,
+    }
+
+
+def decode(values: np.ndarray, lengths: np.ndarray, shape) -> np.ndarray:
+    """Decode a run-length encoded label array (see encode)."""
+    shape = tuple(int(dim) for dim in shape)
+    flat = np.repeat(np.asarray(values), np.asarray(lengths, dtype=np.intp))
+
+    if len(shape) > 2:
+        channels_first = flat.reshape((shape[-1],) + shape[:-1])
+        return np.moveaxis(channels_first, 0, -1)
+
+    return flat.reshape(shape)
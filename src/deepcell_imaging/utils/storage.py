@@ -31,6 +31,21 @@ def get_blob_filenames(uri_prefix, client=None):
     )
 
 
+def get_blob_uris(uri_prefix, client=None):
+    """Map each blob's basename to its full URI, eg for the image files."""
+    if client is None:
+        client = storage.Client()
+
+    root_blob = Blob.from_string(uri_prefix, client=client)
+    bucket = client.bucket(root_blob.bucket.name)
+
+    return {
+        gs_uri_to_basename(x.name): f"gs://{root_blob.bucket.name}/{x.name}"
+        for x in bucket.list_blobs(prefix=f"{root_blob.name}")
+        if gs_uri_to_basename(x.name)
+    }
+
+
 def find_matching_npz(image_names, npz_root, npz_names):
     for image in image_names:
         has_npz = image in npz_names
@@ -0,0 +1,20 @@
+import numpy as np
+
+from deepcell_imaging.benchmark_utils import StepPeakMemory
+
+
+def test_step_peak_memory():
+    tracker = StepPeakMemory()
+
+    big = np.ones(10_000_000, dtype=np.uint8)
+    del big
+    tracker.step_done("big")
+
+    small = np.ones(1_000_000, dtype=np.uint8)
+    del small
+    tracker.step_done("small")
+
+    tracker.stop()
+
+    assert tracker.peaks_gb["big"] >= 0.01
+    assert 0.001 <= tracker.peaks_gb["small"] < 0.01
@@ -1,3 +1,4 @@
+import pytest
 from unittest.mock import ANY, patch
 
 from deepcell_imaging.gcp_batch_jobs.segment import (
@@ -43,6 +44,46 @@ def test_make_segmentation_tasks(_mock_npz_headers):
     ]
 
 
+@patch(
+    "deepcell_imaging.gcp_batch_jobs.segment.npz_headers",
+    return_value=[[[], (123, 456)]],
+)
+def test_make_segmentation_tasks_parquet_shapes(_mock_npz_headers):
+    tasks = make_segmentation_tasks(
+        image_names=["a-prefix"],
+        npz_root="gs://a-dataset/NPZ_INTERMEDIATE",
+        npz_names=["a-prefix"],
+        masks_output_root="gs://a-dataset/SEGMASK",
+        parquet_shapes=True,
+    )
+
+    [task] = list(tasks)
+    assert (
+        task.wholecell_parquet_output_uri
+        == "gs://a-dataset/SEGMASK/a-prefix_WholeCellShapes.parquet"
+    )
+    assert (
+        task.nuclear_parquet_output_uri
+        == "gs://a-dataset/SEGMASK/a-prefix_NucleusShapes.parquet"
+    )
+
+    job = build_segment_job_tasks(
+        region="a-region",
+        container_image="a-container",
+        model_path="a-model",
+        model_hash="a-hash",
+        tasks=[task],
+        compartment="both",
+        working_directory="gs://a-bucket/a-working-directory",
+    )
+
+    [geojson_task] = job["tasks"]["predictions-to-geojson"][0]
+    assert geojson_task.whole_cell_parquet_output_uri == (
+        task.wholecell_parquet_output_uri
+    )
+    assert geojson_task.nucleus_parquet_output_uri == task.nuclear_parquet_output_uri
+
+
 def test_build_segment_job_tasks():
     args = {
         "region": "a-region",
@@ -167,3 +208,243 @@ def test_build_segment_job_tasks():
         "entrypoint": "python",
         "commands": ["scripts/visualize.py", ANY],
     }
+
+
+def test_build_segment_job_tasks_intermediate_format():
+    job = build_segment_job_tasks(
+        region="a-region",
+        container_image="an-image",
+        model_path="a-model",
+        model_hash="a-hash",
+        tasks=[
+            SegmentationTask(
+                input_channels_path="/channels/path",
+                image_name="an-image",
+                input_image_rows=123,
+                input_image_cols=456,
+            )
+        ],
+        compartment="both",
+        working_directory="a-directory",
+        intermediate_format="zarr",
+    )
+
+    predict_task = job["tasks"]["predict"][0][0]
+    assert predict_task.image_uri == "a-directory/task_0/preprocessed.zarr"
+    assert predict_task.output_uri == "a-directory/task_0/raw_predictions.zarr"
+    postprocess_task = job["tasks"]["postprocess"][0][0]
+    assert postprocess_task.output_uri == "a-directory/task_0/predictions.zarr"
+
+    with pytest.raises(ValueError):
+        build_segment_job_tasks(
+            region="a-region",
+            container_image="an-image",
+            model_path="a-model",
+            model_hash="a-hash",
+            tasks=[],
+            compartment="both",
+            working_directory="a-directory",
+            intermediate_format="tar",
+        )
+
+
+def test_build_segment_job_tasks_local_scratch():
+    job = build_segment_job_tasks(
+        region="a-region",
+        container_image="an-image",
+        model_path="a-model",
+        model_hash="a-hash",
+        tasks=[
+            SegmentationTask(
+                input_channels_path="/channels/path",
+                image_name="an-image",
+                input_image_rows=100000,
+                input_image_cols=100000,
+            )
+        ],
+        compartment="both",
+        working_directory="a-directory",
+        local_scratch=True,
+    )
+
+    scratch_dir = "/mnt/disks/deepcell-workspace/scratch"
+    for phase in ["preprocess", "predict", "postprocess", "predictions-to-geojson"]:
+        assert job["tasks"][phase][0][0].local_scratch_dir == scratch_dir
+
+    disks = job["job_definition"]["allocationPolicy"]["instances"][0]["policy"]["disks"]
+    assert disks[0]["newDisk"]["sizeGb"] == 100000 * 100000 * 8 * 4 * 2 // 1024**3
+
+
+def test_build_segment_job_tasks_rle_predictions():
+    job = build_segment_job_tasks(
+        region="a-region",
+        container_image="an-image",
+        model_path="a-model",
+        model_hash="a-hash",
+        tasks=[
+            SegmentationTask(
+                input_channels_path="/channels/path",
+                image_name="an-image",
+                input_image_rows=123,
+                input_image_cols=456,
+            )
+        ],
+        compartment="both",
+        working_directory="a-directory",
+        visualize=True,
+        rle_predictions=True,
+    )
+
+    predictions_uri = "a-directory/task_0/predictions.rle.npz.gz"
+    assert job["tasks"]["postprocess"][0][0].output_uri == predictions_uri
+    assert job["tasks"]["predictions-to-geojson"][0][0].predictions_uri == (
+        predictions_uri
+    )
+    assert job["tasks"]["visualize"][0][0].predictions_uri == predictions_uri
+
+
+def test_build_segment_job_tasks_postprocess_memory():
+    job = build_segment_job_tasks(
+        region="a-region",
+        container_image="an-image",
+        model_path="a-model",
+        model_hash="a-hash",
+        tasks=[
+            SegmentationTask(
+                input_channels_path="/channels/path",
+                image_name="an-image",
+                input_image_rows=123,
+                input_image_cols=456,
+            )
+        ],
+        compartment="both",
+        working_directory="a-directory",
+        memory_lean_postprocess=True,
+        trace_postprocess_memory=True,
+        postprocess_workers=4,
+    )
+
+    postprocess_task = job["tasks"]["postprocess"][0][0]
+    assert postprocess_task.memory_lean
+    assert postprocess_task.trace_memory
+    assert postprocess_task.num_workers == 4
+
+
+def test_build_segment_job_tasks_measure():
+    task = SegmentationTask(
+        input_channels_path="/channels/path",
+        image_name="an-image",
+        image_uri="gs://a-bucket/OMETIFF/an-image.ome.tiff",
+        measurement_output_uri="gs://a-bucket/REPORTS/an-image_QUANT.tsv",
+        input_image_rows=123,
+        input_image_cols=456,
+    )
+
+    job = build_segment_job_tasks(
+        region="a-region",
+        container_image="an-image",
+        model_path="a-model",
+        model_hash="a-hash",
+        tasks=[task],
+        compartment="both",
+        working_directory="a-directory",
+        measure=True,
+    )
+
+    [measure_task] = job["tasks"]["measure"][0]
+    assert measure_task.image_uri == task.image_uri
+    assert measure_task.output_uri == task.measurement_output_uri
+    assert measure_task.predictions_uri == "a-directory/task_0/predictions.npz.gz"
+
+    runnables = job["job_definition"]["taskGroups"][0]["taskSpec"]["runnables"]
+    phases = [runnable["container"]["commands"][0] for runnable in runnables]
+    assert phases[-2:] == ["scripts/measure.py", "scripts/gather-benchmark.py"]
+
+    with pytest.raises(ValueError):
+        build_segment_job_tasks(
+            region="a-region",
+            container_image="an-image",
+            model_path="a-model",
+            model_hash="a-hash",
+            tasks=[task.model_copy(update={"image_uri": ""})],
+            compartment="both",
+            working_directory="a-directory",
+            measure=True,
+        )
+
+
+@patch(
+    "deepcell_imaging.gcp_batch_jobs.segment.npz_headers",
+    return_value=[[[], (123, 456)]],
+)
+def test_make_segmentation_tasks_cell_graphs(_mock_npz_headers):
+    [task] = make_segmentation_tasks(
+        image_names=["a-prefix"],
+        npz_root="gs://a-dataset/NPZ_INTERMEDIATE",
+        npz_names=["a-prefix"],
+        masks_output_root="gs://a-dataset/SEGMASK",
+        cell_adjacency=True,
+        cell_knn=True,
+    )
+
+    job = build_segment_job_tasks(
+        region="a-region",
+        container_image="a-container",
+        model_path="a-model",
+        model_hash="a-hash",
+        tasks=[task],
+        compartment="both",
+        working_directory="a-directory",
+    )
+
+    [postprocess_task] = job["tasks"]["postprocess"][0]
+    assert postprocess_task.wholecell_adjacency_output_uri == (
+        "gs://a-dataset/SEGMASK/a-prefix_WholeCellAdjacency.tsv"
+    )
+    assert postprocess_task.wholecell_knn_output_uri == (
+        "gs://a-dataset/SEGMASK/a-prefix_WholeCellNeighbors.tsv"
+    )
+
+
+def test_build_segment_job_tasks_whole_cell_from_nuclei():
+    job = build_segment_job_tasks(
+        region="a-region",
+        container_image="an-image",
+        model_path="a-model",
+        model_hash="a-hash",
+        tasks=[
+            SegmentationTask(
+                input_channels_path="/channels/path",
+                image_name="an-image",
+                input_image_rows=123,
+                input_image_cols=456,
+            )
+        ],
+        compartment="both",
+        working_directory="a-directory",
+        whole_cell_from_nuclei=True,
+    )
+
+    postprocess_task = job["tasks"]["postprocess"][0][0]
+    assert postprocess_task.whole_cell_from_nuclei
+
+
+def test_build_segment_job_tasks_whole_cell_from_nuclei_needs_both():
+    with pytest.raises(ValueError):
+        build_segment_job_tasks(
+            region="a-region",
+            container_image="an-image",
+            model_path="a-model",
+            model_hash="a-hash",
+            tasks=[
+                SegmentationTask(
+                    input_channels_path="/channels/path",
+                    image_name="an-image",
+                    input_image_rows=123,
+                    input_image_cols=456,
+                )
+            ],
+            compartment="whole-cell",
+            working_directory="a-directory",
+            whole_cell_from_nuclei=True,
+        )
@@ -0,0 +1,141 @@
+import csv
+import io
+from collections import Counter
+
+import numpy as np
+import pytest
+
+from deepcell_imaging.image_processing import adjacency
+from deepcell_imaging.image_processing.adjacency import (
+    contact_edges,
+    knn_edges,
+    write_edges_tsv,
+)
+from deepcell_imaging.image_processing.measure import measure_shapes
+
+
+def make_labels():
+    rng = np.random.default_rng(0)
+    labels = np.zeros((50, 40), dtype=np.int32)
+    for label in range(1, 60):
+        y, x = rng.integers(0, 46), rng.integers(0, 36)
+        labels[y : y + 4, x : x + 4] = label
+    return labels
+
+
+def reference_contacts(labels):
+    contacts = Counter()
+    height, width = labels.shape
+    for y in range(height):
+        for x in range(width):
+            for dy, dx in [(0, 1), (1, -1), (1, 0), (1, 1)]:
+                ny, nx = y + dy, x + dx
+                if not (0 <= ny < height and 0 <= nx < width):
+                    continue
+                a, b = labels[y, x], labels[ny, nx]
+                if a != b and a != 0 and b != 0:
+                    contacts[(min(a, b), max(a, b))] += 1
+    return sorted((a, b, count) for (a, b), count in contacts.items())
+
+
+@pytest.mark.parametrize("band_height", [1, 7, 1024])
+def test_contact_edges(monkeypatch, band_height):
+    monkeypatch.setattr(adjacency, "BAND_HEIGHT", band_height)
+    labels = make_labels()
+
+    edges = contact_edges(labels)
+
+    actual = list(
+        zip(*(edges[key].tolist() for key in ["source", "target", "contact"]))
+    )
+    assert actual == reference_contacts(labels)
+
+
+def test_contact_edges_diagonal():
+    labels = np.array([[1, 0], [0, 2]])
+
+    edges = contact_edges(labels)
+
+    assert edges["source"].tolist() == [1]
+    assert edges["target"].tolist() == [2]
+
+
+def test_contact_edges_empty():
+    edges = contact_edges(np.zeros((5, 5), dtype=np.int32))
+
+    assert len(edges["source"]) == 0
+
+
+def test_knn_edges():
+    labels = make_labels()
+    shapes = measure_shapes(labels)
+    centroids = dict(
+        zip(shapes["label"], zip(shapes["centroid_x"], shapes["centroid_y"]))
+    )
+
+    edges = knn_edges(labels, 3, shapes)
+
+    expected = set()
+    for label, centroid in centroids.items():
+        distances = sorted(
+            (np.hypot(*np.subtract(centroid, other)), other_label)
+            for other_label, other in centroids.items()
+            if other_label != label
+        )
+        for _, other_label in distances[:3]:
+            expected.add((min(label, other_label), max(label, other_label)))
+    # Ties at the 3rd nearest neighbor can go either way.
+    actual = set(zip(edges["source"].tolist(), edges["target"].tolist()))
+    assert len(actual ^ expected) <= len(centroids) // 4
+    assert all(source < target for source, target in actual)
+    for source, target, distance in zip(
+        edges["source"], edges["target"], edges["distance"]
+    ):
+        assert distance == pytest.approx(
+            np.hypot(*np.subtract(centroids[source], centroids[target]))
+        )
+
+
+def test_knn_edges_few_cells():
+    labels = np.zeros((10, 10), dtype=np.int32)
+    labels[1:3, 1:3] = 1
+
+    assert len(knn_edges(labels, 5)["source"]) == 0
+
+    labels[6:8, 6:8] = 2
+    edges = knn_edges(labels, 5)
+
+    assert edges["source"].tolist() == [1]
+    assert edges["target"].tolist() == [2]
+
+
+def test_write_edges_tsv():
+    edges = contact_edges(make_labels())
+    output = io.StringIO()
+
+    count = write_edges_tsv(output, edges)
+
+    output.seek(0)
+    rows = list(csv.DictReader(output, delimiter="\t"))
+    assert count == len(rows) == len(edges["source"])
+    assert rows[0] == {
+        "source": str(edges["source"][0]),
+        "target": str(edges["target"][0]),
+        "contact": str(edges["contact"][0]),
+    }
+
+
+def test_knn_edges_shared_centroid():
+    labels = np.zeros((21, 21), dtype=np.int32)
+    # A ring around a cell in its middle: both have centroid (10, 10).
+    labels[5:16, 5:16] = 1
+    labels[8:13, 8:13] = 0
+    labels[9:12, 9:12] = 2
+    labels[0:2, 0:2] = 3
+
+    edges = knn_edges(labels, 1)
+
+    pairs = list(zip(edges["source"].tolist(), edges["target"].tolist()))
+    assert all(source != target for source, target in pairs)
+    assert (1, 2) in pairs
+    assert edges["distance"][pairs.index((1, 2))] == pytest.approx(0)
@@ -0,0 +1,110 @@
+import numpy as np
+import pytest
+import scipy.ndimage as nd
+from skimage.morphology import ball, disk
+
+from deepcell_imaging.image_processing.dynamics import (
+    h_maxima_from_dynamics,
+    h_maxima_sweep,
+    maxima_dynamics,
+)
+from deepcell_imaging.image_processing.extrema import h_maxima
+
+
+def make_image(shape, dtype, seed=0):
+    rng = np.random.default_rng(seed)
+    image = nd.gaussian_filter(rng.random(shape), 2)
+    image = (image - image.min()) / (image.max() - image.min())
+    if np.issubdtype(dtype, np.integer):
+        return (image * 60).astype(dtype)
+    return image.astype(dtype)
+
+
+@pytest.mark.parametrize("seed", range(3))
+@pytest.mark.parametrize(
+    "shape, dtype, footprint",
+    [
+        ((40, 50), np.float64, None),
+        ((40, 50), np.float32, disk(2)),
+        ((40, 50), np.uint8, disk(3)),
+        ((12, 14, 13), np.float64, None),
+        ((12, 14, 13), np.int16, ball(1)),
+    ],
+)
+def test_matches_h_maxima(seed, shape, dtype, footprint):
+    image = make_image(shape, dtype, seed)
+    dynamics = maxima_dynamics(image, footprint=footprint)
+
+    if np.issubdtype(dtype, np.integer):
+        heights = [1, 3, 10, 60, 61]
+    else:
+        heights = [0.001, 0.05, 0.2, 1.0, 1.1]
+    for h in heights:
+        np.testing.assert_array_equal(
+            h_maxima_from_dynamics(dynamics, h), h_maxima(image, h, footprint)
+        )
+
+
+def test_dynamics():
+    image = np.array(
+        [
+            [0, 5, 1, 3, 3, 1, 9],
+            [0, 1, 1, 1, 1, 1, 2],
+        ],
+        dtype=np.uint8,
+    )
+
+    dynamics = maxima_dynamics(image)
+
+    # 5 passes to 9 at 1, the 3 plateau too, & 9 is the global maximum.
+    expected = np.array(
+        [
+            [0, 4, 0, 2, 2, 0, 9],
+            [0, 0, 0, 0, 0, 0, 0],
+        ]
+    )
+    np.testing.assert_array_equal(dynamics, expected)
+    assert dynamics.dtype == np.float64
+
+
+def test_equal_maxima():
+    image = np.array([[4, 1, 4, 0]], dtype=np.uint8)
+
+    np.testing.assert_array_equal(maxima_dynamics(image), [[4, 0, 4, 0]])
+
+
+def test_sweep():
+    image = make_image((30, 40), np.float64)
+
+    results = h_maxima_sweep(image, [0.01, 0.1, 0.3], footprint=disk(2))
+
+    assert len(results) == 3
+    for result, h in zip(results, [0.01, 0.1, 0.3]):
+        np.testing.assert_array_equal(result, h_maxima(image, h, disk(2)))
+        assert result.dtype == np.uint8
+
+
+def test_out():
+    image = make_image((30, 40), np.float64)
+    dynamics = maxima_dynamics(image)
+
+    out = np.full(image.shape, 5, dtype=np.uint8)
+    result = h_maxima_from_dynamics(dynamics, 0.1, out=out)
+
+    assert result is out
+    np.testing.assert_array_equal(out, h_maxima(image, 0.1))
+
+
+def test_invalid():
+    image = np.zeros((5, 5))
+
+    with pytest.raises(ValueError):
+        maxima_dynamics(image, footprint=np.ones((3,), dtype=bool))
+    with pytest.raises(ValueError):
+        maxima_dynamics(image, footprint=np.ones((2, 3), dtype=bool))
+    with pytest.raises(ValueError):
+        h_maxima_from_dynamics(maxima_dynamics(image), 0)
+
+
+def test_empty():
+    assert maxima_dynamics(np.zeros((0, 4))).shape == (0, 4)
@@ -11,6 +11,8 @@ Licensed under BSD-3
 import math
 
 import numpy as np
+import pytest
+import scipy.ndimage as nd
 from skimage._shared.testing import expected_warnings
 
 from deepcell_imaging.image_processing import extrema
@@ -184,3 +186,91 @@ class TestExtrema:
 
         maxima = extrema.h_maxima(data, 5.0)
         assert np.sum(maxima) == 0
+
+
+@pytest.mark.parametrize("quantize", [np.uint8, np.uint16])
+def test_h_maxima_quantized(quantize):
+    data = np.array(
+        [
+            [0.10, 0.11, 0.13, 0.14, 0.14, 0.15, 0.14, 0.14, 0.13, 0.11],
+            [0.11, 0.13, 0.15, 0.16, 0.16, 0.16, 0.16, 0.16, 0.15, 0.13],
+            [0.13, 0.15, 0.40, 0.40, 0.18, 0.18, 0.18, 0.60, 0.60, 0.15],
+            [0.14, 0.16, 0.40, 0.40, 0.19, 0.19, 0.19, 0.60, 0.60, 0.16],
+            [0.14, 0.16, 0.18, 0.19, 0.19, 0.19, 0.19, 0.19, 0.18, 0.16],
+            [0.15, 0.16, 0.18, 0.19, 0.19, 0.20, 0.19, 0.19, 0.18, 0.16],
+            [0.14, 0.16, 0.18, 0.19, 0.19, 0.19, 0.19, 0.19, 0.18, 0.16],
+            [0.14, 0.16, 0.80, 0.80, 0.19, 0.19, 0.19, 1.0, 1.0, 0.16],
+            [0.13, 0.15, 0.80, 0.80, 0.18, 0.18, 0.18, 1.0, 1.0, 0.15],
+            [0.11, 0.13, 0.15, 0.16, 0.16, 0.16, 0.16, 0.16, 0.15, 0.13],
+        ],
+        dtype=np.float32,
+    )
+
+    for h in [0.003, 0.1, 0.3, 0.5]:
+        out = extrema.h_maxima(data, h, quantize=quantize)
+        np.testing.assert_array_equal(out, extrema.h_maxima(data, h))
+        assert out.dtype == np.uint8
+
+    assert np.sum(extrema.h_maxima(data, 0.95, quantize=quantize)) == 0
+
+
+def test_h_maxima_quantized_smooth_image():
+    rng = np.random.default_rng(0)
+    data = nd.gaussian_filter(rng.random((200, 200)), 4)
+    data = (data - data.min()) / (data.max() - data.min())
+    footprint = np.ones((5, 5), dtype=np.uint8)
+
+    expected = extrema.h_maxima(data, 0.1, footprint=footprint)
+    out = extrema.h_maxima(data, 0.1, footprint=footprint, quantize=np.uint16)
+
+    assert np.mean(out == expected) > 0.999
+    assert nd.label(out)[1] == nd.label(expected)[1]
+
+
+def test_h_maxima_quantized_invalid():
+    data = np.zeros((5, 5))
+
+    with pytest.raises(ValueError):
+        extrema.h_maxima(data, 0.1, quantize=np.uint32)
+    with pytest.raises(ValueError):
+        extrema.h_maxima(data, 0, quantize=np.uint8)
+
+
+def test_quantize_unit_interval():
+    data = np.array([-0.5, 0, 0.25, 0.5, 1, 1.5])
+
+    np.testing.assert_array_equal(
+        extrema.quantize_unit_interval(data, np.uint8), [0, 0, 64, 128, 255, 255]
+    )
+    np.testing.assert_array_equal(
+        extrema.quantize_unit_interval(data, np.uint16),
+        [0, 0, 16384, 32768, 65535, 65535],
+    )
+
+
+@pytest.mark.parametrize("dtype", [np.float32, np.float64, np.uint8, np.int64])
+def test_h_maxima_out(dtype):
+    rng = np.random.default_rng(0)
+    data = nd.gaussian_filter(rng.random((50, 60)), 2)
+    data = (100 * (data - data.min()) / (data.max() - data.min())).astype(dtype)
+    expected = extrema.h_maxima(data, 5)
+
+    out = np.full(data.shape, 7, dtype=np.uint8)
+    result = extrema.h_maxima(data, 5, out=out)
+
+    assert result is out
+    np.testing.assert_array_equal(out, expected)
+
+    # No maxima that high: the output is cleared.
+    out[...] = 7
+    extrema.h_maxima(data, 1000, out=out)
+    assert not np.any(out)
+
+
+def test_h_maxima_out_invalid():
+    data = np.zeros((5, 5))
+
+    with pytest.raises(ValueError):
+        extrema.h_maxima(data, 0.1, out=np.zeros((5, 4), dtype=np.uint8))
+    with pytest.raises(ValueError):
+        extrema.h_maxima(data, 0.1, out=np.zeros((5, 5), dtype=bool))
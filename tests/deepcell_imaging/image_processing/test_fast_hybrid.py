@@ -0,0 +1,53 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+import scipy.ndimage as nd
+from skimage.morphology import reconstruction
+
+from deepcell_imaging.image_processing.fast_hybrid import fast_hybrid_reconstruct
+
+
+def make_mask(shape, dtype, seed=0):
+    rng = np.random.default_rng(seed)
+    mask = nd.gaussian_filter(rng.random(shape), 3)
+    mask = (mask - mask.min()) / (mask.max() - mask.min())
+    if np.issubdtype(dtype, np.integer):
+        return (mask * 100).astype(dtype)
+    return mask.astype(dtype)
+
+
+def make_seed(mask, method):
+    # Far enough from the mask for long propagations (& a large queue).
+    h = mask.dtype.type(10 if np.issubdtype(mask.dtype, np.integer) else 0.1)
+    if method == "dilation":
+        return np.maximum(mask, h) - h
+    return np.minimum(mask, mask.max() - h) + h
+
+
+@pytest.mark.parametrize("method", ["dilation", "erosion"])
+@pytest.mark.parametrize(
+    "shape, dtype",
+    [((200, 300), np.float64), ((200, 300), np.uint8), ((20, 30, 25), np.float32)],
+)
+def test_matches_skimage(method, shape, dtype):
+    mask = make_mask(shape, dtype)
+    seed = make_seed(mask, method)
+
+    expected = reconstruction(seed, mask, method=method)
+    result = fast_hybrid_reconstruct(seed, mask, method=method)
+
+    np.testing.assert_array_equal(result, expected)
+
+
+def test_threads():
+    masks = [make_mask((300, 300), np.float64, seed) for seed in range(4)]
+    seeds = [make_seed(mask, "dilation") for mask in masks]
+    expected = [reconstruction(s, m) for s, m in zip(seeds, masks)]
+
+    # The reconstructions release the GIL: they can run at the same time.
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        results = list(executor.map(fast_hybrid_reconstruct, seeds, masks))
+
+    for result, expected_result in zip(results, expected):
+        np.testing.assert_array_equal(result, expected_result)
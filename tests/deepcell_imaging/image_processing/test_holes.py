@@ -0,0 +1,120 @@
+import numpy as np
+import pytest
+import scipy.ndimage as nd
+from skimage.measure import euler_number
+from skimage.morphology import remove_small_holes
+
+from deepcell_imaging.image_processing import holes
+from deepcell_imaging.image_processing.holes import euler_numbers, fill_holes
+
+pytestmark = pytest.mark.filterwarnings("ignore::FutureWarning")
+
+
+def reference_fill_holes(label_img, size=10, connectivity=1):
+    # The per-object loop from deepcell_toolbox.utils.fill_holes.
+    output_image = np.copy(label_img)
+    labeled_image = label_img.astype("int")
+
+    objects = nd.find_objects(labeled_image)
+    for idx, slice in enumerate(objects):
+        if slice is None:
+            continue
+
+        label = idx + 1
+
+        obj_image = labeled_image[slice] == label
+        eu_num = euler_number(obj_image, 2)
+
+        if eu_num < 1:
+            patch = output_image[slice]
+            filled = remove_small_holes(
+                ar=(patch == label), area_threshold=size, connectivity=connectivity
+            )
+            output_image[slice] = np.where(filled, label, patch)
+
+    return output_image
+
+
+def make_labels(seed):
+    rng = np.random.default_rng(seed)
+    labels = np.zeros((80, 80), dtype=np.int32)
+    for label in range(1, 50):
+        y, x = rng.integers(0, 72), rng.integers(0, 72)
+        h, w = rng.integers(3, 9, size=2)
+        labels[y : y + h, x : x + w] = label
+        # Punch random holes, some in other cells.
+        for _ in range(rng.integers(0, 3)):
+            hy, hx = y + rng.integers(1, 7), x + rng.integers(1, 7)
+            labels[hy : hy + rng.integers(1, 4), hx : hx + rng.integers(1, 4)] = 0
+    # Sprinkle noise, for diagonal & multi-component objects.
+    noise = rng.random(labels.shape) < 0.05
+    labels[noise] = rng.integers(0, 50, size=noise.sum())
+    return labels
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_euler_numbers(monkeypatch, seed):
+    monkeypatch.setattr(holes, "BAND_HEIGHT", 7)
+    labels = make_labels(seed)
+
+    numbers = euler_numbers(labels)
+
+    for label in np.unique(labels[labels != 0]):
+        assert numbers[label] == euler_number(labels == label, 2), label
+
+
+@pytest.mark.parametrize("seed", range(4))
+@pytest.mark.parametrize("size", [3, 10, 15])
+def test_fill_holes_matches_per_object_loop(seed, size):
+    labels = make_labels(seed)
+
+    np.testing.assert_array_equal(
+        fill_holes(labels, size=size), reference_fill_holes(labels, size=size)
+    )
+
+
+def test_fill_holes_ring():
+    labels = np.zeros((7, 7), dtype=np.int32)
+    labels[1:6, 1:6] = 3
+    labels[3, 3] = 0
+
+    filled = fill_holes(labels, size=2)
+
+    assert (filled[1:6, 1:6] == 3).all()
+    assert filled.dtype == labels.dtype
+
+
+def test_fill_holes_no_holes():
+    labels = np.zeros((7, 7), dtype=np.int32)
+    labels[1:3, 1:3] = 1
+
+    np.testing.assert_array_equal(fill_holes(labels), labels)
+
+
+def test_fill_holes_return_erased():
+    labels = np.zeros((7, 7), dtype=np.int32)
+    labels[1:6, 1:6] = 3
+    labels[3, 3] = 1
+    labels[2, 2] = 0
+
+    filled, erased = fill_holes(labels, size=2, return_erased=True)
+
+    assert (filled[1:6, 1:6] == 3).all()
+    assert erased
+
+    # Label 1 is also outside label 3's hole.
+    labels[0, 0] = 1
+    filled, erased = fill_holes(labels, size=2, return_erased=True)
+
+    assert filled[0, 0] == 1
+    assert (filled[1:6, 1:6] == 3).all()
+    assert not erased
+
+
+def test_fill_holes_keeps_unsigned_labels():
+    labels = make_labels(0).astype(np.uint32)
+
+    filled = fill_holes(labels, size=10)
+
+    assert filled.dtype == np.uint32
+    np.testing.assert_array_equal(filled, reference_fill_holes(labels, size=10))
@@ -0,0 +1,112 @@
+import csv
+import io
+
+import numpy as np
+import pytest
+import tifffile
+
+from deepcell_imaging.image_processing import measure
+from deepcell_imaging.image_processing.measure import (
+    measure_channels,
+    measure_shapes,
+    write_measurements_tsv,
+)
+
+
+def make_labels():
+    rng = np.random.default_rng(0)
+    labels = np.zeros((70, 50), dtype=np.int32)
+    for label in range(1, 40):
+        y, x = rng.integers(0, 65), rng.integers(0, 45)
+        labels[y : y + 5, x : x + 5] = label
+    # A cell crossing several tiles & bands, and a gap in the labels.
+    labels[10:60, 20:23] = 45
+    return labels
+
+
+def make_image(labels, channels=3):
+    rng = np.random.default_rng(1)
+    return rng.integers(0, 4000, (channels,) + labels.shape).astype(np.uint16)
+
+
+def write_tiff(image, channel_names=None, **kwargs):
+    output = io.BytesIO()
+    metadata = {"axes": "CYX"}
+    if channel_names:
+        metadata["Channel"] = {"Name": channel_names}
+    tifffile.imwrite(output, image, ome=True, metadata=metadata, **kwargs)
+    output.seek(0)
+    return output
+
+
+def test_measure_shapes(monkeypatch):
+    monkeypatch.setattr(measure, "BAND_HEIGHT", 16)
+    labels = make_labels()
+
+    shapes = measure_shapes(labels)
+
+    expected_labels = np.unique(labels[labels != 0])
+    np.testing.assert_array_equal(shapes["label"], expected_labels)
+    for index, label in enumerate(expected_labels):
+        rows, cols = np.nonzero(labels == label)
+        assert shapes["area"][index] == len(rows)
+        assert shapes["centroid_x"][index] == pytest.approx(cols.mean() + 0.5)
+        assert shapes["centroid_y"][index] == pytest.approx(rows.mean() + 0.5)
+        assert shapes["min_x"][index] == cols.min()
+        assert shapes["max_y"][index] == rows.max() + 1
+
+
+@pytest.mark.parametrize("layout", [{"tile": (16, 16)}, {"rowsperstrip": 9}])
+def test_measure_channels(layout):
+    labels = make_labels()
+    image = make_image(labels)
+
+    with tifffile.TiffFile(write_tiff(image, ["DAPI", "CD3", "CD8"], **layout)) as tif:
+        channels = measure_channels(labels, tif)
+
+    assert list(channels.keys()) == ["DAPI", "CD3", "CD8"]
+    for channel, accumulator in zip(image, channels.values()):
+        for label in np.unique(labels[labels != 0]):
+            values = channel[labels == label].astype(np.float64)
+            assert accumulator.sum[label] == values.sum()
+            assert accumulator.min[label] == values.min()
+            assert accumulator.max[label] == values.max()
+
+
+def test_measure_channels_default_names():
+    labels = make_labels()
+
+    with tifffile.TiffFile(write_tiff(make_image(labels, 2))) as tif:
+        channels = measure_channels(labels, tif)
+
+    assert list(channels.keys()) == ["Channel 1", "Channel 2"]
+
+
+def test_measure_channels_shape_mismatch():
+    labels = make_labels()
+
+    with tifffile.TiffFile(write_tiff(make_image(labels[:-1]))) as tif:
+        with pytest.raises(ValueError):
+            measure_channels(labels, tif)
+
+
+def test_write_measurements_tsv():
+    labels = make_labels()
+    image = make_image(labels, 1)
+    with tifffile.TiffFile(write_tiff(image, ["DAPI"], tile=(16, 16))) as tif:
+        channels = measure_channels(labels, tif)
+    shapes = measure_shapes(labels)
+    output = io.StringIO()
+
+    count = write_measurements_tsv(output, "a-sample", shapes, channels)
+
+    output.seek(0)
+    rows = list(csv.DictReader(output, delimiter="\t"))
+    assert count == len(rows) == len(shapes["label"])
+    row = rows[-1]
+    assert row["Image"] == "a-sample"
+    assert row["Label"] == "45"
+    assert float(row["Cell: Area px^2"]) == 150
+    assert float(row["Cell: DAPI: Mean"]) == pytest.approx(
+        image[0][labels == 45].mean()
+    )
@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+import scipy.ndimage as nd
+from skimage.feature import peak_local_max
+from skimage.measure import label
+
+from deepcell_imaging.image_processing.peaks import (
+    peak_coordinates,
+    peak_local_max_markers,
+)
+
+
+def make_image(shape, dtype, seed=0):
+    rng = np.random.default_rng(seed)
+    image = nd.gaussian_filter(rng.random(shape), 1.5)
+    if np.issubdtype(dtype, np.integer):
+        # Coarse values, for ties.
+        return (image * 20).astype(dtype)
+    return image.astype(dtype)
+
+
+@pytest.mark.parametrize("min_distance", [1, 2, 3, 5, 10])
+@pytest.mark.parametrize("exclude_border", [False, True, 2])
+@pytest.mark.parametrize(
+    "shape, dtype",
+    [((60, 70), np.float32), ((50, 45), np.uint8), ((15, 16, 17), np.float64)],
+)
+def test_matches_skimage(min_distance, exclude_border, shape, dtype):
+    image = make_image(shape, dtype)
+    threshold = np.median(image)
+
+    expected = peak_local_max(
+        image,
+        min_distance=min_distance,
+        threshold_abs=threshold,
+        exclude_border=exclude_border,
+    )
+    coords = peak_coordinates(image, min_distance, threshold, exclude_border)
+    np.testing.assert_array_equal(coords, expected)
+
+    expected_markers = np.zeros_like(image)
+    expected_markers[tuple(expected.T)] = 1
+    expected_markers = label(expected_markers)
+    markers = peak_local_max_markers(image, min_distance, threshold, exclude_border)
+    np.testing.assert_array_equal(markers, expected_markers)
+    assert markers.dtype == np.uint32
+
+
+def test_no_threshold():
+    image = make_image((40, 40), np.float64)
+
+    np.testing.assert_array_equal(
+        peak_coordinates(image, min_distance=3),
+        peak_local_max(image, min_distance=3, exclude_border=False),
+    )
+
+
+def test_flat_image():
+    image = np.ones((10, 10))
+
+    assert len(peak_coordinates(image, min_distance=2)) == 0
+    assert not np.any(peak_local_max_markers(image, min_distance=2))
+
+
+def test_markers_dtype():
+    image = make_image((30, 30), np.float32)
+
+    markers = peak_local_max_markers(image, min_distance=2, dtype=np.int64)
+
+    assert markers.dtype == np.int64
+    assert markers.max() == len(peak_coordinates(image, min_distance=2))
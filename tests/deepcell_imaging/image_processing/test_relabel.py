@@ -0,0 +1,88 @@
+import numpy as np
+import pytest
+from skimage.segmentation import relabel_sequential
+
+from deepcell_imaging.image_processing.relabel import remove_small_objects_and_relabel
+
+
+def remove_small_objects(labels, min_size):
+    # skimage's remove_small_objects(labels, min_size=min_size) before 0.26,
+    # which removes objects with fewer than min_size pixels. (0.26 changed
+    # min_size to also remove objects of exactly min_size pixels.)
+    indices = labels.astype(np.intp)
+    too_small = np.bincount(indices.ravel()) < min_size
+    return np.where(too_small[indices], 0, labels).astype(labels.dtype)
+
+
+def make_labels(dtype):
+    rng = np.random.default_rng(0)
+    labels = np.zeros((60, 60), dtype=dtype)
+    # Sparse labels, of various sizes.
+    for label in rng.choice(np.arange(1, 120), size=40, replace=False):
+        y, x = rng.integers(0, 55), rng.integers(0, 55)
+        h, w = rng.integers(1, 6, size=2)
+        labels[y : y + h, x : x + w] = label
+    return labels
+
+
+@pytest.mark.parametrize(
+    "dtype", [np.int8, np.uint8, np.int16, np.uint16, np.int32, np.int64, np.uint64]
+)
+@pytest.mark.parametrize("min_size", [0, 1, 5, 12, 1000])
+def test_matches_skimage(dtype, min_size):
+    labels = make_labels(dtype)
+
+    expected = labels
+    if min_size:
+        expected = remove_small_objects(labels, min_size=min_size)
+    expected, _, _ = relabel_sequential(expected)
+
+    actual = remove_small_objects_and_relabel(labels, min_size=min_size)
+
+    np.testing.assert_array_equal(actual, expected)
+    assert actual.dtype == expected.dtype
+
+
+def test_in_place():
+    labels = make_labels(np.int32)
+    original = labels.copy()
+
+    result = remove_small_objects_and_relabel(labels, min_size=5, in_place=True)
+
+    assert result is labels
+    assert not np.array_equal(labels, original)
+    copy = remove_small_objects_and_relabel(original, min_size=5)
+    np.testing.assert_array_equal(copy, labels)
+
+
+def test_not_contiguous():
+    labels = make_labels(np.int32)
+
+    np.testing.assert_array_equal(
+        remove_small_objects_and_relabel(labels[:, ::2]),
+        relabel_sequential(labels[:, ::2])[0],
+    )
+    with pytest.raises(ValueError):
+        remove_small_objects_and_relabel(labels[:, ::2], in_place=True)
+
+
+def test_invalid_labels():
+    with pytest.raises(ValueError):
+        remove_small_objects_and_relabel(np.array([[0, -1]]))
+    with pytest.raises(TypeError):
+        remove_small_objects_and_relabel(np.array([[0.0, 1.0]]))
+
+
+def test_empty():
+    labels = np.zeros((0, 5), dtype=np.int32)
+
+    assert remove_small_objects_and_relabel(labels).shape == (0, 5)
+
+
+@pytest.mark.parametrize("min_size", [0, 5, 12])
+def test_no_relabel(min_size):
+    labels = make_labels(np.uint16)
+
+    actual = remove_small_objects_and_relabel(labels, min_size=min_size, relabel=False)
+
+    np.testing.assert_array_equal(actual, remove_small_objects(labels, min_size))
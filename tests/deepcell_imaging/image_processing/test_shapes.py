@@ -0,0 +1,251 @@
+import io
+import json
+import struct
+
+import numpy as np
+import pytest
+from rasterio import features
+
+from deepcell_imaging.image_processing.shapes import (
+    iter_shapes,
+    simplify_ring,
+    write_geoparquet,
+    write_shapes,
+)
+
+
+def reference_shapes(labels):
+    labels = labels.astype(np.int32)
+    return sorted(
+        json.dumps(shape)
+        for shape, _ in features.shapes(labels, labels != 0, connectivity=8)
+    )
+
+
+def make_labels():
+    rng = np.random.default_rng(0)
+    labels = np.zeros((60, 40), dtype=np.int64)
+    # Lots of small cells, some touching.
+    for label in range(1, 80):
+        y, x = rng.integers(0, 57), rng.integers(0, 37)
+        labels[y : y + 3, x : x + 3] = label
+    # Cells crossing several band seams, including a disconnected one.
+    labels[5:50, 10:12] = 100
+    labels[8:58, 30] = 101
+    labels[55:60, 0:3] = 101
+    return labels
+
+
+@pytest.mark.parametrize("band_height", [1, 7, 16, 100])
+@pytest.mark.parametrize("max_workers", [1, 2])
+def test_iter_shapes_matches_whole_image(band_height, max_workers):
+    labels = make_labels()
+
+    shapes = iter_shapes(labels, band_height=band_height, max_workers=max_workers)
+
+    assert sorted(json.dumps(json.loads(s)) for s in shapes) == reference_shapes(labels)
+
+
+def test_write_shapes():
+    labels = make_labels()
+    output = io.BytesIO()
+
+    count = write_shapes(labels, output, band_height=16, max_workers=1)
+
+    lines = output.getvalue().splitlines()
+    assert count == len(lines) == len(reference_shapes(labels))
+    assert all(json.loads(line)["type"] == "Polygon" for line in lines)
+
+
+def test_empty_labels():
+    assert list(iter_shapes(np.zeros((10, 10), dtype=np.int32))) == []
+
+
+def ring_area(ring):
+    ring = np.asarray(ring, dtype=np.float64)
+    x, y = ring[:, 0], ring[:, 1]
+    return 0.5 * abs(np.sum(x[:-1] * y[1:] - x[1:] * y[:-1]))
+
+
+def test_simplify_ring_douglas_peucker():
+    # A staircase diagonal, which is within a pixel of the straight diagonal.
+    steps = [[i, i] for i in range(6)]
+    ring = []
+    for x, y in steps:
+        ring += [[x, y], [x + 1, y]]
+    ring += [[6, 6], [0, 6], [0, 0]]
+    ring = np.array(ring, dtype=np.float64)
+
+    assert simplify_ring(ring, 0).tolist() == ring.tolist()
+    simplified = simplify_ring(ring, 1)
+
+    assert simplified.tolist() == [[0, 0], [6, 6], [0, 6], [0, 0]]
+
+
+def test_iter_shapes_simplified():
+    labels = make_labels()
+    # A disk, whose border is a staircase.
+    y, x = np.ogrid[:60, :40]
+    labels[(y - 30) ** 2 + (x - 20) ** 2 < 15**2] = 200
+    stats = {}
+
+    shapes = [
+        json.loads(s)
+        for s in iter_shapes(
+            labels,
+            max_workers=1,
+            simplify_tolerance=1,
+            integer_coordinates=True,
+            stats=stats,
+        )
+    ]
+
+    reference = [json.loads(s) for s in reference_shapes(labels)]
+    assert len(shapes) == len(reference)
+    # Simplifying only moves the borders by up to a pixel.
+    areas = sorted(ring_area(s["coordinates"][0]) for s in shapes)
+    reference_areas = sorted(ring_area(s["coordinates"][0]) for s in reference)
+    assert areas[-1] == pytest.approx(reference_areas[-1], rel=0.05)
+    assert all(
+        isinstance(c, int)
+        for s in shapes
+        for r in s["coordinates"]
+        for p in r
+        for c in p
+    )
+    assert stats["traced_vertices"] == sum(
+        len(r) for s in reference for r in s["coordinates"]
+    )
+    assert 0 < stats["vertices"] < stats["traced_vertices"]
+    assert 0 < stats["bytes"] < stats["traced_bytes"]
+
+
+def polygon_area(shape):
+    rings = shape["coordinates"]
+    return ring_area(rings[0]) - sum(ring_area(ring) for ring in rings[1:])
+
+
+def inner_vertices(ring, labels):
+    """The ring's vertices not on the edge of the labels."""
+    height, width = labels.shape
+    return {(x, y) for x, y in ring if 0 < x < width and 0 < y < height}
+
+
+@pytest.mark.parametrize("band_height", [4, 100])
+def test_simplified_cells_still_touch(band_height):
+    # Two cells with a staircase border, crossing band seams.
+    y, x = np.ogrid[:20, :20]
+    labels = np.where(2 * x > y + 5, 1, 2).astype(np.int32)
+
+    shapes = [
+        json.loads(s)
+        for s in iter_shapes(
+            labels, band_height=band_height, max_workers=1, simplify_tolerance=1.5
+        )
+    ]
+
+    # No gaps or overlaps: both cells have the same simplified border.
+    assert sum(polygon_area(s) for s in shapes) == 400
+    first, second = (inner_vertices(s["coordinates"][0], labels) for s in shapes)
+    assert first == second
+    assert len(first) < np.count_nonzero(np.diff(labels, axis=1))
+
+
+def test_simplified_holes():
+    # A disk, in a thin ring, in a cell with a background hole.
+    y, x = np.ogrid[:40, :40]
+    radius = np.sqrt((y - 20) ** 2 + (x - 19) ** 2)
+    labels = np.full((40, 40), 3, dtype=np.int32)
+    labels[radius < 12] = 2
+    labels[radius < 10.5] = 1
+    labels[2:6, 3:7] = 0
+
+    shapes = {
+        len(s["coordinates"]): s
+        for s in map(json.loads, iter_shapes(labels, simplify_tolerance=2))
+    }
+
+    # Each hole is simplified the same as the cell filling it.
+    assert sum(polygon_area(s) for s in shapes.values()) == 1600 - 16
+    disk, ring, cell = shapes[1], shapes[2], shapes[3]
+    assert inner_vertices(ring["coordinates"][1], labels) == inner_vertices(
+        disk["coordinates"][0], labels
+    )
+    # The background hole is a square, which doesn't simplify.
+    cell_holes = [inner_vertices(hole, labels) for hole in cell["coordinates"][1:]]
+    assert sorted(cell_holes, key=len) == [
+        {(3, 2), (7, 2), (7, 6), (3, 6)},
+        inner_vertices(ring["coordinates"][0], labels),
+    ]
+
+
+def test_simplify_invalid_polygon():
+    # Cell 1 is pinched at corners, where simplifying crosses its borders.
+    labels = np.array(
+        [
+            [1, 1, 1, 1, 1, 1, 1, 1],
+            [1, 1, 1, 1, 1, 1, 1, 1],
+            [2, 2, 1, 1, 1, 2, 2, 2],
+            [2, 1, 0, 1, 1, 2, 2, 2],
+            [1, 1, 0, 1, 1, 2, 2, 1],
+            [1, 1, 0, 0, 0, 1, 1, 1],
+            [1, 1, 1, 1, 0, 0, 1, 1],
+            [0, 0, 1, 1, 1, 0, 0, 0],
+        ],
+        dtype=np.int32,
+    )
+
+    shapes = list(iter_shapes(labels, max_workers=1, simplify_tolerance=2))
+
+    # It keeps its traced rings, but the other cells are simplified.
+    traced = set(reference_shapes(labels))
+    assert [json.dumps(json.loads(s)) in traced for s in shapes].count(True) == 1
+
+
+def parse_polygon_wkb(wkb):
+    byte_order, geometry_type, num_rings = struct.unpack_from("<BII", wkb)
+    assert (byte_order, geometry_type) == (1, 3)
+    offset = 9
+    rings = []
+    for _ in range(num_rings):
+        (num_points,) = struct.unpack_from("<I", wkb, offset)
+        offset += 4
+        ring = np.frombuffer(wkb, dtype="<f8", count=num_points * 2, offset=offset)
+        rings.append(ring.reshape(-1, 2).tolist())
+        offset += num_points * 16
+    assert offset == len(wkb)
+    return rings
+
+
+def test_write_geoparquet():
+    pq = pytest.importorskip("pyarrow.parquet")
+    labels = make_labels()
+    output = io.BytesIO()
+
+    count = write_geoparquet(labels, output, band_height=16, max_workers=1)
+
+    output.seek(0)
+    table = pq.read_table(output)
+    assert count == table.num_rows == len(reference_shapes(labels))
+
+    geo_metadata = json.loads(table.schema.metadata[b"geo"])
+    assert geo_metadata["primary_column"] == "geometry"
+    assert geo_metadata["columns"]["geometry"]["encoding"] == "WKB"
+
+    expected = sorted(
+        (int(label), json.dumps(shape["coordinates"]))
+        for shape, label in features.shapes(
+            labels.astype(np.int32), labels != 0, connectivity=8
+        )
+    )
+    rows = table.to_pydict()
+    actual = sorted(
+        (label, json.dumps(parse_polygon_wkb(geometry)))
+        for label, geometry in zip(rows["label"], rows["geometry"])
+    )
+    assert actual == expected
+
+    for i, geometry in enumerate(rows["geometry"]):
+        exterior = np.array(parse_polygon_wkb(geometry)[0])
+        assert rows["xmin"][i] == exterior[:, 0].min()
+        assert rows["ymax"][i] == exterior[:, 1].max()
@@ -2,6 +2,7 @@
 
 """test_watershed.py - tests the watershed function"""
 
+import heapq
 import math
 import unittest
 
@@ -14,7 +15,7 @@ from skimage._shared.filters import gaussian
 from skimage.feature import peak_local_max
 from skimage.measure import label
 
-from deepcell_imaging.image_processing.watershed import watershed
+from deepcell_imaging.image_processing.watershed import watershed, watershed_unpadded
 
 eps = 1e-12
 # fmt: off
@@ -967,3 +968,131 @@ def test_connectivity():
 
     for lab, area in zip(range(5), [61824, 3653, 20466, 12385, 11292]):
         assert np.sum(labels_c2 == lab) == area
+
+
+def make_unpadded_inputs(shape, dtype, seed=0):
+    rng = np.random.default_rng(seed)
+    image = ndi.gaussian_filter(rng.random(shape), 1).astype(dtype)
+    markers = np.zeros(shape, dtype=np.int32)
+    n = max(1, image.size // 40)
+    markers.flat[rng.integers(0, image.size, n)] = np.arange(1, n + 1)
+    mask = rng.random(shape) < 0.8
+    return image, markers, mask
+
+
+@pytest.mark.parametrize("shape", [(1, 1), (1, 17), (23, 1), (31, 45), (7, 9, 11)])
+@pytest.mark.parametrize("dtype", [np.float32, np.float64])
+@pytest.mark.parametrize("connectivity", [1, 2])
+@pytest.mark.parametrize("compactness", [0, 0.01])
+@pytest.mark.parametrize("watershed_line", [False, True])
+@pytest.mark.parametrize("use_mask", [False, True])
+def test_watershed_unpadded_matches_watershed(
+    shape, dtype, connectivity, compactness, watershed_line, use_mask
+):
+    if len(shape) == 3 and watershed_line:
+        pytest.skip("The 3D watershed line doesn't terminate (with or without padding)")
+
+    image, markers, mask = make_unpadded_inputs(shape, dtype)
+    mask = mask if use_mask else None
+
+    expected = watershed(
+        image,
+        markers,
+        connectivity=connectivity,
+        mask=mask,
+        compactness=compactness,
+        watershed_line=watershed_line,
+    )
+    actual = watershed_unpadded(
+        image,
+        markers,
+        connectivity=connectivity,
+        mask=mask,
+        compactness=compactness,
+        watershed_line=watershed_line,
+    )
+
+    np.testing.assert_array_equal(actual, expected)
+    assert actual.dtype == markers.dtype
+
+
+def test_watershed_unpadded_output():
+    image, markers, mask = make_unpadded_inputs((40, 50), np.float32)
+    original_mask = mask.copy()
+    expected = watershed(image, markers, mask=mask, watershed_line=True)
+
+    output = markers.copy()
+    result = watershed_unpadded(
+        image, output, mask=mask, watershed_line=True, output=output
+    )
+
+    assert result is output
+    np.testing.assert_array_equal(output, expected)
+    # The watershed lines are marked in a copy of the mask.
+    np.testing.assert_array_equal(mask, original_mask)
+
+
+def test_watershed_unpadded_invalid_output():
+    image, markers, _ = make_unpadded_inputs((10, 12), np.float64)
+
+    with pytest.raises(ValueError):
+        watershed_unpadded(image, markers, output=np.zeros((10, 11), np.int32))
+    with pytest.raises(ValueError):
+        watershed_unpadded(image, markers, output=np.zeros((12, 10), np.int32).T)
+
+
+def reference_quantized_watershed(levels, markers, mask):
+    # Floods in order of (level, age), with the markers first in raster order.
+    output = markers * mask
+    queue = [(-1, age, index) for age, index in enumerate(np.flatnonzero(output))]
+    age = len(queue)
+    while queue:
+        level, _, index = heapq.heappop(queue)
+        y, x = np.unravel_index(index, output.shape)
+        for dy, dx in [(-1, 0), (0, -1), (0, 1), (1, 0)]:
+            ny, nx = y + dy, x + dx
+            if not (0 <= ny < output.shape[0] and 0 <= nx < output.shape[1]):
+                continue
+            if not mask[ny, nx] or output[ny, nx]:
+                continue
+            output[ny, nx] = output[y, x]
+            heapq.heappush(
+                queue, (max(levels[ny, nx], level), age, ny * output.shape[1] + nx)
+            )
+            age += 1
+    return output
+
+
+@pytest.mark.parametrize("seed", range(4))
+@pytest.mark.parametrize("priority_levels", [4, 256])
+def test_watershed_priority_levels(seed, priority_levels):
+    image, markers, mask = make_unpadded_inputs((31, 45), np.float64, seed)
+    low, high = image.min(), image.max()
+    levels = ((image - low) * ((priority_levels - 1) / (high - low))).astype(int)
+    expected = reference_quantized_watershed(levels, markers, mask)
+
+    for watershed_fn in [watershed, watershed_unpadded]:
+        actual = watershed_fn(
+            image, markers, mask=mask, priority_levels=priority_levels
+        )
+        np.testing.assert_array_equal(actual, expected)
+
+
+def test_watershed_priority_levels_close_to_exact():
+    image, markers, mask = make_unpadded_inputs((200, 300), np.float32)
+
+    exact = watershed_unpadded(image, markers, mask=mask)
+    quantized = watershed_unpadded(image, markers, mask=mask, priority_levels=65536)
+
+    assert (exact == quantized).mean() > 0.999
+
+
+def test_watershed_priority_levels_invalid():
+    image, markers, _ = make_unpadded_inputs((10, 12), np.float64)
+
+    with pytest.raises(ValueError):
+        watershed(image, markers, priority_levels=1)
+    with pytest.raises(ValueError):
+        watershed(image, markers, priority_levels=70000)
+    with pytest.raises(ValueError):
+        watershed_unpadded(image, markers, compactness=0.1, priority_levels=256)
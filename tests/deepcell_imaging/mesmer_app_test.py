@@ -0,0 +1,218 @@
+import numpy as np
+import pytest
+import scipy.ndimage as nd
+
+# mesmer_app needs the DeepCell toolbox (for the model pre/post-processing).
+pytest.importorskip("deepcell_toolbox")
+
+from deepcell_imaging import mesmer_app  # noqa: E402
+
+WATERSHED_KWARGS = {
+    "maxima_threshold": 0.1,
+    "interior_threshold": 0.2,
+    "interior_smooth": 2,
+    "small_objects_threshold": 15,
+    "fill_holes_threshold": 15,
+    "radius": 2,
+}
+
+
+def make_prediction(shape, sigma, seed):
+    rng = np.random.default_rng(seed)
+    prediction = nd.gaussian_filter(rng.random(shape), (0, sigma, sigma, 0))
+    prediction = (prediction - prediction.min()) / np.ptp(prediction)
+    return prediction.astype(np.float32)
+
+
+def make_outputs(batch=1, size=120, seed=0):
+    """Smooth random [maxima, interior] predictions, like the model's."""
+    shape = (batch, size, size, 1)
+    return [
+        make_prediction(shape, 4, seed),
+        make_prediction(shape, 3, seed + 1),
+    ]
+
+
+def copy_outputs(outputs):
+    return [prediction.copy() for prediction in outputs]
+
+
+def test_memory_lean_keeps_outputs():
+    outputs = make_outputs()
+    original = copy_outputs(outputs)
+
+    mesmer_app.deep_watershed(outputs, memory_lean=True, **WATERSHED_KWARGS)
+
+    for prediction, original_prediction in zip(outputs, original):
+        np.testing.assert_array_equal(prediction, original_prediction)
+
+
+def test_memory_lean_overwrite_outputs():
+    outputs = make_outputs()
+    expected = mesmer_app.deep_watershed(
+        copy_outputs(outputs), memory_lean=True, **WATERSHED_KWARGS
+    )
+
+    result = mesmer_app.deep_watershed(
+        outputs, memory_lean=True, overwrite_outputs=True, **WATERSHED_KWARGS
+    )
+
+    np.testing.assert_array_equal(result, expected)
+    # The predictions were smoothed (& the interior negated) in place.
+    assert np.all(outputs[1] <= 0)
+
+
+class RecordingCache(mesmer_app.LRUCache):
+    """An LRUCache that remembers its instances, to inspect the sweep's."""
+
+    instances = []
+
+    def __init__(self, max_bytes):
+        super().__init__(max_bytes)
+        RecordingCache.instances.append(self)
+
+
+@pytest.fixture
+def sweep_cache(monkeypatch):
+    RecordingCache.instances = []
+    monkeypatch.setattr(mesmer_app, "LRUCache", RecordingCache)
+    yield lambda: RecordingCache.instances[-1]
+
+
+SWEEP_GRID = {"maxima_threshold": [0.05, 0.1], "interior_threshold": [0.1, 0.2]}
+
+
+@pytest.mark.parametrize("maxima_algorithm", ["h_maxima", "max_tree"])
+def test_sweep_matches_deep_watershed(sweep_cache, maxima_algorithm):
+    outputs = make_outputs(batch=2)
+    kwargs = {**WATERSHED_KWARGS, "maxima_algorithm": maxima_algorithm}
+
+    results = list(mesmer_app.deep_watershed_sweep(outputs, SWEEP_GRID, **kwargs))
+
+    assert len(results) == 4
+    for params, label_images, cell_counts in results:
+        expected = mesmer_app.deep_watershed(outputs, **{**kwargs, **params})
+        np.testing.assert_array_equal(label_images, expected)
+        assert cell_counts == [int(image.max()) for image in expected]
+
+    # Per frame, the maxima, interior & each threshold's markers (& with
+    # max_tree, the dynamics) are each computed once, then reused.
+    stages = 4 if maxima_algorithm == "h_maxima" else 5
+    cache = sweep_cache()
+    assert cache.misses == 2 * stages
+    assert cache.hits > 0
+
+
+def test_sweep_small_budget(sweep_cache):
+    outputs = make_outputs(batch=2)
+    expected = list(
+        mesmer_app.deep_watershed_sweep(outputs, SWEEP_GRID, **WATERSHED_KWARGS)
+    )
+    misses = sweep_cache().misses
+
+    # Too small to keep more than a frame's stage or two.
+    budget_gb = 2 * outputs[0][0].nbytes / 1e9
+    results = list(
+        mesmer_app.deep_watershed_sweep(
+            outputs, SWEEP_GRID, memory_budget_gb=budget_gb, **WATERSHED_KWARGS
+        )
+    )
+
+    assert sweep_cache().misses > misses
+    for (params, label_images, _), (expected_params, expected_images, _) in zip(
+        results, expected
+    ):
+        assert params == expected_params
+        np.testing.assert_array_equal(label_images, expected_images)
+
+
+def make_model_output(batch=1, size=120):
+    return {
+        "whole-cell": make_outputs(batch, size, seed=2),
+        "nuclear": make_outputs(batch, size, seed=0),
+    }
+
+
+def test_whole_cell_from_nuclei():
+    label_images = mesmer_app.mesmer_postprocess(
+        make_model_output(),
+        compartment="both",
+        whole_cell_kwargs=WATERSHED_KWARGS,
+        nuclear_kwargs=WATERSHED_KWARGS,
+        whole_cell_from_nuclei=True,
+    )
+    cells, nuclei = label_images[..., 0], label_images[..., 1]
+
+    assert nuclei.max() > 0
+    # The cells have their nuclei's ids, & each nucleus is inside its cell.
+    assert set(np.unique(cells)) <= set(np.unique(nuclei))
+    np.testing.assert_array_equal(cells[nuclei > 0], nuclei[nuclei > 0])
+
+
+def test_whole_cell_from_nuclei_needs_both():
+    with pytest.raises(ValueError):
+        mesmer_app.mesmer_postprocess(
+            make_model_output(),
+            compartment="whole-cell",
+            whole_cell_from_nuclei=True,
+        )
+
+
+@pytest.mark.parametrize(
+    "whole_cell_lean, nuclear_lean, dtype",
+    [(False, False, np.int64), (True, True, np.uint32), (True, False, np.int64)],
+)
+def test_concurrent_compartments(whole_cell_lean, nuclear_lean, dtype):
+    model_output = make_model_output(batch=2)
+    kwargs = {
+        "whole-cell": {**WATERSHED_KWARGS, "memory_lean": whole_cell_lean},
+        "nuclear": {**WATERSHED_KWARGS, "memory_lean": nuclear_lean},
+    }
+
+    concurrent, serial = [
+        mesmer_app.mesmer_postprocess(
+            model_output,
+            compartment="both",
+            whole_cell_kwargs=kwargs["whole-cell"],
+            nuclear_kwargs=kwargs["nuclear"],
+            concurrent_compartments=concurrent_compartments,
+        )
+        for concurrent_compartments in [True, False]
+    ]
+
+    np.testing.assert_array_equal(concurrent, serial)
+    for label_images in [concurrent, serial]:
+        assert label_images.shape == (2, 120, 120, 2)
+        assert label_images.dtype == dtype
+    # Each compartment's labels are in its own channel.
+    for channel, compartment in enumerate(["whole-cell", "nuclear"]):
+        np.testing.assert_array_equal(
+            concurrent[..., channel : channel + 1],
+            mesmer_app.deep_watershed(model_output[compartment], **kwargs[compartment]),
+        )
+
+
+@pytest.mark.parametrize(
+    "kwargs",
+    [
+        {},
+        {"memory_lean": True},
+        {"memory_lean": True, "overwrite_outputs": True},
+        {"maxima_algorithm": "peak_local_max"},
+    ],
+)
+@pytest.mark.parametrize("num_workers", [2, 3, 8])
+def test_num_workers(kwargs, num_workers):
+    outputs = make_outputs(batch=5)
+    expected = mesmer_app.deep_watershed(
+        copy_outputs(outputs), num_workers=1, **WATERSHED_KWARGS, **kwargs
+    )
+
+    # Each worker smooths its own frames (in place, if overwriting).
+    result = mesmer_app.deep_watershed(
+        outputs, num_workers=num_workers, **WATERSHED_KWARGS, **kwargs
+    )
+
+    np.testing.assert_array_equal(result, expected)
+    assert result.shape == (5, 120, 120, 1)
+    assert result.dtype == expected.dtype
@@ -0,0 +1,82 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+from deepcell_imaging.utils import chunked_store
+
+
+def test_round_trip(tmp_path):
+    uri = str(tmp_path / "arrays.zarr")
+    rng = np.random.default_rng(0)
+    arrays = {
+        "arr_0": rng.random((1, 70, 45, 2), dtype=np.float32),
+        "arr_1": rng.integers(0, 1000, size=(33, 20)),
+    }
+
+    chunked_store.write_arrays(uri, arrays, chunk_size=16)
+
+    assert chunked_store.list_arrays(uri) == ["arr_0", "arr_1"]
+    result = chunked_store.read_arrays(uri)
+    for name, array in arrays.items():
+        assert result[name].dtype == array.dtype
+        np.testing.assert_array_equal(result[name], array)
+
+
+def test_zarr_layout(tmp_path):
+    uri = str(tmp_path / "arrays.zarr")
+    chunked_store.write_arrays(uri, {"image": np.ones((10, 7))}, chunk_size=4)
+
+    with open(os.path.join(uri, "image", ".zarray")) as f:
+        metadata = json.load(f)
+
+    assert metadata["shape"] == [10, 7]
+    assert metadata["chunks"] == [4, 4]
+    assert metadata["compressor"]["id"] == "zlib"
+    assert sorted(os.listdir(os.path.join(uri, "image"))) == [
+        ".zarray",
+        "0.0",
+        "0.1",
+        "1.0",
+        "1.1",
+        "2.0",
+        "2.1",
+    ]
+
+
+def test_partial_read(tmp_path):
+    uri = str(tmp_path / "arrays.zarr")
+    array = np.arange(50 * 60).reshape(50, 60)
+    chunked_store.write_arrays(uri, {"image": array}, chunk_size=8)
+
+    chunked = chunked_store.open_array(uri, "image")
+    assert chunked.shape == (50, 60)
+    np.testing.assert_array_equal(chunked[5:21, 30:], array[5:21, 30:])
+    np.testing.assert_array_equal(chunked[..., 3:4], array[..., 3:4])
+    np.testing.assert_array_equal(chunked[49:, 59:], array[49:, 59:])
+
+    with pytest.raises(ValueError):
+        chunked[::2]
+
+
+def test_iter_chunks(tmp_path):
+    uri = str(tmp_path / "arrays.zarr")
+    array = np.arange(21 * 13, dtype=np.uint16).reshape(21, 13)
+    chunked_store.write_arrays(uri, {"image": array}, chunk_size=5)
+
+    chunked = chunked_store.open_array(uri, "image", max_workers=2)
+    reassembled = np.zeros_like(array)
+    num_chunks = 0
+    for slices, block in chunked.iter_chunks():
+        reassembled[slices] = block
+        num_chunks += 1
+
+    assert num_chunks == 5 * 3
+    np.testing.assert_array_equal(reassembled, array)
+
+
+def test_is_chunked_store_uri():
+    assert chunked_store.is_chunked_store_uri("gs://bucket/raw_predictions.zarr")
+    assert chunked_store.is_chunked_store_uri("/tmp/raw_predictions.zarr/")
+    assert not chunked_store.is_chunked_store_uri("gs://bucket/a.npz.gz")
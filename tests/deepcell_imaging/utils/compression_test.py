@@ -0,0 +1,37 @@
+import pytest
+
+from deepcell_imaging.utils.compression import (
+    compress_file,
+    decompress_file,
+    get_codec,
+)
+
+
+@pytest.mark.parametrize(
+    "codec,module", [("gzip", None), ("zstd", "zstandard"), ("lz4", "lz4")]
+)
+def test_compress_round_trip(tmp_path, codec, module):
+    if module:
+        pytest.importorskip(module)
+
+    data = b"deepcell " * 100000
+    src = tmp_path / "data"
+    src.write_bytes(data)
+
+    compress_file(str(src), str(tmp_path / "compressed"), codec, level=1, threads=2)
+    assert (tmp_path / "compressed").stat().st_size < len(data)
+
+    decompress_file(str(tmp_path / "compressed"), str(tmp_path / "restored"), codec)
+    assert (tmp_path / "restored").read_bytes() == data
+
+
+def test_invalid_codec(tmp_path):
+    with pytest.raises(ValueError):
+        compress_file(str(tmp_path / "a"), str(tmp_path / "b"), "bzip2")
+
+
+def test_get_codec():
+    assert get_codec("gs://bucket/raw_predictions.npz.gz") == "gzip"
+    assert get_codec("raw_predictions.npz.zst") == "zstd"
+    assert get_codec("raw_predictions.npz.lz4") == "lz4"
+    assert get_codec("raw_predictions.npz") is None
@@ -0,0 +1,102 @@
+import os
+
+import numpy as np
+import pytest
+
+from deepcell_imaging.utils import intermediates
+
+
+def test_round_trip(tmp_path):
+    uri = str(tmp_path / "arrays.npz")
+    array = np.arange(12).reshape(3, 4)
+
+    assert intermediates.write_arrays(uri, {"image": array}) is None
+
+    result = intermediates.read_arrays(uri, ["image"])
+    np.testing.assert_array_equal(result["image"], array)
+
+
+def test_local_scratch_round_trip(tmp_path):
+    uri = str(tmp_path / "remote" / "arrays.npz")
+    os.makedirs(tmp_path / "remote")
+    scratch_dir = str(tmp_path / "scratch")
+    arrays = {"arr_0": np.ones((5, 6), dtype=np.float32), "arr_1": np.arange(7)}
+
+    future = intermediates.write_arrays(uri, arrays, local_scratch_dir=scratch_dir)
+    future.result()
+
+    # The scratch copy is memory-mapped.
+    result = intermediates.read_arrays(uri, ["arr_1"], local_scratch_dir=scratch_dir)
+    assert isinstance(result["arr_1"], np.memmap)
+    np.testing.assert_array_equal(result["arr_1"], arrays["arr_1"])
+
+    # The URI copy was also written.
+    result = intermediates.read_arrays(uri, ["arr_0", "arr_1"])
+    for name, array in arrays.items():
+        np.testing.assert_array_equal(result[name], array)
+
+
+def test_local_scratch_falls_back_to_uri(tmp_path):
+    uri = str(tmp_path / "arrays.npz")
+    array = np.arange(10)
+    intermediates.write_arrays(uri, {"image": array})
+
+    result = intermediates.read_arrays(
+        uri, ["image"], local_scratch_dir=str(tmp_path / "scratch")
+    )
+    assert not isinstance(result["image"], np.memmap)
+    np.testing.assert_array_equal(result["image"], array)
+
+
+def test_get_scratch_path():
+    assert (
+        intermediates.get_scratch_path("gs://bucket/job/task_0/a.npz.gz", "/scratch")
+        == "/scratch/bucket/job/task_0/a.npz.gz"
+    )
+    assert (
+        intermediates.get_scratch_path("/tmp/job/a.zarr", "/scratch")
+        == "/scratch/tmp/job/a.zarr"
+    )
+
+
+@pytest.mark.parametrize("extension", ["npz.gz", "npz.zst", "npz.lz4"])
+def test_compressed_round_trip(tmp_path, extension):
+    uri = str(tmp_path / f"arrays.{extension}")
+    array = np.zeros((100, 100), dtype=np.int64)
+
+    write_stats = {}
+    intermediates.write_arrays(uri, {"image": array}, stats=write_stats)
+    assert write_stats["compress_time_s"] >= 0
+    assert write_stats["size_mb"] < array.nbytes / 1e6
+
+    read_stats = {}
+    result = intermediates.read_arrays(uri, ["image"], stats=read_stats)
+    assert read_stats["decompress_time_s"] >= 0
+    np.testing.assert_array_equal(result["image"], array)
+
+
+def test_get_intermediate_format():
+    assert (
+        intermediates.get_intermediate_format("gs://bucket/task_0/preprocessed.npz.gz")
+        == "npz.gz"
+    )
+    assert (
+        intermediates.get_intermediate_format("/tmp/task_0/predictions.zarr/") == "zarr"
+    )
+
+
+@pytest.mark.parametrize("filename", ["predictions.npz.gz", "predictions.rle.npz.gz"])
+def test_labels_round_trip(tmp_path, filename):
+    uri = str(tmp_path / filename)
+    labels = np.zeros((20, 30, 2), dtype=np.int64)
+    labels[5:10, 3:8, 0] = 1
+    labels[2:4, :, 1] = 2
+
+    intermediates.write_labels(uri, labels)
+
+    np.testing.assert_array_equal(intermediates.read_labels(uri), labels)
+
+
+def test_is_rle_uri():
+    assert intermediates.is_rle_uri("gs://bucket/task_0/predictions.rle.npz.gz")
+    assert not intermediates.is_rle_uri("gs://bucket.rle.x/task_0/predictions.npz")
@@ -0,0 +1,54 @@
+import numpy as np
+
+from deepcell_imaging.utils.lru_cache import LRUCache, value_nbytes
+
+
+def test_value_nbytes():
+    array = np.zeros(10, dtype=np.float32)
+
+    assert value_nbytes(array) == 40
+    assert value_nbytes((array, [array, 3])) == 80
+    assert value_nbytes("not an array") == 0
+
+
+def test_get_computes_once():
+    cache = LRUCache(max_bytes=1000)
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return np.zeros(10, dtype=np.uint8)
+
+    first = cache.get("a", compute)
+    second = cache.get("a", compute)
+
+    assert first is second
+    assert len(calls) == 1
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert cache.nbytes == 10
+
+
+def test_evicts_least_recently_used():
+    cache = LRUCache(max_bytes=250)
+
+    for key in ["a", "b"]:
+        cache.get(key, lambda: np.zeros(100, dtype=np.uint8))
+    # Using a makes b the least recently used.
+    cache.get("a", lambda: None)
+    cache.get("c", lambda: np.zeros(100, dtype=np.uint8))
+
+    assert "a" in cache and "c" in cache
+    assert "b" not in cache
+    assert cache.nbytes == 200
+
+
+def test_too_large_not_kept():
+    cache = LRUCache(max_bytes=50)
+    cache.get("small", lambda: np.zeros(20, dtype=np.uint8))
+
+    value = cache.get("large", lambda: np.zeros(100, dtype=np.uint8))
+
+    assert value.shape == (100,)
+    assert "large" not in cache
+    assert "small" in cache
+    assert len(cache) == 1
@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+import tifffile
+
+from deepcell_imaging.utils.mask_tiff import get_pyramid_levels, write_mask_tiff
+
+
+def test_write_mask_tiff(tmp_path):
+    path = str(tmp_path / "mask.ome.tiff")
+    segmentation = np.zeros((100, 70, 2), dtype=np.int64)
+    segmentation[10:50, 5:60, 0] = 3
+    segmentation[60:, :, 0] = 4
+
+    write_mask_tiff(path, segmentation[..., 0], tile_size=32, maxworkers=2)
+
+    with tifffile.TiffFile(path) as tif:
+        assert tif.is_ome
+        assert tif.pages[0].is_tiled
+        levels = tif.series[0].levels
+        assert [level.shape for level in levels] == [(100, 70), (50, 35), (25, 18)]
+
+        full = levels[0].asarray()
+        assert full.dtype == np.int32
+        np.testing.assert_array_equal(full, segmentation[..., 0])
+        np.testing.assert_array_equal(levels[2].asarray(), segmentation[::4, ::4, 0])
+
+
+def test_get_pyramid_levels():
+    labels = np.zeros((1000, 300))
+
+    levels = get_pyramid_levels(labels, tile_size=256)
+
+    assert [level.shape for level in levels] == [(1000, 300), (500, 150), (250, 75)]
+    assert all(np.shares_memory(level, labels) for level in levels)
+
+
+def test_write_mask_tiff_rejects_3d(tmp_path):
+    with pytest.raises(ValueError):
+        write_mask_tiff(str(tmp_path / "mask.tiff"), np.zeros((10, 10, 1)))
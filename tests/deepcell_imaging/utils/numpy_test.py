@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+
+from deepcell_imaging.utils.numpy import npz_headers, npz_read_arrays
+
+
+def test_npz_headers(tmp_path):
+    path = str(tmp_path / "arrays.npz")
+    np.savez(path, image=np.zeros((3, 4), dtype=np.uint16))
+
+    assert list(npz_headers(path)) == [("image", (3, 4), np.dtype(np.uint16))]
+
+
+@pytest.mark.parametrize("savez", [np.savez, np.savez_compressed])
+def test_npz_read_arrays(tmp_path, savez):
+    path = str(tmp_path / "arrays.npz")
+    rng = np.random.default_rng(0)
+    arrays = {
+        "arr_0": rng.random((1, 20, 30, 1), dtype=np.float32),
+        "arr_1": np.arange(12).reshape(3, 4),
+        "arr_2": np.asfortranarray(rng.random((5, 7))),
+        "arr_3": np.zeros((0, 4)),
+    }
+    savez(path, **arrays)
+
+    result = npz_read_arrays(path, ["arr_3", "arr_2", "arr_0"])
+
+    assert list(result.keys()) == ["arr_3", "arr_2", "arr_0"]
+    for name, array in result.items():
+        assert array.dtype == arrays[name].dtype
+        np.testing.assert_array_equal(array, arrays[name])
+
+
+def test_npz_read_arrays_missing(tmp_path):
+    path = str(tmp_path / "arrays.npz")
+    np.savez(path, image=np.zeros(3))
+
+    with pytest.raises(KeyError):
+        npz_read_arrays(path, ["arr_0"])
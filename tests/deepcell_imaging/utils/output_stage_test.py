@@ -0,0 +1,51 @@
+import threading
+import time
+
+import pytest
+
+from deepcell_imaging.utils.output_stage import OutputStage
+
+
+def test_outputs_run_concurrently():
+    barrier = threading.Barrier(2, timeout=5)
+    written = []
+
+    def write(name):
+        # Deadlocks (then times out) unless both writes run at once.
+        barrier.wait()
+        time.sleep(0.05)
+        written.append(name)
+
+    with OutputStage() as outputs:
+        outputs.submit("a", write, "a")
+        outputs.submit("b", write, "b")
+
+    assert sorted(written) == ["a", "b"]
+    assert set(outputs.write_times_s.keys()) == {"a", "b"}
+    assert outputs.overlap_time_s > 0
+
+
+def test_wait_raises_errors():
+    def fail():
+        raise IOError("upload failed")
+
+    outputs = OutputStage()
+    outputs.submit("a", fail)
+
+    with pytest.raises(IOError):
+        outputs.wait()
+
+
+def test_no_outputs():
+    with OutputStage() as outputs:
+        pass
+
+    assert outputs.write_times_s == {}
+    assert outputs.overlap_time_s == 0.0
+
+
+def test_duplicate_output():
+    with OutputStage() as outputs:
+        outputs.submit("a", lambda: None)
+        with pytest.raises(ValueError):
+            outputs.submit("a", lambda: None)
@@ -0,0 +1,33 @@
+import numpy as np
+import pytest
+
+from deepcell_imaging.utils import rle
+
+
+@pytest.mark.parametrize(
+    "labels",
+    [
+        np.zeros((0, 5), dtype=np.int64),
+        np.zeros((4, 5), dtype=np.int64),
+        np.arange(20, dtype=np.int32).reshape(4, 5),
+        np.random.default_rng(0).integers(0, 3, size=(30, 20, 2)),
+    ],
+)
+def test_round_trip(labels):
+    encoded = rle.encode(labels)
+    decoded = rle.decode(**encoded)
+
+    assert decoded.dtype == labels.dtype
+    np.testing.assert_array_equal(decoded, labels)
+
+
+def test_encode_runs_per_channel():
+    labels = np.zeros((2, 3, 2), dtype=np.int64)
+    labels[0, 1:, 0] = 5
+    labels[:, :, 1] = 7
+
+    encoded = rle.encode(labels)
+
+    np.testing.assert_array_equal(encoded["values"], [0, 5, 0, 7])
+    np.testing.assert_array_equal(encoded["lengths"], [1, 2, 3, 6])
+    np.testing.assert_array_equal(encoded["shape"], [2, 3, 2])
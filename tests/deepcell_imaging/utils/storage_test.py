@@ -1,6 +1,10 @@
 from unittest.mock import patch, Mock
 
-from deepcell_imaging.utils.storage import find_matching_npz, get_blob_filenames
+from deepcell_imaging.utils.storage import (
+    find_matching_npz,
+    get_blob_filenames,
+    get_blob_uris,
+)
 
 
 def test_get_blob_filenames():
@@ -27,6 +31,28 @@ def test_get_blob_filenames():
     assert result == {"image1", "image2", "image3"}
 
 
+def test_get_blob_uris():
+    names = ["images/image1.ome.tiff", "images/image2.ome.tif", "images/"]
+
+    with patch("google.cloud.storage.Blob") as mock_blob:
+        mock_blob.from_string.return_value.bucket.name = "bucket"
+        mock_blob.from_string.return_value.name = "images"
+
+        with patch("google.cloud.storage.Client") as mock_client:
+            mocks = [Mock() for _ in names]
+            for mock, name in zip(mocks, names):
+                mock.name = name
+
+            mock_client.return_value.bucket.return_value.list_blobs.return_value = mocks
+
+            result = get_blob_uris("gs://bucket/images", None)
+
+    assert result == {
+        "image1": "gs://bucket/images/image1.ome.tiff",
+        "image2": "gs://bucket/images/image2.ome.tif",
+    }
+
+
 def test_find_matching_npz():
     image_names = ["image1", "image2", "image3"]
     npz_root = "npz_root"